@@ -0,0 +1,192 @@
+# Standard modules
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, q: float) -> float:
+    """Percentile with linear interpolation (same as numpy's default), without importing numpy into the scraper."""
+
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class _DomainState():
+    """What the controller knows about a single site."""
+
+    __slots__ = ("concurrency", "delay", "latency_ewma", "error_ewma", "latencies", "baseline_latency",
+                 "in_flight", "next_request_at", "last_decrease_at", "requests", "errors")
+
+    def __init__(self, concurrency: float, delay: float, window: int):
+        self.concurrency = concurrency # allowed parallel requests (float, the slots are the integer part)
+        self.delay = delay # seconds in between the starts of 2 requests
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.latencies = deque(maxlen=window) # the latest response times (for the p95 and the baseline)
+        self.baseline_latency = None # low percentile of the latest response times = the latency of the site when it isn't under load
+        self.in_flight = 0
+        self.next_request_at = 0.0 # monotonic time
+        self.last_decrease_at = 0.0
+        self.requests = 0
+        self.errors = 0
+
+
+class AdaptiveController():
+    """Per-domain pacing of the requests, driven by the observed latency and error rate of every site (AIMD, like TCP congestion control).
+
+    - Every fast, successful response (close to the baseline latency of the site) raises the concurrency and the request rate
+      (1 / delay between its requests) of the site additively, within max_concurrency/min_delay.
+    - 429/5xx responses, failed requests and responses much slower than the normal latency of the site halve the concurrency
+      and double the delay (a "Retry-After" header pauses the site for the given time). A site slows down when its latency average
+      rises well above its baseline, a low percentile of its latest response times (so the baseline follows a site that is slower
+      for good, instead of being stuck at a single early fast response).
+    - The request timeout of a site is derived from its observed p95 latency, and the retry backoff from its current delay.
+
+    So a fast CDN-backed site gets scraped with several parallel requests and short delays, while a slow or rate limiting site gets backed off."""
+
+    def __init__(self, initial_concurrency: float = 1.0, min_concurrency: float = 1.0, max_concurrency: float = 2.0,
+                 initial_delay: float = 2.0, min_delay: float = 1.0, max_delay: float = 60.0, rate_step: float = 0.1,
+                 ewma_alpha: float = 0.2, slow_factor: float = 2.5, slow_margin: float = 0.2, fast_factor: float = 1.5, baseline_percentile: float = 10, initial_timeout: float = 10.0,
+                 min_timeout: float = 3.0, max_timeout: float = 30.0, timeout_factor: float = 3.0, window: int = 100):
+
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency # parallel requests per site at most (conservative for live sites, raise it for sites that allow more)
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay # > 0, the delay is doubled on congestion (default: the lower end of WebScraper.sleep_range)
+        self.max_delay = max_delay
+        self.rate_step = rate_step # requests per second the request rate (1 / delay) of a site grows after every fast successful response
+        self.ewma_alpha = ewma_alpha # weight of the newest response in the latency/error averages
+        self.slow_factor = slow_factor # a latency average this many times higher than the baseline latency counts as congestion
+        self.slow_margin = slow_margin # seconds, smaller latency increases never count as congestion (new connections, jitter of very fast sites)
+        self.fast_factor = fast_factor # only a response at most this many times slower than the baseline latency (or within slow_margin) speeds the site up
+        self.baseline_percentile = baseline_percentile # percentile of the latest response times (window) used as the baseline latency
+        self.initial_timeout = initial_timeout # until there are enough responses for a p95
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor # timeout = p95 latency x factor
+        self.window = window # latest responses per site used for the p95 and the baseline latency
+
+        self._domains = {} # domain -> _DomainState
+        self._condition = threading.Condition()
+
+
+    def _state(self, domain: str) -> _DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = _DomainState(self.initial_concurrency, self.initial_delay, self.window)
+        return state
+
+
+    def slots(self, domain: str) -> int:
+        """Amount of requests the site may have running at the same time."""
+        with self._condition:
+            return max(1, int(self._state(domain).concurrency))
+
+
+    def timeout(self, domain: str) -> float:
+        """Request timeout of the site, from its p95 latency."""
+
+        with self._condition:
+            latencies = self._state(domain).latencies
+            if len(latencies) < 5:
+                return self.initial_timeout
+            p95 = percentile(latencies, 95)
+
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+
+    def backoff(self, domain: str, attempt: int, retry_after: float = None) -> float:
+        """Seconds to wait before retrying a failed request (exponential on top of the current delay of the site)."""
+
+        with self._condition:
+            delay = self._state(domain).delay * (2 ** attempt)
+
+        return min(self.max_delay, max(delay, retry_after or 0))
+
+
+    @contextmanager
+    def slot(self, domain: str):
+        """Waits until the site has a free request slot and its delay since the previous request has passed, then holds the slot."""
+
+        with self._condition:
+            state = self._state(domain)
+
+            while True:
+                now = time.monotonic()
+                if state.in_flight < max(1, int(state.concurrency)) and now >= state.next_request_at:
+                    break
+                self._condition.wait(timeout=max(0.01, state.next_request_at - now) if state.next_request_at > now else None)
+
+            state.in_flight += 1
+            state.next_request_at = now + state.delay
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                state.in_flight -= 1
+                self._condition.notify_all()
+
+
+    def record(self, domain: str, latency: float = None, success: bool = True, retry_after: float = None):
+        """Updates the site after a request. 'latency' = response time in seconds (None for a failed request),
+        'success' = False for 429/5xx responses and failed requests (timeouts, connection errors)."""
+
+        with self._condition:
+            state = self._state(domain)
+            now = time.monotonic()
+            state.requests += 1
+            state.errors += 0 if success else 1
+
+            if latency is not None:
+                state.latencies.append(latency)
+                state.latency_ewma = latency if state.latency_ewma is None else self.ewma_alpha * latency + (1 - self.ewma_alpha) * state.latency_ewma
+                state.baseline_latency = percentile(state.latencies, self.baseline_percentile)
+
+            state.error_ewma = self.ewma_alpha * (0.0 if success else 1.0) + (1 - self.ewma_alpha) * state.error_ewma
+            # the average is compared (not the single response), so the jitter of a site doesn't count as congestion
+            slowed_down = latency is not None and state.latency_ewma > max(state.baseline_latency * self.slow_factor, state.baseline_latency + self.slow_margin)
+            congested = not success or slowed_down
+            # in between fast and congested the site keeps its current pace
+            fast = latency is not None and latency <= max(state.baseline_latency * self.fast_factor, state.baseline_latency + self.slow_margin)
+
+            if congested:
+                # multiplicative decrease, at most once per round trip (a burst of errors from the same overload counts once)
+                if now - state.last_decrease_at >= (state.latency_ewma or self.initial_delay):
+                    state.concurrency = max(self.min_concurrency, state.concurrency / 2)
+                    state.delay = min(self.max_delay, state.delay * 2)
+                    state.last_decrease_at = now
+            elif fast:
+                # additive increase: +1 parallel request after a whole window of fast responses, and a slightly higher request rate
+                state.concurrency = min(self.max_concurrency, state.concurrency + 1 / max(1.0, state.concurrency))
+                state.delay = max(self.min_delay, 1 / (1 / state.delay + self.rate_step))
+
+            if retry_after:
+                state.next_request_at = max(state.next_request_at, now + min(retry_after, self.max_delay))
+
+            self._condition.notify_all()
+
+
+    def snapshot(self) -> dict:
+        """The current state of every site: {domain: {concurrency, delay, latency_ewma, p95, timeout, error_rate, requests, errors}}."""
+
+        with self._condition:
+            domains = list(self._domains)
+
+        snapshot = {}
+        for domain in domains:
+            with self._condition:
+                state = self._domains[domain]
+                p95 = percentile(state.latencies, 95) if state.latencies else None
+                snapshot[domain] = {"concurrency": round(state.concurrency, 2), "delay": round(state.delay, 2),
+                                    "latency_ewma": state.latency_ewma, "p95": p95, "error_rate": round(state.error_ewma, 3),
+                                    "requests": state.requests, "errors": state.errors}
+            snapshot[domain]["timeout"] = self.timeout(domain)
+
+        return snapshot
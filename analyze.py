@@ -0,0 +1,196 @@
+# Standard modules
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+class AnalyzeCLI():
+    """Headless (non-interactive) version of the "Analyze saved data" menu, for scheduled/batch runs of the reports.
+    Several reports can be run in one go, sharing the loaded articles and their classification."""
+
+    reports = ["top-kw", "top-cats", "cats-by-date", "cats-by-domain", "countries", "kw-trend", "stats", "snapshot"]
+    formats = ["csv", "json", "parquet"]
+
+    def __init__(self, database: str = "sql_data.db", out_dir: str = "exports/reports/", output_format: str = "csv", charts: bool = False,
+                 chart_export_mode: str = "standalone", dedup_clusters: bool = False, snapshot_dir: str = "exports/snapshot/", snapshot_format: str = "parquet",
+                 snapshot_full: bool = False, classification_mode: str = "hits", profile: bool = False):
+
+        # heavy modules (pandas/plotly) are only imported when the CLI is actually used
+        from article_statistics import ArticleStatistics
+
+        self.db = database
+        self.out_dir = out_dir # "-" writes the reports to stdout
+        self.output_format = output_format
+        self.profiler = None
+        if profile:
+            from profiler import OperationProfiler
+            self.profiler = OperationProfiler(verbose=False)
+            self.st = self.profiler.wrap(self.profiler.run("ArticleStatistics.__init__", ArticleStatistics, self.db, dedup_clusters=dedup_clusters,
+                                                           classification_mode=classification_mode), "ArticleStatistics")
+        else:
+            self.st = ArticleStatistics(self.db, dedup_clusters=dedup_clusters, classification_mode=classification_mode)
+        self.gm = None
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_format = snapshot_format
+        self.snapshot_full = snapshot_full # rewrite all article partitions (e.g. after the keywords/categories were edited)
+
+        if charts:
+            from graph_mgr import GraphManager
+            self.gm = GraphManager(export_mode=chart_export_mode)
+            if self.profiler:
+                self.gm = self.profiler.wrap(self.gm, "GraphManager")
+
+
+    def write_report(self, df, name: str) -> str:
+        """Writes a report DataFrame as csv/json/parquet. Returns the file path (or "-" for stdout)."""
+
+        # keep named indexes (date/domain) as regular columns
+        df = df.reset_index() if df.index.name else df.reset_index(drop=True)
+
+        if self.out_dir == "-":
+            if self.output_format == "parquet":
+                raise ValueError("Parquet output can't be written to stdout.")
+            sys.stdout.write(df.to_csv(index=False) if self.output_format == "csv" else df.to_json(orient="records") + "\n")
+            return "-"
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        file_path = os.path.join(self.out_dir, f"{name}.{self.output_format}")
+
+        if self.output_format == "csv":
+            df.to_csv(file_path, index=False)
+        elif self.output_format == "json":
+            df.to_json(file_path, orient="records")
+        elif self.output_format == "parquet":
+            df.to_parquet(file_path, index=False) # needs pyarrow
+
+        return file_path
+
+
+    def run_report(self, report: str, top_n: int = 100, kw_1: str = "", kw_2: str = "", date_bucket: str = "auto") -> list:
+        """Runs a single report, writes its data (+ charts if enabled) and returns the list of written files."""
+
+        saved_files = []
+
+        if report == "top-kw":
+            df = self.st.get_top_kw()
+            saved_files.append(self.write_report(df, "top_keywords"))
+            if self.gm:
+                saved_files += self.gm.plot_top_kw_graph(df, top_n)
+
+        elif report == "top-cats":
+            df = self.st.get_top_cats()
+            saved_files.append(self.write_report(df, "top_categories"))
+            if self.gm:
+                saved_files += self.gm.plot_top_cat_graph(df, chart_type="bar")
+                saved_files += self.gm.plot_top_cat_graph(df, chart_type="pie")
+
+        elif report == "cats-by-date":
+            df = self.st.get_cats_by_date()
+            saved_files.append(self.write_report(df, "categories_by_date"))
+            if self.gm:
+                saved_files += self.gm.plot_cats_by_date_graph(df, date_bucket=date_bucket)
+
+        elif report == "cats-by-domain":
+            df = self.st.get_cats_by_domain()
+            saved_files.append(self.write_report(df, "categories_by_domain"))
+            if self.gm:
+                saved_files += self.gm.plot_cats_by_domain_graph(df)
+
+        elif report == "countries":
+            df = self.st.get_country_mentions()
+            saved_files.append(self.write_report(df, "country_mentions"))
+            if self.gm:
+                saved_files += self.gm.plot_country_mentions_heatmap(df)
+
+        elif report == "kw-trend":
+            if not kw_1:
+                raise ValueError("The 'kw-trend' report needs a keyword (--kw).")
+            df = self.st.get_kws_by_date(kw_1, kw_2)
+            saved_files.append(self.write_report(df, "keyword_trend"))
+            if self.gm:
+                saved_files += self.gm.plot_kws_by_date_graph(df, kw_1, kw_2, date_bucket=date_bucket)
+
+        elif report == "stats":
+            stats = self.st.get_detailed_statistics()
+            if self.out_dir == "-":
+                sys.stdout.write(json.dumps(stats) + "\n")
+                saved_files.append("-")
+            else:
+                os.makedirs(self.out_dir, exist_ok=True)
+                file_path = os.path.join(self.out_dir, "scrape_statistics.json")
+                with open(file_path, "w") as file:
+                    json.dump(stats, file, indent=4)
+                saved_files.append(file_path)
+
+        elif report == "snapshot":
+            from snapshot_export import SnapshotExporter
+            exporter = SnapshotExporter(self.st, export_dir=self.snapshot_dir, file_format=self.snapshot_format)
+            saved_files += exporter.export_articles(full=self.snapshot_full)
+            saved_files += exporter.export_aggregates()
+
+        return saved_files
+
+
+    def close(self):
+        if self.gm:
+            self.gm.close()
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Run the analytics reports without the interactive menu.")
+    parser.add_argument("reports", nargs="+", choices=AnalyzeCLI.reports, help="one or more reports to run (in one process, sharing the loaded articles)")
+    parser.add_argument("--db", default="sql_data.db", help="database file (default: sql_data.db)")
+    parser.add_argument("--format", default="csv", choices=AnalyzeCLI.formats, help="output format of the report data (default: csv)")
+    parser.add_argument("--out", default="exports/reports/", help="output directory, or '-' for stdout (default: exports/reports/)")
+    parser.add_argument("--charts", action="store_true", help="also render the HTML charts to exports/")
+    parser.add_argument("--chart-mode", default="standalone", choices=["standalone", "shared", "dashboard"], help="chart export mode (default: standalone)")
+    parser.add_argument("--top-n", type=int, default=100, help="amount of keywords in the top keywords chart (default: 100)")
+    parser.add_argument("--kw", default="", help="keyword for the 'kw-trend' report")
+    parser.add_argument("--kw2", default="", help="optional 2nd keyword for the 'kw-trend' report (comparison)")
+    parser.add_argument("--date-bucket", default="auto", choices=["auto", "day", "week", "month"], help="date bucket of the time series charts (default: auto)")
+    parser.add_argument("--dedup", action="store_true", help="count every story cluster (near-duplicate articles) only once")
+    parser.add_argument("--classifier", default="hits", choices=["hits", "tfidf"], help="article classification: most weighted keyword hits, or TF-IDF weighted scores (default: hits)")
+    parser.add_argument("--snapshot-dir", default="exports/snapshot/", help="output directory of the 'snapshot' report (default: exports/snapshot/)")
+    parser.add_argument("--snapshot-format", default="parquet", choices=["parquet", "arrow"], help="file format of the 'snapshot' report (default: parquet)")
+    parser.add_argument("--profile", action="store_true", help="profile every analytics operation (timings, memory, cProfile dumps + history in profiles/)")
+    parser.add_argument("--full", action="store_true", help="rewrite all article partitions of the 'snapshot' report instead of only the new scrape dates")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+
+    if sql.execute(args.db, "SELECT name FROM sqlite_master WHERE type='table' AND name='articles';") == [] or \
+       sql.execute(args.db, "SELECT count(*) FROM articles;")[0][0] == 0:
+        logging.error(f"Nothing to analyze (0 articles in '{args.db}').")
+        return 1
+
+    cli = AnalyzeCLI(database=args.db, out_dir=args.out, output_format=args.format, charts=args.charts,
+                     chart_export_mode=args.chart_mode, dedup_clusters=args.dedup, snapshot_dir=args.snapshot_dir,
+                     snapshot_format=args.snapshot_format, snapshot_full=args.full, classification_mode=args.classifier,
+                     profile=args.profile)
+
+    try:
+        for report in args.reports:
+            for file in cli.run_report(report, top_n=args.top_n, kw_1=args.kw.lower().strip(), kw_2=args.kw2.lower().strip(), date_bucket=args.date_bucket):
+                if file != "-":
+                    print(f"{report}: {file}", file=sys.stderr)
+
+    except (ValueError, ImportError) as e:
+        logging.error(e)
+        return 1
+
+    finally:
+        cli.close()
+        if cli.profiler:
+            cli.profiler.print_history(last=3)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,116 +1,107 @@
 # Standard modules
 import re
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import sqlite_x33 as sql
 from collections import defaultdict
-
-# Custom made modules
-from country_names import CountryNames
+from corpus_store import CorpusStore
+from identifier_model import IdentifierModel
+from reclassifier import Reclassifier
 
 
 class ArticleStatistics():
     """Uses Pandas to sift through and analyze data."""
 
-    def __init__(self, database):
+    def __init__(self, database, dedup_clusters: bool = False, classification_mode: str = "hits"):
 
         self.db = database
-        self.db_articles = sql.execute(self.db, "SELECT * FROM articles;") # articles from the sql database
-        self.df_articles = pd.DataFrame(self.db_articles, columns=["url", "date", "text"]) # DataFrame from articles table in sql database
-        self.article_texts_list = [article[2].split() for article in self.db_articles] # a list of all article words, not changing their original order within the texts
-        self.articles_words_list = [word for lst in self.article_texts_list for word in lst] # all articles' words in a list
-
-        # text filters (keyword/categories) from the database
-        self.db_cat_kw = sql.execute(self.db, """
-                                  SELECT keyword, cat.category FROM keywords
-                                  JOIN categories cat ON category_id = cat.id;""")
-        
-        # saving separate lists for keywords - 1 for single keywords and 1 for multiple keywords (phrases)
-        # this technique a is used to speed up performance. It's a lot slower if we only go on a general filtering of both types
-        self.single_kw = [(keyword, category) for keyword, category in self.db_cat_kw if " " not in keyword] # keywords consisting of a single word
-        self.phrase_kw = [(keyword, category) for keyword, category in self.db_cat_kw if " " in keyword] # phrases consisting of multiple words
+        self.classification_mode = classification_mode # "hits" (weighted keyword hits) or "tfidf" (TF-IDF weighted keyword scores)
+
+        # memory-mapped token IDs of all articles (only the articles stored since the last analysis get added)
+        self.corpus = CorpusStore(self.db)
+        self.corpus.update()
+        self.corpus.open()
+
+        # (only the articles that are in the corpus store, in case the scraper stores new ones in the meantime)
+        if dedup_clusters:
+            # only the first stored copy of every story cluster (near-duplicates found at ingest) gets counted
+            self.db_articles = sql.execute(self.db, """
+                                        SELECT a.rowid, a.url, a.scrape_date FROM articles a
+                                        LEFT JOIN article_fingerprints fp ON fp.url = a.url
+                                        WHERE (fp.cluster_url IS NULL OR fp.cluster_url = a.url) AND a.rowid <= ?
+                                        ORDER BY a.rowid;""", (self.corpus.meta["last_rowid"],))
+        else:
+            self.db_articles = sql.execute(self.db, "SELECT rowid, url, scrape_date FROM articles WHERE rowid <= ? ORDER BY rowid;",
+                                           (self.corpus.meta["last_rowid"],)) # articles from the sql database
 
-        # saving separate lists for country names - 1 for full info, 1 for single country names and 1 for multiple country names
-        self.countries = [(country.lower(), data['iso3']) for country, data in CountryNames().get_dict().items()]
-        self.countries_multi = [(country.lower(), data['iso3']) for country, data in CountryNames().get_dict().items() if " " in country]
+        # DataFrame from articles table in sql database (the article texts are only read from the corpus store)
+        self.df_articles = pd.DataFrame([article[1:] for article in self.db_articles], columns=["url", "date"])
+
+        # the corpus store articles that are analyzed (all of them, or without the near-duplicates) - same order as df_articles
+        self.article_mask = np.isin(self.corpus.rowids, [article[0] for article in self.db_articles])
+        self.article_indices = np.flatnonzero(self.article_mask)
+
+        # text filters (keyword/categories) from the database, compiled to integer IDs (cached until the identifiers get edited)
+        self.identifiers = IdentifierModel.load(self.db)
+
+        # the country names are loaded the first time they're needed (country_converter is slow to load)
+        self.countries = None
+        self.countries_multi = None
 
         # custom tqdm loading bar format
         self.custom_bar = "    [{bar:30}] {percentage:3.0f}%  "
         tqdm.pandas(bar_format=self.custom_bar, ascii=" =", leave=False)
 
+        # main category of every article, classified once and shared by all the category statistics
+        self.article_categories = None
 
-    def _classify_text(self, text) -> str:
-        """Decides the main category of a text based on keyword hits."""
 
-        ## Phrase hits - direct search in the articles
-        category_hits = defaultdict(int)
-        for phrase, category in self.phrase_kw:
-            category_hits[category] += len(re.findall(phrase, text))
+    def _get_article_categories(self) -> list:
+        """Returns the main category of every article (same order as df_articles). Only loaded the first time it's called."""
 
-        ## Keyword hits - reverse search in the articles, starting with a count of unique keywords in the actual articles
-        # Get a word count of unique words in all articles.
-        article_words = text.split()
-        for keyword, category in self.single_kw:
-            category_hits[category] += article_words.count(keyword)
+        if self.article_categories is None:
+            # the stored classification is brought up to date first (only the new articles and the articles containing edited keywords get rescored)
+            Reclassifier(self.db, self.classification_mode, corpus=self.corpus).sync()
 
-        # Determine the most common category among the keyword hits
-        category, count = list(category_hits.keys()), list(category_hits.values())
-        main_category = [category[count.index(max(count))]][0] # getting the dict key (category) which has the highest amount of hits (keywords)
+            stored_categories = dict(sql.execute(self.db, """
+                                                 SELECT url, cat.category FROM article_classification
+                                                 JOIN categories cat ON category_id = cat.id;"""))
+            self.article_categories = [stored_categories.get(url) for url in self.df_articles["url"]]
 
-        return main_category # Return the category with the most hits.
-    
+        return self.article_categories
 
-    def _count_occurences(self, text: str, kw: str) -> int:
-        """Counts the amount of occurences of the given keyword."""
 
-        keyword = kw
-        keyword_hits = defaultdict(int)
+    def get_article_details(self) -> pd.DataFrame:
+        """Main category and token count of every article, with the same index as df_articles."""
 
-        ## Phrase hits (multiple words) - direct search in the articles
-        if " " in kw:
-            pattern = fr"\b{keyword}\b"
-            keyword_hits["kw_count"] += len(re.findall(pattern, text))
+        return pd.DataFrame({"category": self._get_article_categories(), "token_count": self.corpus.article_lengths()[self.article_indices]},
+                            index=self.df_articles.index)
 
-        ## Keyword hits - reverse search in the articles, starting with a count of unique keywords in the actual articles
-        # Get a word count of unique words in all articles.
-        else:
-            article_words = text.split()
-            keyword_hits["kw_count"] += article_words.count(keyword)
-
-        return keyword_hits # Return the amount of occurences of the given keyword
 
+    def _get_words_count(self) -> pd.DataFrame:
+        """Counts every unique word in all articles (a bincount over the token IDs of the corpus store)."""
 
-    def get_top_kw(self) -> pd.DataFrame:
-        """Counts keyword hits in all articles, using different methods for single word keywords and multiple word phrases, for optimal speed."""
+        counts = self.corpus.word_counts(self.article_mask)
+        token_ids = np.flatnonzero(counts)
 
-        ## Phrase hits (multiple keywords) - counting phrase hits in all articles.
-        phrases_hit_count = defaultdict(int)
-        for article in tqdm(self.df_articles["text"], bar_format=self.custom_bar, ascii=" =", leave=False):
-            for phrase, _ in self.phrase_kw:
-                phrases_hit_count[phrase] += len(re.findall(phrase, article))
-        df_phrases_hits = pd.DataFrame(phrases_hit_count.items(), columns=["phrase", "count"])
+        return pd.DataFrame({"word": [self.corpus.vocab[token_id] for token_id in token_ids], "count": counts[token_ids]})
 
-        ## Single keyword hits - counting unique words in all articles.
-        words_count = defaultdict(int)
-        for word in tqdm(self.articles_words_list, bar_format=self.custom_bar, ascii=" =", leave=False):
-            words_count[word] += 1
-        df_all_articles_words_count = pd.DataFrame(words_count.items(), columns=["word", "count"])
 
-        # Dataframe of the keywords/categories from the sql database
-        df_keywords = pd.DataFrame(self.db_cat_kw, columns=["keyword", "category"])
-
-        # By merging keywords table with article words counts, we get a DF with single keyword hit counts
-        df_singles_result = df_keywords.merge(df_all_articles_words_count, left_on="keyword", right_on="word")
-        del df_singles_result["word"]
+    def get_top_kw(self) -> pd.DataFrame:
+        """Counts keyword hits in all articles, using different methods for single word keywords and multiple word phrases, for optimal speed."""
 
-        # By merging keywords table with phrases hit counts, we get a DF of all phrases hit counts.
-        df_phrases_result = df_keywords.merge(df_phrases_hits, left_on="keyword", right_on="phrase")
-        del df_phrases_result["phrase"]
+        # keyword hits of all keywords (index = keyword ID) - a bincount over the token IDs for the single keywords, token ID sequence matches for the phrases
+        keyword_counts = self.identifiers.keyword_counts(self.corpus, self.article_mask)
 
-        ## Finalize data - combining data for both single keyword + multiple keywords (phrases)
+        # single keywords without any hits are left out, phrases are always listed
+        keyword_ids = [keyword_id for keyword_id in range(len(self.identifiers)) if keyword_counts[keyword_id] or " " in self.identifiers.keywords[keyword_id]]
 
-        # Adding together the hit count DFs for both phrases and single keywords
-        df_output = pd.concat([df_singles_result, df_phrases_result])
+        df_output = pd.DataFrame({
+            "keyword": [self.identifiers.keywords[keyword_id] for keyword_id in keyword_ids],
+            "category": [self.identifiers.categories[self.identifiers.keyword_category_ids[keyword_id]] for keyword_id in keyword_ids],
+            "count": keyword_counts[keyword_ids],
+        })
         df_output = df_output.sort_values(by=["count"], ascending=False)  # Sort DataFrame by "count"
         df_output = df_output.reset_index(level=0, drop=True)
        
@@ -121,9 +112,7 @@ class ArticleStatistics():
         """Counts articles per category and groups by date."""
 
         categorized_articles = defaultdict(int)
-        for article in tqdm(self.df_articles["text"], bar_format=self.custom_bar, ascii=" =", leave=False):
-
-            main_category = self._classify_text(article) # Run _classify_text on the article, getting the most prominent category for the article.
+        for main_category in self._get_article_categories(): # the most prominent category for every article
             categorized_articles[main_category] += 1
 
         ## Finalize data - create a final "output" dataframe
@@ -138,10 +127,10 @@ class ArticleStatistics():
         """Counts articles per category and date (scrape-date)"""
 
         # Make a working copy of the articles dataframe, leaving out the url column.
-        df_articles = self.df_articles[["date", "text"]]
+        df_articles = self.df_articles[["date"]].copy()
         
-        # Run the text classifier on each article and add the main category to the new "label" column.
-        df_articles["category"] = df_articles["text"].progress_apply(self._classify_text)
+        # Add the main category of each article to the new "category" column.
+        df_articles["category"] = self._get_article_categories()
 
         # This line of code groups the DataFrame df_articles by two columns, 'date' and 'category', 
         # and then size() calculates the number of occurrences of each combination of the 'date' and 'category' columns
@@ -169,43 +158,14 @@ class ArticleStatistics():
         else:
             search_for_2_kws = True
 
-        # make a working copy of the articles dataframe, leaving out the url column.
-        df_kws_per_date = self.df_articles[["date", "text"]]
+        # make a working copy of the articles dataframe, leaving out the url and text columns.
+        df_kws_per_date = self.df_articles[["date"]].copy()
 
-        # setting up the keyword count columns and the actual count (defdict)
-        df_kws_per_date[keyword_1] = 0
-        kw_1_count = defaultdict(int)
+        # keyword occurences (whole words/phrases) in every article, counted over the token IDs of the corpus store
+        df_kws_per_date[keyword_1] = self.corpus.counts_per_article(keyword_1)[self.article_indices]
 
         if search_for_2_kws:
-            df_kws_per_date[keyword_2] = 0
-            kw_2_count = defaultdict(int)
-
-        total_articles = len(self.df_articles["text"])
-
-        if search_for_2_kws == False:
-
-            for i, article in tqdm(enumerate(self.df_articles["text"]), total=total_articles, bar_format=self.custom_bar, ascii=" =", leave=False):
-
-                # run _count_occurences on the article text, getting the amount of keyword occurences
-                kw_1_count = self._count_occurences(article, kw_1) 
-
-                # saving the amount to the proper column and row(i) in the DataFrame
-                df_kws_per_date.loc[i, keyword_1] = kw_1_count["kw_count"]
-        
-        else:
-
-            for i, article in tqdm(enumerate(self.df_articles["text"]), total=total_articles, bar_format=self.custom_bar, ascii=" =", leave=False):
-
-                # run _count_occurences on the article text, getting the amount of keyword occurences
-                kw_1_count = self._count_occurences(article, kw_1) 
-                kw_2_count = self._count_occurences(article, kw_2)
-
-                # saving the amount to the proper column and row(i) in the DataFrame
-                df_kws_per_date.loc[i, keyword_1] = kw_1_count["kw_count"]
-                df_kws_per_date.loc[i, keyword_2] = kw_2_count["kw_count"]
-
-        # dropping the article text column
-        df_kws_per_date = df_kws_per_date.drop("text", axis=1)
+            df_kws_per_date[keyword_2] = self.corpus.counts_per_article(keyword_2)[self.article_indices]
 
         # setting "date" as the new index
         df_kws_per_date = df_kws_per_date.set_index("date")
@@ -226,8 +186,7 @@ class ArticleStatistics():
         total_articles = len(self.df_articles)
       
         categorized_articles = defaultdict(lambda: defaultdict(int))
-        for url, article in tqdm(zip(self.df_articles["url"], self.df_articles["text"]), total=total_articles, bar_format=self.custom_bar, ascii=" =", leave=False):
-            main_category = self._classify_text(article)
+        for url, main_category in tqdm(zip(self.df_articles["url"], self._get_article_categories()), total=total_articles, bar_format=self.custom_bar, ascii=" =", leave=False):
             domain = re.sub(r"^https://(www.)?|/.*", "", url)
             categorized_articles[domain][main_category] += 1
 
@@ -251,16 +210,21 @@ class ArticleStatistics():
     def get_country_mentions(self) -> pd.DataFrame:
         """Counts country mentions in all articles, using 2 different methods for single country names and multiple country names, for optimal speed."""
 
+        # saving separate lists for country names - 1 for full info, 1 for single country names and 1 for multiple country names
+        if self.countries is None:
+            from country_names import CountryNames
+            dict_countries = CountryNames().get_dict()
+            self.countries = [(country.lower(), data['iso3']) for country, data in dict_countries.items()]
+            self.countries_multi = [(country.lower(), data['iso3']) for country, data in dict_countries.items() if " " in country]
+
         # Dataframe of all country names + iso3 codes
         df_countries = pd.DataFrame(self.countries, columns=["country", "iso3_country_code"])
 
         ## Countries with multiple names - counting hits in all articles
         # Countries (iso3) with multiple names - counting mentions in all articles.
         country_multi_count = defaultdict(int)
-        for article in tqdm(self.df_articles["text"], bar_format=self.custom_bar, ascii=" =", leave=False):
-            for country, iso3 in self.countries_multi:
-                pattern = fr"\b{country}\b"
-                country_multi_count[iso3] += len(re.findall(pattern, article))
+        for country, iso3 in tqdm(self.countries_multi, bar_format=self.custom_bar, ascii=" =", leave=False):
+            country_multi_count[iso3] += int(self.corpus.counts_per_article(country)[self.article_mask].sum())
         df_iso3_multi = pd.DataFrame(country_multi_count.items(), columns=["iso3_country_code", "count"])
 
         # Creating a DataFrame for countries and iso3 with multiple names
@@ -271,10 +235,7 @@ class ArticleStatistics():
 
         ## Countries with single names - counting hits in all articles
         # Counting unique words in all articles.
-        words_count = defaultdict(int)
-        for word in tqdm(self.articles_words_list, bar_format=self.custom_bar, ascii=" =", leave=False):
-            words_count[word] += 1
-        df_all_articles_words_count = pd.DataFrame(words_count.items(), columns=["word", "count"])
+        df_all_articles_words_count = self._get_words_count()
 
         # By merging the single country names DF with the article words counts, we get the actual DF that has the mentions for countries with single names
         df_singles_result = df_countries.merge(df_all_articles_words_count, left_on="country", right_on="word")
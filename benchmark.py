@@ -0,0 +1,487 @@
+# Standard modules
+import os
+import re
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import contextlib
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Third-party modules -> requirements.txt
+import numpy as np
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+from scraper import WebScraper
+from text_processor import TextProcessor
+
+
+class Benchmark():
+    """Offline benchmarks of the scrape pipeline (parsing + text cleaning) and the analytics, to spot speedups/regressions of a change.
+
+    - Analytics: runs on synthetic article databases (1k/10k/100k/1M rows) with a Zipf-distributed vocabulary and topic keywords.
+    - Parsers: replays saved HTML pages of every site in news_sites through WebScraper.parse_listing()/extract_text() and the TextProcessor.
+      Pages recorded with --record-fixtures are used when available, otherwise a synthetic page matching the site config is generated.
+
+    Every stage reports its throughput, latency percentiles (p50/p95/p99) and peak memory (tracemalloc)."""
+
+    def __init__(self, data_dir: str = "bench_data/", fixtures_dir: str = "bench_fixtures/", repeat: int = 5, seed: int = 33):
+
+        self.data_dir = data_dir # the generated databases (cached between runs)
+        self.fixtures_dir = fixtures_dir # the recorded HTML pages, one directory per domain
+        self.repeat = repeat # timed runs per stage
+        self.seed = seed
+        self.ws = WebScraper()
+        self.tp = TextProcessor()
+        self.results = {} # stage name -> stats
+        self._article_words = None # vocabulary of the synthetic article pages
+
+
+    ## Synthetic data
+
+    def _build_vocabulary(self, size: int = 20000) -> list:
+        """Pseudo-words (syllable combinations) mixed with the real keywords, ordered by how common they are."""
+
+        rng = random.Random(self.seed)
+        syllables = ["ka", "lo", "mi", "ter", "sen", "dra", "vo", "lin", "gar", "pe", "shu", "ne", "ri", "tan", "bel", "co", "mar", "dis", "port", "ven"]
+
+        words = set()
+        while len(words) < size:
+            words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+        words = sorted(words)
+        rng.shuffle(words)
+
+        # the keywords/phrase words get a rank between "common" and "rare", like topic words in real articles
+        keyword_words = sorted({word for keywords in data_init.db_categories_keywords.values() for keyword in keywords for word in keyword.split()})
+        for word in keyword_words:
+            words.insert(rng.randint(50, 3000), word)
+
+        return words
+
+
+    def generate_corpus(self, rows: int) -> str:
+        """Creates (or reuses) a synthetic article database with 'rows' articles. Returns the database path."""
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        db_path = os.path.join(self.data_dir, f"bench_{rows}.db")
+        if os.path.exists(db_path):
+            return db_path
+
+        tmp_path = f"{db_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        for query in data_init.db_tables:
+            sql.execute(tmp_path, query)
+
+        for category, keywords in data_init.db_categories_keywords.items():
+            sql.execute(tmp_path, "INSERT INTO categories (category) VALUES (?);", (category,))
+            category_id = sql.execute(tmp_path, "SELECT id FROM categories WHERE category = ?;", (category,))[0][0]
+            sql.execute_many(tmp_path, "INSERT OR IGNORE INTO keywords (keyword, category_id) VALUES (?, ?);", [(keyword, category_id) for keyword in keywords])
+
+        rng = np.random.default_rng(self.seed)
+        vocabulary = np.array(self._build_vocabulary())
+        zipf_weights = 1 / np.arange(1, len(vocabulary) + 1) ** 1.1
+        zipf_weights /= zipf_weights.sum()
+
+        topics = [keywords for keywords in data_init.db_categories_keywords.values()]
+        domains = [site["domain"] for site in data_init.news_sites]
+        start_date = datetime.now() - timedelta(days=365)
+        batch_size = 5000
+
+        print(f"    Generating {rows:,} synthetic articles -> {db_path}")
+
+        for batch_start in range(0, rows, batch_size):
+            batch_rows = min(batch_size, rows - batch_start)
+            lengths = np.clip(rng.normal(400, 150, batch_rows).astype(int), 50, 1500)
+            words = vocabulary[rng.choice(len(vocabulary), size=lengths.sum(), p=zipf_weights)]
+
+            articles = []
+            position = 0
+            for i, length in enumerate(lengths):
+                article_words = list(words[position:position + length])
+                position += length
+
+                # every article is about a topic, so a few percent of its words are that topic's keywords/phrases
+                topic = topics[rng.integers(len(topics))]
+                for _ in range(max(1, length // 40)):
+                    article_words[rng.integers(length)] = topic[rng.integers(len(topic))]
+
+                article_id = batch_start + i
+                url = f"https://{domains[article_id % len(domains)]}/article/bench-story-{article_id}"
+                scrape_date = (start_date + timedelta(days=int(article_id * 365 / rows))).strftime("%Y-%m-%d")
+                articles.append((url, scrape_date, " ".join(article_words)))
+
+            sql.execute_many(tmp_path, "INSERT INTO articles (url, scrape_date, content) VALUES (?, ?, ?);", articles)
+
+        os.replace(tmp_path, db_path)
+
+        return db_path
+
+
+    def _fixture_dir(self, site: dict) -> str:
+        return os.path.join(self.fixtures_dir, site["domain"])
+
+
+    def record_fixtures(self, articles_per_site: int = 3):
+        """Downloads the first listing page and a few article pages of every site, for the offline parser benchmarks."""
+
+        for site in data_init.news_sites:
+
+            fixture_dir = self._fixture_dir(site)
+            os.makedirs(fixture_dir, exist_ok=True)
+            page = site["pages"][0]
+            url_page = site["domain"] if page == "/" else f"{site['domain']}{page}"
+
+            try:
+                response = self.ws._try_request(f"{self.ws.url_start}{url_page}", data_init.headers)
+                with open(os.path.join(fixture_dir, "listing.html"), "w", encoding="utf-8") as file:
+                    file.write(response.text)
+
+                article_urls, _ = self.ws.parse_listing(response.text, site["domain"], url_page, site["url_filter"], site["url_exclusion"], site["pagin_filter"])
+                for i, url in enumerate(article_urls[:articles_per_site]):
+                    response = self.ws._try_request(url, data_init.headers)
+                    with open(os.path.join(fixture_dir, f"article_{i}.html"), "w", encoding="utf-8") as file:
+                        file.write(response.text)
+
+                print(f"    Recorded {site['domain']} (1 listing page, {min(len(article_urls), articles_per_site)} article pages)")
+
+            except Exception as e:
+                print(f"    Couldn't record {site['domain']}: {e}")
+
+
+    def synthetic_listing(self, site: dict, first_story: int = 0, stories: int = 60, next_page: str = None) -> str:
+        """A listing page with article links that pass the url filter of the site (+ a pagination link that matches its pagin filter)."""
+
+        domain = site["domain"]
+
+        # a link format that passes the url filter of the site
+        link_formats = [
+            "/article/story-{i}-a1b2c3", "/entry/story-{i}_n64a1b2c3", "/2024/05/01/world/story-{i}", "/world/news-story/{i}a1b2c3",
+            "/story/2024-05-01/story-{i}", "/news/world-6{i:07d}", "/news/world/story-{i}-b2{i:06d}.html", "/world/2024/may/01/story-{i}",
+            "/world/2024-05-01-story-{i}", "https://www." + domain + "/world/a-long-story-about-the-news-number-{i:06d}",
+        ]
+        link_format = next((link for link in link_formats if re.search(site["url_filter"], link.format(i=1))), link_formats[0])
+        links = "\n".join(f'<li><h3><a href="{link_format.format(i=i)}">Story {i}</a></h3></li>' for i in range(first_story, first_story + stories))
+
+        pagination = ""
+        if next_page and site["pagin_filter"]:
+            pagination = f'<a class="{site["pagin_filter"]} next" href="{next_page}">Next</a>'
+
+        return f'<html><body><nav><a href="/">Home</a><a href="https://twitter.com/{domain}">Twitter</a></nav><ul>{links}</ul>{pagination}</body></html>'
+
+
+    def synthetic_article(self, site: dict, seed: int = None) -> str:
+        """An article page with 15 paragraphs inside a container that matches the div filter of the site."""
+
+        rng = random.Random(self.seed if seed is None else seed)
+        if self._article_words is None:
+            self._article_words = self._build_vocabulary(2000)
+        words = self._article_words
+
+        # the 1st alternative of the div filter as the class name of the article text container
+        div_class = re.sub(r"[\\^$.*+?()\[\]{}]", "", site["div_filter"].split("|")[0]) or "article"
+        paragraphs = "\n".join(f"<p>{' '.join(rng.choice(words).capitalize() if j == 0 else rng.choice(words) for j in range(60))}, the 12 o'clock news.</p>"
+                               for _ in range(15))
+
+        return f'<html><body><header>Menu</header><div class="{div_class}"><figure><figcaption><p>Photo</p></figcaption></figure>{paragraphs}</div></body></html>'
+
+
+    def _synthetic_pages(self, site: dict) -> tuple:
+        """A listing page + an article page that match the site config (for sites without recorded pages). Returns (listing html, [article html])."""
+        return self.synthetic_listing(site), [self.synthetic_article(site)]
+
+
+    def load_fixtures(self, site: dict) -> tuple:
+        """The recorded pages of a site, or synthetic ones. Returns (listing html, [article html], recorded)."""
+
+        fixture_dir = self._fixture_dir(site)
+        listing_file = os.path.join(fixture_dir, "listing.html")
+
+        if not os.path.exists(listing_file):
+            return (*self._synthetic_pages(site), False)
+
+        with open(listing_file, "r", encoding="utf-8") as file:
+            listing = file.read()
+
+        articles = []
+        for file_name in sorted(os.listdir(fixture_dir)):
+            if file_name.startswith("article_"):
+                with open(os.path.join(fixture_dir, file_name), "r", encoding="utf-8") as file:
+                    articles.append(file.read())
+
+        return listing, articles, True
+
+
+    ## Measuring
+
+    def measure(self, stage: str, func, items: int = 1, repeat: int = None, setup=None) -> dict:
+        """Times 'func' 'repeat' times (+ 1 untimed warm-up run) and measures its peak memory in an extra run under tracemalloc.
+        'items' = amount of rows/pages processed per call (for the throughput), 'setup' runs untimed before every call."""
+
+        repeat = repeat or self.repeat
+        latencies = []
+
+        for run in range(repeat + 1):
+            if setup:
+                setup()
+            gc.collect()
+            start = time.perf_counter()
+            func()
+            if run: # the 1st run is a warm-up (imports, caches, page cache)
+                latencies.append(time.perf_counter() - start)
+
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies = np.array(latencies)
+        stats = {
+            "runs": repeat,
+            "items": items,
+            "throughput": items / latencies.mean() if latencies.mean() else 0.0, # items per second
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "peak_memory_mb": peak_memory / 1024 ** 2,
+        }
+        self.results[stage] = stats
+
+        print(f"    {stage:<48} {stats['throughput']:>12,.1f}/s  p50 {stats['p50'] * 1000:>10.2f} ms  p95 {stats['p95'] * 1000:>10.2f} ms  "
+              f"p99 {stats['p99'] * 1000:>10.2f} ms  peak {stats['peak_memory_mb']:>8.1f} MB")
+
+        return stats
+
+
+    ## Stages
+
+    def bench_parsers(self):
+        """Replays the listing/article pages of every site through the parsers and the text cleaner."""
+
+        print(f"\n    ---- Parsers (offline HTML replay) ----")
+
+        for site in data_init.news_sites:
+            domain = site["domain"]
+            listing, articles, recorded = self.load_fixtures(site)
+            url_page = domain if site["pages"][0] == "/" else f"{domain}{site['pages'][0]}"
+            source = "recorded" if recorded else "synthetic"
+
+            self.measure(f"parse_listing/{domain} ({source})",
+                         lambda: self.ws.parse_listing(listing, domain, url_page, site["url_filter"], site["url_exclusion"], site["pagin_filter"]))
+
+            texts = []
+            def extract_all():
+                texts.clear()
+                for html in articles:
+                    try:
+                        texts.append(self.ws.extract_text(html, site["div_filter"], site["p_attr_exclusion"]))
+                    except ValueError: # pages without usable article text still count, they're parsed all the same
+                        pass
+
+            self.measure(f"extract_text/{domain} ({source})", extract_all, items=len(articles))
+
+            if texts:
+                self.measure(f"text_cleaner/{domain} ({source})", lambda: [self.tp.text_cleaner(text) for text in texts], items=len(texts))
+
+
+    def bench_analytics(self, rows: int):
+        """Runs the analytics stages on a synthetic database."""
+
+        # imported here, so the parser benchmarks don't need pandas/scipy
+        from corpus_store import CorpusStore
+        from identifier_model import IdentifierModel
+        from article_statistics import ArticleStatistics
+
+        db_path = self.generate_corpus(rows)
+        repeat = self.repeat if rows <= 10000 else max(1, self.repeat // 3)
+
+        print(f"\n    ---- Analytics ({rows:,} articles) ----")
+
+        corpus = CorpusStore(db_path)
+        self.measure(f"analytics/{rows}/corpus_build", lambda: corpus.update(), items=rows, repeat=repeat, setup=corpus.clear)
+        corpus.update()
+        corpus.open()
+
+        st = ArticleStatistics(db_path)
+        model = IdentifierModel.load(db_path)
+
+        def reset_classification():
+            st.article_categories = None
+            sql.execute(db_path, "DELETE FROM app_meta WHERE key LIKE 'classification_%';")
+
+        self.measure(f"analytics/{rows}/stats_init", lambda: ArticleStatistics(db_path), items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/classify_hits", lambda: model.classify(corpus, "hits"), items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/classify_tfidf", lambda: model.classify(corpus, "tfidf"), items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/top_cats_cold", st.get_top_cats, items=rows, repeat=repeat, setup=reset_classification)
+        self.measure(f"analytics/{rows}/top_cats", st.get_top_cats, items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/cats_by_date", st.get_cats_by_date, items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/cats_by_domain", st.get_cats_by_domain, items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/top_kw", st.get_top_kw, items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/kw_trend", lambda: st.get_kws_by_date("economy", "climate change"), items=rows, repeat=repeat)
+        self.measure(f"analytics/{rows}/country_mentions", st.get_country_mentions, items=rows, repeat=repeat)
+
+
+    def bench_crawl(self, pagin_amount: int = 1, articles_per_page: int = 10, faults: dict = None):
+        """Runs the whole crawl (url discovery + article scraping into a fresh database) against the local mock news server:
+        listing page crawl with 1 request at a time (fixed delays), listing page crawl paced by the adaptive controller (parallel requests
+        per site), and sitemap/RSS discovery paced by the adaptive controller."""
+
+        # imported here, so the other benchmarks don't need the scraper
+        from main import NewsScraper
+        from mock_news_server import MockNewsServer
+        from adaptive_controller import AdaptiveController
+
+        faults = faults or {}
+        db_path = os.path.join(self.data_dir, "bench_crawl.db")
+        os.makedirs(self.data_dir, exist_ok=True)
+        repeat = min(self.repeat, 3)
+        crawl = {}
+
+        print(f"\n    ---- Crawl (mock news server, pagination {pagin_amount}{', faults: ' + str(faults) if faults else ''}) ----")
+
+        with MockNewsServer(port=0, fixtures_dir=self.fixtures_dir, articles_per_page=articles_per_page, seed=self.seed, **faults) as server:
+
+            for mode in ("fixed", "adaptive", "feeds"):
+
+                def setup():
+                    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    ns = NewsScraper(database=db_path)
+                    ns.ws.upstream = server.url
+                    ns.ws.sleep_range = (0, 0) # no politeness delays and short retries against the local server
+                    ns.ws.retry_delay = 0.05
+                    ns.ws.timeout = 2
+                    ns.ws.controller = AdaptiveController(initial_delay=0.05, min_delay=0.005, max_concurrency=4, rate_step=10, initial_timeout=2, min_timeout=0.5, max_timeout=5) if mode != "fixed" else None
+                    ns.discovery_mode = "feeds" if mode == "feeds" else "html"
+                    crawl["ns"] = ns
+
+                def run_crawl():
+                    ns = crawl["ns"]
+                    with contextlib.redirect_stdout(open(os.devnull, "w")):
+                        ns.scrape_domains(pagin_amount, debug_mode=False)
+                        crawl["stored"], crawl["omitted"] = ns.scrape_article_urls(debug_mode=False)
+                    ns.metrics.flush()
+
+                # 1 untimed run to get the amount of articles for the throughput
+                setup()
+                run_crawl()
+                self.measure(f"crawl/pagination_{pagin_amount}{'' if mode == 'fixed' else '_' + mode}", run_crawl, items=crawl["stored"], repeat=repeat, setup=setup)
+                print(f"    {mode}: {crawl['stored']:,} articles stored, {crawl['omitted']:,} omitted per crawl")
+
+            responses = {}
+            for (_, status_code), count in server.stats().items():
+                responses[status_code] = responses.get(status_code, 0) + count
+
+        responses = [f"{status_code if status_code else 'hang'}: {count:,}" for status_code, count in sorted(responses.items())]
+        print(f"    Responses (all runs): {', '.join(responses)}")
+
+
+    ## Baselines
+
+    def save_baseline(self, file_path: str):
+
+        baseline = {
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "results": self.results,
+        }
+        with open(file_path, "w") as file:
+            json.dump(baseline, file, indent=4)
+
+        print(f"\n    Saved the baseline to '{file_path}'.")
+
+
+    def compare(self, file_path: str, threshold: float = 0.10) -> list:
+        """Compares the results with a saved baseline. Returns the stages that got slower (p50) or use more memory than 'threshold' (10%)."""
+
+        with open(file_path, "r") as file:
+            baseline = json.load(file)
+
+        print(f"\n    ---- Compared to the baseline from {baseline['created']} ({baseline['platform']}) ----")
+
+        regressions = []
+        for stage, stats in self.results.items():
+            base = baseline["results"].get(stage)
+            if not base:
+                continue
+
+            time_change = stats["p50"] / base["p50"] - 1 if base["p50"] else 0.0
+            memory_change = stats["peak_memory_mb"] / base["peak_memory_mb"] - 1 if base["peak_memory_mb"] else 0.0
+            regressed = time_change > threshold or memory_change > threshold
+            if regressed:
+                regressions.append(stage)
+
+            print(f"    {stage:<48} p50 {time_change:>+8.1%}  peak memory {memory_change:>+8.1%}{'  <- REGRESSION' if regressed else ''}")
+
+        print(f"\n    {len(regressions)} regression(s) over {threshold:.0%}.")
+
+        return regressions
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the parsers, the text cleaner and the analytics.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated article counts of the synthetic databases, e.g. 1000,10000,100000,1000000 (default: 1000,10000)")
+    parser.add_argument("--stages", default="parsers,analytics", help="comma separated stages to run: parsers, analytics, crawl (default: parsers,analytics)")
+    parser.add_argument("--crawl-pagination", type=int, default=1, help="pagination level of the 'crawl' stage (default: 1)")
+    parser.add_argument("--crawl-faults", default="", help="faults of the mock server in the 'crawl' stage, e.g. latency=0.02,error_rate=0.05,rate_limit_rate=0.02")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage (default: 5, fewer for the big databases)")
+    parser.add_argument("--data-dir", default="bench_data/", help="directory of the generated databases (default: bench_data/)")
+    parser.add_argument("--fixtures-dir", default="bench_fixtures/", help="directory of the recorded HTML pages (default: bench_fixtures/)")
+    parser.add_argument("--record-fixtures", action="store_true", help="download fresh HTML pages of every site for the parser benchmarks, then exit")
+    parser.add_argument("--save-baseline", metavar="FILE", help="save the results as a baseline (json)")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a saved baseline (json), exit code 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown/memory increase that counts as a regression (default: 0.10 = 10%%)")
+    parser.add_argument("--regenerate", action="store_true", help="regenerate the synthetic databases")
+    args = parser.parse_args(argv)
+
+    bench = Benchmark(data_dir=args.data_dir, fixtures_dir=args.fixtures_dir, repeat=args.repeat)
+
+    if args.record_fixtures:
+        bench.record_fixtures()
+        return 0
+
+    if args.regenerate and os.path.exists(args.data_dir):
+        shutil.rmtree(args.data_dir)
+
+    stages = [stage.strip() for stage in args.stages.split(",")]
+
+    if "parsers" in stages:
+        bench.bench_parsers()
+
+    if "analytics" in stages:
+        for rows in [int(size) for size in args.sizes.split(",")]:
+            try:
+                bench.bench_analytics(rows)
+            except sqlite3.Error as e:
+                print(f"    Analytics benchmark on {rows:,} articles failed: {e}")
+
+    if "crawl" in stages:
+        faults = {name: float(value) for name, value in (fault.split("=") for fault in args.crawl_faults.split(",") if fault)}
+        bench.bench_crawl(args.crawl_pagination, faults=faults)
+
+    if args.save_baseline:
+        bench.save_baseline(args.save_baseline)
+
+    if args.compare:
+        return 1 if bench.compare(args.compare, args.threshold) else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# Standard modules
+import os
+import re
+import json
+import shutil
+
+# Third-party modules -> requirements.txt
+import numpy as np
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+class CorpusStore():
+    """A memory-mapped, append-only copy of the article texts for the analytics, built incrementally from the 'articles' table.
+
+    Every word is interned to a token ID (vocab.txt) and all articles are stored back to back in one contiguous uint32 token buffer,
+    with an offsets array (end of every article) and per-article rowid/date/domain arrays. The analytics scan numpy views of the
+    memory-mapped files, so a cold analysis mostly means page cache reads instead of creating Python strings for every article/word."""
+
+    def __init__(self, database: str, store_dir: str = None):
+
+        self.db = database
+        self.store_dir = store_dir or f"{os.path.splitext(database)[0]}_corpus/" # e.g. sql_data_corpus/
+        self.meta_file = os.path.join(self.store_dir, "meta.json")
+        self.vocab_file = os.path.join(self.store_dir, "vocab.txt")
+        self.postings_dir = os.path.join(self.store_dir, "postings")
+
+        # binary array files -> numpy dtype
+        self.array_files = {"tokens": np.uint32, "offsets": np.int64, "rowids": np.int64, "date_ids": np.uint32, "domain_ids": np.uint32}
+
+        self.scan_chunk_size = 16_000_000 # tokens per chunk when counting over the whole token buffer
+
+        self.vocab = [] # token ID -> word
+        self.word_ids = {} # word -> token ID
+        self.meta = self._empty_meta()
+
+        # memory-mapped arrays (set by open())
+        self.tokens = None
+        self.offsets = None
+        self.starts = None
+        self.rowids = None
+        self.date_ids = None
+        self.domain_ids = None
+
+
+    @staticmethod
+    def _empty_meta() -> dict:
+        return {"article_count": 0, "token_count": 0, "vocab_size": 0, "last_rowid": 0, "dates": [], "domains": [], "posting_segments": []}
+
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.store_dir, f"{name}.bin")
+
+
+    def _read_meta(self):
+
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, "r") as file:
+                self.meta = json.load(file)
+        else:
+            self.meta = self._empty_meta()
+
+        self.vocab = []
+        if os.path.exists(self.vocab_file):
+            with open(self.vocab_file, "r", encoding="utf-8") as file:
+                self.vocab = file.read().split("\n")[:self.meta["vocab_size"]]
+        self.word_ids = {word: token_id for token_id, word in enumerate(self.vocab)}
+
+
+    def _write_meta(self):
+
+        # the meta file is written last (and atomically), so data appended by a crashed update is simply ignored/truncated
+        tmp_file = f"{self.meta_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(self.meta, file)
+        os.replace(tmp_file, self.meta_file)
+
+
+    def clear(self):
+        """Removes the stored corpus, the next update() rebuilds it from scratch."""
+
+        for name in self.array_files:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        for file in (self.vocab_file, self.meta_file):
+            if os.path.exists(file):
+                os.remove(file)
+        if os.path.exists(self.postings_dir):
+            shutil.rmtree(self.postings_dir)
+
+        self.meta = self._empty_meta()
+        self.vocab = []
+        self.word_ids = {}
+
+
+    def update(self, chunk_size: int = 1000) -> int:
+        """Appends the articles that were stored since the last update. Returns the amount of added articles."""
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._read_meta()
+
+        # rebuild from scratch if articles were deleted from the database since the last update
+        if self.meta["article_count"] and \
+           sql.execute(self.db, "SELECT count(*) FROM articles WHERE rowid <= ?;", (self.meta["last_rowid"],))[0][0] != self.meta["article_count"]:
+            self.clear()
+
+        # cut off anything that a crashed update appended after the last meta write
+        for name, dtype in self.array_files.items():
+            if os.path.exists(self._path(name)):
+                length = self.meta["token_count"] if name == "tokens" else self.meta["article_count"]
+                with open(self._path(name), "r+b") as file:
+                    file.truncate(length * np.dtype(dtype).itemsize)
+        if os.path.exists(self.vocab_file):
+            with open(self.vocab_file, "w", encoding="utf-8") as file:
+                file.write("".join(f"{word}\n" for word in self.vocab))
+
+        date_ids = {date: i for i, date in enumerate(self.meta["dates"])}
+        domain_ids = {domain: i for i, domain in enumerate(self.meta["domains"])}
+        new_words_start = len(self.vocab)
+        added_articles = 0
+
+        files = {name: open(self._path(name), "ab") for name in self.array_files}
+        try:
+            for rows in sql.iterate(self.db, "SELECT rowid, url, scrape_date, content FROM articles WHERE rowid > ? ORDER BY rowid;",
+                                    (self.meta["last_rowid"],), chunk_size):
+
+                chunk = {name: [] for name in self.array_files}
+
+                for rowid, url, date, content in rows:
+
+                    for word in content.split():
+                        token_id = self.word_ids.get(word)
+                        if token_id is None:
+                            token_id = self.word_ids[word] = len(self.vocab)
+                            self.vocab.append(word)
+                        chunk["tokens"].append(token_id)
+
+                    domain = re.sub(r"^https://(www.)?|/.*", "", url)
+                    if date not in date_ids:
+                        date_ids[date] = len(self.meta["dates"])
+                        self.meta["dates"].append(date)
+                    if domain not in domain_ids:
+                        domain_ids[domain] = len(self.meta["domains"])
+                        self.meta["domains"].append(domain)
+
+                    chunk["offsets"].append(self.meta["token_count"] + len(chunk["tokens"]))
+                    chunk["rowids"].append(rowid)
+                    chunk["date_ids"].append(date_ids[date])
+                    chunk["domain_ids"].append(domain_ids[domain])
+
+                for name, dtype in self.array_files.items():
+                    np.asarray(chunk[name], dtype=dtype).tofile(files[name])
+
+                self.meta["token_count"] += len(chunk["tokens"])
+                self.meta["article_count"] += len(rows)
+                self.meta["last_rowid"] = rows[-1][0]
+                added_articles += len(rows)
+
+        finally:
+            for file in files.values():
+                file.close()
+
+        with open(self.vocab_file, "a", encoding="utf-8") as file:
+            file.write("".join(f"{word}\n" for word in self.vocab[new_words_start:]))
+        self.meta["vocab_size"] = len(self.vocab)
+
+        self._write_meta()
+
+        return added_articles
+
+
+    def open(self):
+        """Memory-maps the stored arrays (read-only). Only the pages that are actually scanned get read from disk."""
+
+        self._read_meta()
+
+        for name, dtype in self.array_files.items():
+            length = self.meta["token_count"] if name == "tokens" else self.meta["article_count"]
+            # (numpy can't memory-map empty files)
+            array = np.memmap(self._path(name), dtype=dtype, mode="r", shape=(length,)) if length else np.zeros(0, dtype=dtype)
+            setattr(self, name, array)
+
+        self.starts = np.concatenate(([0], self.offsets[:-1])) if len(self.offsets) else np.zeros(0, dtype=np.int64)
+
+        return self
+
+
+    def __len__(self) -> int:
+        return self.meta["article_count"]
+
+
+    def article_tokens(self, i: int) -> np.ndarray:
+        """Token IDs of the i:th article (a view, no copy)."""
+        return self.tokens[self.starts[i]:self.offsets[i]]
+
+
+    def article_lengths(self) -> np.ndarray:
+        """Amount of tokens (words) of every article."""
+        return self.offsets - self.starts
+
+
+    def encode(self, text: str) -> list:
+        """Token IDs of the words of a keyword/phrase, or None if any of its words never occurs in the corpus."""
+
+        token_ids = [self.word_ids.get(word) for word in text.split()]
+        return None if not token_ids or None in token_ids else token_ids
+
+
+    def word_counts(self, article_mask: np.ndarray = None) -> np.ndarray:
+        """Occurences of every token ID (index = token ID) in all articles, or only in the articles of the boolean 'article_mask'."""
+
+        # counted in chunks, np.bincount would otherwise make an int64 copy of the whole token buffer
+        counts = np.zeros(len(self.vocab), dtype=np.int64)
+        for chunk_start in range(0, len(self.tokens), self.scan_chunk_size):
+            counts += np.bincount(self.tokens[chunk_start:chunk_start + self.scan_chunk_size], minlength=len(self.vocab))
+
+        # subtracting the few excluded articles (e.g. near-duplicates) is cheaper than copying the tokens of all included articles
+        if article_mask is not None and not article_mask.all():
+            excluded_tokens = np.concatenate([self.article_tokens(i) for i in np.flatnonzero(~article_mask)])
+            counts -= np.bincount(excluded_tokens, minlength=len(self.vocab))
+
+        return counts
+
+
+    def phrase_positions(self, token_ids: list) -> np.ndarray:
+        """Positions (in the token buffer) where the token ID sequence starts, without matches crossing the boundary of an article."""
+
+        phrase_length = len(token_ids)
+        if len(self.tokens) < phrase_length:
+            return np.zeros(0, dtype=np.int64)
+
+        positions = np.flatnonzero(self.tokens[:len(self.tokens) - phrase_length + 1] == token_ids[0])
+        for i, token_id in enumerate(token_ids[1:], start=1):
+            positions = positions[self.tokens[positions + i] == token_id]
+
+        if phrase_length > 1:
+            positions = positions[self.article_index(positions) == self.article_index(positions + phrase_length - 1)]
+
+        return positions
+
+
+    def article_index(self, positions: np.ndarray) -> np.ndarray:
+        """Article index of token buffer positions."""
+        return np.searchsorted(self.offsets, positions, side="right")
+
+
+    def counts_per_article(self, text: str) -> np.ndarray:
+        """Occurences of a keyword or phrase (whole words) in every article."""
+
+        token_ids = self.encode(text)
+        if token_ids is None:
+            return np.zeros(len(self), dtype=np.int64)
+
+        return np.bincount(self.article_index(self.phrase_positions(token_ids)), minlength=len(self))
+
+
+    def subset(self, article_indices: np.ndarray):
+        """An in-memory corpus of only the given articles (copies just their tokens), with the same vocabulary/token IDs."""
+
+        article_indices = np.asarray(article_indices, dtype=np.int64)
+        corpus = CorpusStore(self.db, self.store_dir)
+
+        corpus.vocab = self.vocab
+        corpus.word_ids = self.word_ids
+        corpus.meta = dict(self.meta, article_count=len(article_indices))
+
+        token_views = [self.article_tokens(i) for i in article_indices]
+        corpus.tokens = np.concatenate(token_views) if token_views else np.zeros(0, dtype=np.uint32)
+        corpus.offsets = np.cumsum([len(view) for view in token_views], dtype=np.int64)
+        corpus.starts = np.concatenate(([0], corpus.offsets[:-1])) if len(corpus.offsets) else np.zeros(0, dtype=np.int64)
+        corpus.rowids = self.rowids[article_indices]
+        corpus.date_ids = self.date_ids[article_indices]
+        corpus.domain_ids = self.domain_ids[article_indices]
+        corpus.meta["token_count"] = len(corpus.tokens)
+
+        return corpus
+
+
+    def _segment_path(self, segment: list, name: str) -> str:
+        return os.path.join(self.postings_dir, f"{segment[0]}-{segment[1]}.{name}.npy")
+
+
+    def update_postings(self):
+        """Adds the new articles to the inverted index (token ID -> articles + occurences), which is stored in segments of article ranges.
+        Only the last segment (if it's still small) and the new articles get indexed, the older segments are never touched again."""
+
+        segments = self.meta.get("posting_segments", [])
+        indexed_articles = segments[-1][1] if segments else 0
+        if indexed_articles >= len(self):
+            return
+
+        os.makedirs(self.postings_dir, exist_ok=True)
+
+        # merge a small last segment (e.g. from the previous scrape) with the new articles, instead of piling up tiny segments
+        if segments and self.offsets[segments[-1][1] - 1] - self.starts[segments[-1][0]] < self.scan_chunk_size:
+            old_segment = segments.pop()
+            indexed_articles = old_segment[0]
+        else:
+            old_segment = None
+
+        lengths = self.article_lengths()
+        segment_start = indexed_articles
+        while segment_start < len(self):
+
+            # about 'scan_chunk_size' tokens per segment
+            segment_end = int(np.searchsorted(self.offsets, self.starts[segment_start] + self.scan_chunk_size, side="left")) + 1
+            segment_end = min(max(segment_end, segment_start + 1), len(self))
+            segment = [segment_start, segment_end]
+
+            segment_tokens = self.tokens[self.starts[segment_start]:self.offsets[segment_end - 1]].astype(np.uint64)
+            segment_articles = np.repeat(np.arange(segment_start, segment_end, dtype=np.uint64), lengths[segment_start:segment_end])
+
+            # unique (token ID, article) pairs sorted by token ID, + how often the token occurs in the article
+            keys, counts = np.unique((segment_tokens << np.uint64(32)) | segment_articles, return_counts=True)
+            posting_tokens = (keys >> np.uint64(32)).astype(np.int64)
+
+            np.save(self._segment_path(segment, "articles"), (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+            np.save(self._segment_path(segment, "counts"), counts.astype(np.uint32))
+            np.save(self._segment_path(segment, "offsets"), np.searchsorted(posting_tokens, np.arange(len(self.vocab) + 1)).astype(np.int64))
+
+            segments.append(segment)
+            segment_start = segment_end
+
+        self.meta["posting_segments"] = segments
+        self._write_meta()
+
+        if old_segment is not None and old_segment not in segments:
+            for name in ("articles", "counts", "offsets"):
+                os.remove(self._segment_path(old_segment, name))
+
+
+    def postings(self, token_id: int) -> tuple:
+        """The articles (sorted article indexes) that contain a token ID, and its occurences in each of them. Returns (articles, counts)."""
+
+        articles, counts = [], []
+        for segment in self.meta.get("posting_segments", []):
+            offsets = np.load(self._segment_path(segment, "offsets"), mmap_mode="r")
+            if token_id + 1 >= len(offsets): # token ID is newer than the segment
+                continue
+            start, end = offsets[token_id], offsets[token_id + 1]
+            articles.append(np.load(self._segment_path(segment, "articles"), mmap_mode="r")[start:end])
+            counts.append(np.load(self._segment_path(segment, "counts"), mmap_mode="r")[start:end])
+
+        if not articles:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        return np.concatenate(articles).astype(np.int64), np.concatenate(counts).astype(np.int64)
+
+
+    def keyword_postings(self, text: str) -> tuple:
+        """The articles that contain a keyword or phrase (whole words), and its occurences in each of them. Returns (articles, counts).
+        Phrases are looked up as the intersection of the postings of their words, and then only those articles are scanned."""
+
+        token_ids = self.encode(text)
+        if token_ids is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        if len(token_ids) == 1:
+            return self.postings(token_ids[0])
+
+        candidates = self.postings(token_ids[0])[0]
+        for token_id in token_ids[1:]:
+            candidates = np.intersect1d(candidates, self.postings(token_id)[0], assume_unique=True)
+
+        counts = self.subset(candidates).counts_per_article(text)
+        return candidates[counts > 0], counts[counts > 0]
@@ -5,6 +5,9 @@
 # div_filter: a filter to find the actual text inside the article page
 # p_attr_exclusion: a filter to exclude unwanted paragraphs in the article text, like for example promotional stuff, links/info about other articles etc
 # pagin_filter: a filter to find the pagination links (HTML)
+# priority (optional): sites with a higher number get their articles scraped first (default 0)
+# feeds (optional): news sitemap/RSS/Atom feed urls of the site (relative to the domain or absolute), otherwise the sitemaps of its robots.txt are used
+# max_bytes (optional): the download of a page from this site stops after this many bytes (default: WebScraper.max_bytes, 3 MB)
 
 # the news sites for scraping
 news_sites = [
@@ -45,6 +48,9 @@ headers = {
     "Cache-Control": "max-age=0"
 }
 
+# send every request to a local mock server instead of the real sites (offline load/regression testing with mock_news_server.py), e.g. "http://127.0.0.1:8033"
+upstream_override = None
+
 # initializing tables for the database
 db_tables = [
         """CREATE TABLE IF NOT EXISTS articles (
@@ -54,7 +60,10 @@ db_tables = [
     ,
         """CREATE TABLE IF NOT EXISTS exclude_articles (
             url TEXT PRIMARY KEY,
-            reason TEXT);
+            reason TEXT,
+            reason_code TEXT,
+            domain TEXT,
+            config_hash TEXT);
         """
     ,
         """CREATE TABLE IF NOT EXISTS categories (
@@ -64,12 +73,141 @@ db_tables = [
         """CREATE TABLE IF NOT EXISTS keywords (
         keyword TEXT PRIMARY KEY,
         category_id INT,
+        weight REAL DEFAULT 1.0,
         FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE);"""
     ,
-        """CREATE TABLE IF NOT EXISTS scrape_que (
+        """CREATE TABLE IF NOT EXISTS scrape_jobs (
+        url TEXT PRIMARY KEY,
+        domain TEXT,
+        priority INT DEFAULT 0,
+        status TEXT DEFAULT 'queued',
+        attempts INT DEFAULT 0,
+        enqueued_at DATETIME,
+        next_attempt_at DATETIME,
+        lease_owner TEXT,
+        lease_expires DATETIME,
+        last_error TEXT);"""
+    ,
+        """CREATE INDEX IF NOT EXISTS idx_scrape_jobs_due ON scrape_jobs (status, next_attempt_at);"""
+    ,
+        # lease order of the domains (a sequence number instead of a time, two leases in the same second are still ordered)
+        """CREATE TABLE IF NOT EXISTS scrape_domain_leases (
+        domain TEXT PRIMARY KEY,
+        lease_seq INT);"""
+    ,
+        # every lease of a job moves its domain to the end of the lease order, in the same statement as the lease
+        """CREATE TRIGGER IF NOT EXISTS scrape_jobs_lease_order AFTER UPDATE OF lease_owner ON scrape_jobs WHEN NEW.status = 'leased'
+        BEGIN INSERT INTO scrape_domain_leases (domain, lease_seq) VALUES (NEW.domain, (SELECT coalesce(max(lease_seq), 0) + 1 FROM scrape_domain_leases))
+              ON CONFLICT (domain) DO UPDATE SET lease_seq = excluded.lease_seq; END;"""
+    ,
+        """CREATE TABLE IF NOT EXISTS scrape_run_lock (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        run_id TEXT,
+        leader TEXT,
+        phase TEXT,
+        heartbeat DATETIME);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS scrape_workers (
+        worker_id TEXT PRIMARY KEY,
+        run_id TEXT,
+        heartbeat DATETIME);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS domain_leases (
+        domain TEXT PRIMARY KEY,
+        worker_id TEXT,
+        lease_expires DATETIME);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS article_fingerprints (
+        url TEXT PRIMARY KEY,
+        simhash TEXT,
+        cluster_url TEXT);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value INT);"""
+    ,
+        """INSERT OR IGNORE INTO app_meta (key, value) VALUES ('identifiers_version', 0);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS article_classification (
+        url TEXT PRIMARY KEY,
+        category_id INT);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS article_category_scores (
+        url TEXT,
+        category_id INT,
+        score REAL,
+        PRIMARY KEY (url, category_id));"""
+    ,
+        """CREATE TABLE IF NOT EXISTS keyword_stats (
+        keyword TEXT PRIMARY KEY,
+        document_frequency INT);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS identifier_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT);"""
+    ,
+        """CREATE TABLE IF NOT EXISTS scrape_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recorded_at DATETIME,
+        worker_id TEXT,
+        domain TEXT,
+        stage TEXT,
+        seconds REAL,
+        bytes INT,
+        status_code INT);"""
+    ,
+        """CREATE INDEX IF NOT EXISTS scrape_metrics_time ON scrape_metrics (recorded_at);""",
+
+        """CREATE TABLE IF NOT EXISTS feed_state (
+        feed_url TEXT PRIMARY KEY,
+        domain TEXT,
+        source TEXT,
+        etag TEXT,
+        last_modified TEXT,
+        last_seen TEXT,
+        checked_at DATETIME,
+        failures INT DEFAULT 0);""",
+
+        """CREATE TABLE IF NOT EXISTS page_schedule (
+        domain TEXT,
+        page TEXT,
+        interval_minutes REAL,
+        depth INT,
+        yield_ewma REAL,
+        next_due DATETIME,
+        last_crawled DATETIME,
+        last_yield INT,
+        PRIMARY KEY (domain, page));""",
+
+        """CREATE TABLE IF NOT EXISTS html_archive (
         url TEXT PRIMARY KEY,
-        scrape_time DATETIME,
-        scrape_retries INT);"""
+        content_hash TEXT,
+        domain TEXT,
+        encoding TEXT,
+        archived_at DATETIME);""",
+
+        """CREATE TABLE IF NOT EXISTS html_blobs (
+        content_hash TEXT PRIMARY KEY,
+        segment INT,
+        offset INT,
+        length INT,
+        raw_length INT,
+        codec TEXT);"""
+    ,
+        # added/deleted/changed keywords are logged, so only the articles containing them get reclassified
+        """CREATE TRIGGER IF NOT EXISTS keywords_insert_change AFTER INSERT ON keywords
+        BEGIN INSERT INTO identifier_changes (keyword) VALUES (NEW.keyword); END;"""
+    ,
+        """CREATE TRIGGER IF NOT EXISTS keywords_delete_change AFTER DELETE ON keywords
+        BEGIN INSERT INTO identifier_changes (keyword) VALUES (OLD.keyword); END;"""
+    ,
+        """CREATE TRIGGER IF NOT EXISTS keywords_update_change AFTER UPDATE ON keywords
+        BEGIN INSERT INTO identifier_changes (keyword) VALUES (OLD.keyword), (NEW.keyword); END;"""
+    ] + [
+        # every edit of the keywords/categories bumps the identifiers version (the compiled identifier model gets reloaded)
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_{action.lower()}_version AFTER {action} ON {table}
+        BEGIN UPDATE app_meta SET value = value + 1 WHERE key = 'identifiers_version'; END;"""
+        for table in ("keywords", "categories") for action in ("INSERT", "UPDATE", "DELETE")
     ]
 
 # initializing categories and keywords for the database
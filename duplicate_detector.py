@@ -0,0 +1,157 @@
+# Standard modules
+import hashlib
+import logging
+from collections import defaultdict
+from tqdm import tqdm
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+class DuplicateDetector():
+    """Finds near-duplicate articles (syndicated wire stories etc) with SimHash fingerprints and an LSH band index."""
+
+    hash_bits = 64
+    band_bits = 8 # 8 bands of 8 bits -> two fingerprints within a hamming distance of 7 always share at least 1 band (pigeonhole)
+    shingle_size = 3 # amount of words in each shingle
+
+    # custom tqdm loading bar format
+    custom_bar = "    [{bar:30}] {percentage:3.0f}%  "
+
+    def __init__(self, database: str, mode: str = "flag", max_distance: int = 5):
+
+        if mode not in ("off", "flag", "drop"):
+            raise ValueError(f"Unknown dedup mode: '{mode}'. Valid modes are 'off', 'flag' and 'drop'.")
+
+        self.db = database
+        self.mode = mode # "off" = no checks, "flag" = store the article but tag it with its cluster, "drop" = don't store near-duplicates at all
+        self.max_distance = max_distance # max amount of differing bits for two articles to count as the same story
+
+        self.fingerprints = {} # url -> (simhash, cluster_url)
+        self.band_index = defaultdict(list) # (band no, band value) -> urls
+        self.fingerprint_rowid = 0 # the stored fingerprints/articles up to these rowids are in the index (load_index() only reads newer ones)
+        self.article_rowid = 0
+
+        if self.mode != "off":
+            self.load_index()
+
+
+    def fingerprint(self, text: str) -> int:
+        """Calculates a 64-bit SimHash of a (cleaned) article text, based on word shingles."""
+
+        words = text.split()
+        if len(words) >= self.shingle_size:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        else:
+            shingles = set(words)
+
+        # every shingle votes +1/-1 on every bit position, the sign of the sum decides the final bit
+        bit_votes = [0] * self.hash_bits
+        for shingle in shingles:
+            shingle_hash = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+            for i in range(self.hash_bits):
+                bit_votes[i] += 1 if (shingle_hash >> i) & 1 else -1
+
+        return sum(1 << i for i, votes in enumerate(bit_votes) if votes > 0)
+
+
+    def _bands(self, simhash: int) -> list:
+        mask = (1 << self.band_bits) - 1
+        return [(band, (simhash >> (band * self.band_bits)) & mask) for band in range(self.hash_bits // self.band_bits)]
+
+
+    def _add_to_index(self, url: str, simhash: int, cluster_url: str):
+        known = url in self.fingerprints and self.fingerprints[url][0] == simhash # (re-read by a later load_index())
+        self.fingerprints[url] = (simhash, cluster_url)
+        if not known:
+            for band in self._bands(simhash):
+                self.band_index[band].append(url)
+
+
+    def load_index(self):
+        """Loads the stored fingerprints into the LSH index and fingerprints any articles stored before the index existed.
+        Called again (daemon mode), it only adds the fingerprints and articles stored since the previous call, e.g. by other workers or a re-extraction."""
+
+        for rowid, url, simhash, cluster_url in sql.execute(self.db, "SELECT rowid, url, simhash, cluster_url FROM article_fingerprints WHERE rowid > ? ORDER BY rowid;",
+                                                            (self.fingerprint_rowid,)):
+            self._add_to_index(url, int(simhash, 16), cluster_url)
+            self.fingerprint_rowid = rowid
+
+        # the articles stored without a fingerprint (before the index existed, or by a worker with dedup mode "off")
+        rowid_range = (self.article_rowid, sql.execute(self.db, "SELECT coalesce(max(rowid), 0) FROM articles;")[0][0])
+        self.article_rowid = rowid_range[1]
+        missing_query = "FROM articles WHERE rowid > ? AND rowid <= ? AND url NOT IN (SELECT url FROM article_fingerprints)"
+        missing_count = sql.execute(self.db, f"SELECT count(*) {missing_query};", rowid_range)[0][0]
+        if not missing_count:
+            return
+
+        # the contents are read in chunks (only the fingerprints are kept), the new fingerprints are written once the read is done
+        new_rows = []
+        with tqdm(total=missing_count, bar_format=self.custom_bar, ascii=" =", leave=False) as progress:
+            for chunk in sql.iterate(self.db, f"SELECT url, content {missing_query} ORDER BY rowid;", rowid_range, chunk_size=500):
+                for url, content in chunk:
+                    simhash, cluster_url = self.find_duplicate(content)
+                    cluster_url = cluster_url or url
+                    self._add_to_index(url, simhash, cluster_url)
+                    new_rows.append((url, f"{simhash:016x}", cluster_url))
+                progress.update(len(chunk))
+
+        # (OR IGNORE: another worker may have fingerprinted the same article in the meantime)
+        sql.execute_many(self.db, "INSERT OR IGNORE INTO article_fingerprints (url, simhash, cluster_url) VALUES (?, ?, ?);", new_rows)
+
+
+    def find_duplicate(self, text: str) -> tuple:
+        """Returns the fingerprint of the text and the cluster url of its closest stored near-duplicate (None if it's a new story)."""
+
+        simhash = self.fingerprint(text)
+
+        best_url, best_distance = None, self.max_distance + 1
+        candidates = {url for band in self._bands(simhash) for url in self.band_index.get(band, [])}
+        for url in candidates:
+            distance = bin(simhash ^ self.fingerprints[url][0]).count("1")
+            if distance < best_distance:
+                best_url, best_distance = url, distance
+
+        cluster_url = self.fingerprints[best_url][1] if best_url else None
+
+        return simhash, cluster_url
+
+
+    def check_article(self, url: str, text: str) -> str:
+        """Checks an article before it's inserted. Returns the cluster url if it's a near-duplicate, otherwise None.
+        The fingerprint is stored unless the article is going to be dropped."""
+
+        if self.mode == "off":
+            return None
+
+        simhash, cluster_url = self.find_duplicate(text)
+
+        if cluster_url:
+            logging.info(f"Near-duplicate article: {url}\nSame story as: {cluster_url}")
+
+        if cluster_url and self.mode == "drop":
+            return cluster_url
+
+        self._add_to_index(url, simhash, cluster_url or url)
+        sql.execute(self.db, "INSERT OR REPLACE INTO article_fingerprints (url, simhash, cluster_url) VALUES (?, ?, ?);",
+                    (url, f"{simhash:016x}", cluster_url or url))
+
+        return cluster_url
+
+
+    def get_cluster_report(self, min_size: int = 2) -> list:
+        """Returns the stored story clusters (biggest first) as a list of dicts with the cluster url, size and domains.
+        Only reads the stored fingerprints, so it doesn't need the index (works with mode="off")."""
+
+        clusters = defaultdict(list)
+        for cluster_url, url in sql.execute(self.db, """SELECT cluster_url, url FROM article_fingerprints
+                                                       WHERE cluster_url IN (SELECT cluster_url FROM article_fingerprints
+                                                                             GROUP BY cluster_url HAVING count(*) >= ?);""", (min_size,)):
+            clusters[cluster_url].append(url)
+
+        report = []
+        for cluster_url, urls in clusters.items():
+            domains = sorted({url.split("/")[2] for url in urls})
+            report.append({"cluster_url": cluster_url, "size": len(urls), "domains": domains})
+
+        return sorted(report, key=lambda cluster: cluster["size"], reverse=True)
@@ -0,0 +1,253 @@
+# Standard modules
+import re
+import gzip
+import logging
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Third-party modules -> requirements.txt
+import requests
+from lxml import etree
+
+# Custom made modules
+import sqlite_x33 as sql
+from scraper import WebScraper, ExtractionError
+
+
+class FeedDiscovery():
+    """Discovers new article urls from the news sitemaps and RSS/Atom feeds of a site instead of crawling its listing pages.
+
+    The feeds of a site are the "feeds" of its config in data_init.news_sites (optional), otherwise the sitemaps in its robots.txt.
+    Every feed is fetched with a conditional GET (ETag/Last-Modified, an unchanged feed costs a 304 without a body), and only entries
+    newer than the newest entry seen in the previous runs minus 'overlap_hours' are returned ("since last seen", kept in the 'feed_state'
+    table). The overlap catches entries that show up late or with an older date, the urls that are already known are filtered out by the caller.
+    Sitemap indexes are followed to their newest child sitemaps only.
+
+    discover() returns None if a site has no usable feed, then the caller falls back to the HTML crawl (WebScraper.URLScraper)."""
+
+    feed_content_types = ("application/xml", "text/xml", "application/rss+xml", "application/atom+xml", "application/x-gzip",
+                          "application/gzip", "application/octet-stream", "text/plain", "text/html")
+
+    time_format = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, database: str, ws: WebScraper, headers: dict, max_age_days: float = 2, max_child_sitemaps: int = 3,
+                 robots_interval_hours: float = 24, max_failures: int = 3, overlap_hours: float = 6):
+
+        self.db = database
+        self.ws = ws
+        self.headers = headers
+        self.max_age_days = max_age_days # entries older than this are ignored in the 1st run of a feed (sitemaps can list years of articles)
+        self.max_child_sitemaps = max_child_sitemaps # newest child sitemaps followed per sitemap index
+        self.robots_interval_hours = robots_interval_hours # robots.txt is checked for new sitemaps this often
+        self.max_failures = max_failures # a feed that failed this many times in a row is skipped until the next robots.txt check
+        self.overlap_hours = overlap_hours # entries up to this much older than the newest one seen are still returned (backdated/late entries, the known urls are filtered out by the caller)
+
+        self.requests = 0 # feed/robots.txt requests made (for the discovery statistics)
+        self._parser = etree.XMLParser(recover=True, resolve_entities=False, no_network=True, huge_tree=True)
+
+
+    ## Feed state
+
+    def _now(self) -> str:
+        return datetime.now().strftime(self.time_format)
+
+
+    def _state(self, feed_url: str) -> dict:
+
+        row = sql.execute(self.db, "SELECT etag, last_modified, last_seen, checked_at, failures FROM feed_state WHERE feed_url = ?;", (feed_url,))
+        if not row:
+            return {"etag": None, "last_modified": None, "last_seen": None, "checked_at": None, "failures": 0}
+
+        return dict(zip(("etag", "last_modified", "last_seen", "checked_at", "failures"), row[0]))
+
+
+    def _save_state(self, feed_url: str, domain: str, source: str, **values):
+
+        sql.execute(self.db, "INSERT OR IGNORE INTO feed_state (feed_url, domain, source, failures) VALUES (?, ?, ?, 0);", (feed_url, domain, source))
+        if values:
+            columns = ", ".join(f"{column} = ?" for column in values)
+            sql.execute(self.db, f"UPDATE feed_state SET {columns} WHERE feed_url = ?;", (*values.values(), feed_url))
+
+
+    ## Fetching + parsing
+
+    def fetch(self, feed_url: str, state: dict) -> requests.Response:
+        """A single conditional GET (no retries, a failing feed falls back to the HTML crawl). Returns the response (200 or 304)."""
+
+        headers = dict(self.headers)
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        self.requests += 1
+        response = self.ws._send_request(feed_url, headers, content_types=self.feed_content_types)
+
+        if response.status_code not in (200, 304):
+            raise requests.exceptions.HTTPError(f"HTTP Status Code: {response.status_code}")
+
+        return response
+
+
+    @staticmethod
+    def parse_time(value: str) -> datetime:
+        """ISO 8601 (sitemaps, Atom) or RFC 822 (RSS) time -> aware UTC datetime (None if it can't be parsed)."""
+
+        value = (value or "").strip()
+        if not value:
+            return None
+
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+
+        return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+    def parse(self, content: bytes) -> tuple:
+        """Parses a sitemap, sitemap index, RSS or Atom feed. Returns ([(article url, published time)], [(child sitemap url, last modified)])."""
+
+        if content[:2] == b"\x1f\x8b": # gzipped sitemap file (sitemap.xml.gz)
+            content = gzip.decompress(content)
+
+        root = etree.fromstring(content, parser=self._parser)
+        if root is None:
+            raise ExtractionError("unknown", "The feed isn't valid XML.")
+
+        entries, children = [], []
+
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            tag = etree.QName(element).localname
+
+            # the child elements by their name without namespace (loc, lastmod, news:publication_date, link, pubDate..)
+            if tag in ("url", "sitemap", "item", "entry"):
+                fields = {}
+                for child in element.iter():
+                    if isinstance(child.tag, str) and child is not element:
+                        name = etree.QName(child).localname
+                        value = child.get("href") if name == "link" and child.get("href") else (child.text or "").strip()
+                        if value and name not in fields:
+                            fields[name] = value
+
+                if tag == "sitemap":
+                    if fields.get("loc"):
+                        children.append((fields["loc"], self.parse_time(fields.get("lastmod"))))
+                    continue
+
+                link = fields.get("loc") or fields.get("link")
+                published = fields.get("publication_date") or fields.get("lastmod") or fields.get("pubDate") or fields.get("published") or fields.get("updated")
+                if link:
+                    entries.append((link, self.parse_time(published)))
+
+        return entries, children
+
+
+    def normalize(self, link: str, site: dict) -> str:
+        """The article url in the same format as WebScraper.parse_listing() saves it, or None if it doesn't pass the filters of the site."""
+
+        domain = WebScraper.get_domain(f"https://{site['domain']}")
+        path = urlsplit(link).path
+
+        if not (re.search(site["url_filter"], link) or re.search(site["url_filter"], path)):
+            return None
+        if any(re.search(regex, link) for regex in site["url_exclusion"]):
+            return None
+        if WebScraper.get_domain(link) != domain: # other domains, subdomains
+            return None
+        if path.rstrip("/") in ("", *[page.rstrip("/") for page in site["pages"]]): # the main/section pages themselves
+            return None
+
+        return f"https://{domain}{path}"
+
+
+    ## Discovery
+
+    def feed_urls(self, site: dict) -> list:
+        """[(feed url, source)] of a site: the configured feeds, otherwise the sitemaps of its robots.txt."""
+
+        domain = WebScraper.get_domain(f"https://{site['domain']}")
+
+        if site.get("feeds"):
+            return [(feed if feed.startswith("http") else f"https://{domain}{feed}", "config") for feed in site["feeds"]]
+
+        robots_url = f"https://{domain}/robots.txt"
+        state = self._state(robots_url)
+        due = state["checked_at"] is None or datetime.strptime(state["checked_at"], self.time_format) < datetime.now() - timedelta(hours=self.robots_interval_hours)
+
+        if due:
+            try:
+                response = self.fetch(robots_url, state)
+
+                if response.status_code == 200:
+                    sitemaps = re.findall(r"(?im)^\s*sitemap:\s*(\S+)", response.text)
+                    # news sitemaps first, they only list the articles of the last 2 days
+                    sitemaps.sort(key=lambda url: "news" not in url.lower())
+                    sql.execute(self.db, "DELETE FROM feed_state WHERE domain = ? AND source = 'robots' AND feed_url NOT IN (%s);"
+                                % ", ".join("?" for _ in sitemaps), (domain, *sitemaps))
+                    for sitemap in sitemaps:
+                        self._save_state(sitemap, domain, "robots")
+
+                # a new robots.txt check also gives the failed feeds another chance
+                sql.execute(self.db, "UPDATE feed_state SET failures = 0 WHERE domain = ?;", (domain,))
+                self._save_state(robots_url, domain, "robots.txt", etag=response.headers.get("ETag", state["etag"]),
+                                 last_modified=response.headers.get("Last-Modified", state["last_modified"]), checked_at=self._now())
+
+            except (requests.exceptions.RequestException, ExtractionError) as e:
+                logging.warning(f"Couldn't read the robots.txt of {domain}: {e}")
+                self._save_state(robots_url, domain, "robots.txt", checked_at=self._now())
+
+        return [(feed_url, "robots") for feed_url, in sql.execute(self.db, "SELECT feed_url FROM feed_state WHERE domain = ? AND source = 'robots' ORDER BY rowid;", (domain,))]
+
+
+    def discover(self, site: dict) -> list:
+        """New article urls from the feeds of a site since the last run, or None if the site has no usable feed (-> HTML crawl)."""
+
+        domain = WebScraper.get_domain(f"https://{site['domain']}")
+        feeds = [feed for feed in self.feed_urls(site) if self._state(feed[0])["failures"] < self.max_failures]
+        article_urls = set()
+        working_feeds = 0
+
+        while feeds:
+            feed_url, source = feeds.pop(0)
+            state = self._state(feed_url)
+
+            # "since last seen": only entries newer than the newest entry of the previous run minus an overlap (the 1st run: of the last few days)
+            last_seen = self.parse_time(state["last_seen"])
+            since = last_seen - timedelta(hours=self.overlap_hours) if last_seen else datetime.now(timezone.utc) - timedelta(days=self.max_age_days)
+
+            try:
+                response = self.fetch(feed_url, state)
+
+                if response.status_code == 304: # unchanged since the last run
+                    working_feeds += 1
+                    self._save_state(feed_url, domain, source, checked_at=self._now(), failures=0)
+                    continue
+
+                entries, children = self.parse(response.content)
+
+            except (requests.exceptions.RequestException, ExtractionError, etree.XMLSyntaxError, OSError) as e:
+                logging.warning(f"Couldn't read the feed {feed_url}: {e}")
+                self._save_state(feed_url, domain, source, checked_at=self._now(), failures=state["failures"] + 1)
+                continue
+
+            working_feeds += 1
+
+            # sitemap index: only the newest child sitemaps that changed since the last run
+            children = sorted(children, key=lambda child: child[1] or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+            feeds += [(child_url, "index") for child_url, modified in children[:self.max_child_sitemaps] if modified is None or modified > since]
+
+            new_entries = [(link, published) for link, published in entries if published is None or published > since]
+            article_urls.update(url for url in (self.normalize(link, site) for link, _ in new_entries) if url)
+
+            newest = max((published for _, published in entries if published), default=None)
+            self._save_state(feed_url, domain, source, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+                             last_seen=max(newest, last_seen or newest).isoformat() if newest else state["last_seen"], checked_at=self._now(), failures=0)
+
+        return sorted(article_urls) if working_feeds else None
@@ -1,17 +1,33 @@
 # Standard modules
 import os
+import json
 import pandas as pd
+import numpy as np
 from tqdm import tqdm
 import itertools
+from html import escape as escape_html
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Third-party modules -> requirements.txt
 import plotly.express as px
 import plotly.offline as pyo
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+
+def _export_chart(fig_json: str, file_path: str, layout: dict, include_plotlyjs) -> str:
+    """Writes one variant (template/barmode) of a figure to an HTML file. Runs in a worker process of the export pool."""
+
+    fig = pio.from_json(fig_json)
+    fig.update_layout(**layout)
+    pyo.plot(fig, filename=file_path, auto_open=False, include_plotlyjs=include_plotlyjs)
+
+    return file_path
 
 
 class GraphManager():
 
-    def __init__(self):
+    def __init__(self, max_workers: int = None, export_mode: str = "standalone"):
 
         # adding a couple of chart templates & barmodes to some of the charts which gives the users more viewing options
         self.plot_templates = ["plotly_white", "plotly_dark", "seaborn"]
@@ -19,6 +35,15 @@ class GraphManager():
 
         self.file_ext = ".html"
 
+        # "standalone" = every HTML file has the plotly.js library (~3.5 MB) inlined
+        # "shared" = plotly.js is written once to the export directory and every chart file references it
+        # "dashboard" = no separate files, all charts are bundled into 1 dashboard file with a single plotly.js and a template switcher
+        if export_mode not in ("standalone", "shared", "dashboard"):
+            raise ValueError(f"Unknown export mode: '{export_mode}'. Valid modes are 'standalone', 'shared' and 'dashboard'.")
+        self.export_mode = export_mode
+        self.dashboard_file = "dashboard.html"
+        self.dashboard_charts = {} # chart id -> (figure json, has barmode variants)
+
         # setting the directory where files will be saved to
         self.export_dir = "exports/"
 
@@ -30,28 +55,223 @@ class GraphManager():
         self.custom_bar = "    [{bar:30}] {percentage:3.0f}%  "
         tqdm.pandas(bar_format=self.custom_bar, ascii=" =", leave=False)
 
+        # the chart variants are written in parallel by a pool of worker processes (1 = write them one by one in this process)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+
+        # date bucketing/downsampling of the time series charts, so the figure size stays bounded no matter how long the scrape period is
+        self.date_buckets = {"day": "D", "week": "W", "month": "M"} # pandas period frequencies (weeks start on mondays)
+        self.max_points_per_series = 500
+
+
+    def _export(self, fig, exports: list, chart_id: str) -> list:
+        """Saves every variant of a figure as an HTML file. 'exports' is a list of (file_path, layout changes) tuples.
+        The figure is serialized once, and the variants are written by the process pool at the same time."""
+
+        if self.export_mode == "dashboard":
+            return self._add_to_dashboard(fig, exports, chart_id)
+
+        include_plotlyjs = True
+        if self.export_mode == "shared":
+            include_plotlyjs = "directory"
+            # written once before the workers start, so they don't all try to copy the bundle at the same time
+            bundle_path = os.path.join(self.export_dir, "plotly.min.js")
+            if not os.path.exists(bundle_path):
+                with open(bundle_path, "w", encoding="utf-8") as file:
+                    file.write(pyo.get_plotlyjs())
+
+        if self.max_workers == 1 or len(exports) == 1:
+            for file_path, layout in tqdm(exports, bar_format=self.custom_bar, ascii=" =", leave=False):
+                fig.update_layout(**layout)
+                pyo.plot(fig, filename=file_path, auto_open=False, include_plotlyjs=include_plotlyjs)
+
+        else:
+            # the pool is started the first time it's needed and reused for all the following charts
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+            fig_json = fig.to_json()
+            futures = [self._pool.submit(_export_chart, fig_json, file_path, layout, include_plotlyjs) for file_path, layout in exports]
+
+            for future in tqdm(as_completed(futures), total=len(futures), bar_format=self.custom_bar, ascii=" =", leave=False):
+                future.result() # raises any exception from the worker process
+
+        return [f"Chart saved to '{file_path}'" for file_path, _ in exports]
+
+
+    def _add_to_dashboard(self, fig, exports: list, chart_id: str) -> list:
+        """Adds (or replaces) a chart in the dashboard and rewrites the dashboard file."""
+
+        has_barmodes = any("barmode" in layout for _, layout in exports) and any(trace.type == "bar" for trace in fig.data)
+        self.dashboard_charts[chart_id] = (fig.to_json(), has_barmodes)
+
+        file_path = f"{self.export_dir}{self.dashboard_file}"
+        self.save_dashboard(file_path)
+
+        return [f"Chart added to dashboard '{file_path}'"]
+
+
+    def save_dashboard(self, file_path: str):
+        """Writes all dashboard charts into a single HTML file, with plotly.js included once and dropdowns for switching template/barmode
+        (the barmode dropdown only if the dashboard has a bar chart with barmode variants)."""
+
+        templates_json = json.dumps({template: pio.templates[template].to_plotly_json() for template in self.plot_templates}, cls=PlotlyJSONEncoder)
+        charts_json = ", ".join(f"{json.dumps(chart_id)}: {{\"figure\": {fig_json}, \"barmode\": {json.dumps(has_barmodes)}}}"
+                                for chart_id, (fig_json, has_barmodes) in self.dashboard_charts.items())
+
+        # the JSON is embedded in a <script> block, so a "</script>" inside a chart (e.g. a typed-in keyword in a title) must not end it
+        templates_json, charts_json = (text.replace("</", "<\\/").replace("<!--", "<\\!--") for text in (templates_json, charts_json))
+
+        template_options = "".join(f'<option value="{template}">{template}</option>' for template in self.plot_templates)
+        barmode_options = "".join(f'<option value="{barmode}">{barmode}</option>' for barmode in self.plot_barmodes)
+        barmode_select = f'Barmode: <select id="barmode-select">{barmode_options}</select>' if any(has_barmodes for _, has_barmodes in self.dashboard_charts.values()) else ""
+        chart_divs = "\n".join(f'<div id="{escape_html(chart_id)}" class="chart"></div>' for chart_id in self.dashboard_charts)
+
+        html = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Replicant News Tracker - Dashboard</title>
+<script type="text/javascript">{pyo.get_plotlyjs()}</script>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+.controls {{ margin-bottom: 20px; }}
+.chart {{ height: 600px; margin-bottom: 40px; }}
+</style>
+</head>
+<body>
+<div class="controls">
+Template: <select id="template-select">{template_options}</select>
+{barmode_select}
+</div>
+{chart_divs}
+<script type="text/javascript">
+const templates = {templates_json};
+const charts = {{{charts_json}}};
+
+for (const [chartId, chart] of Object.entries(charts)) {{
+    Plotly.newPlot(chartId, chart.figure.data, chart.figure.layout, {{responsive: true}});
+}}
+
+function updateCharts() {{
+    const template = templates[document.getElementById("template-select").value];
+    const barmodeSelect = document.getElementById("barmode-select");
+    for (const [chartId, chart] of Object.entries(charts)) {{
+        const layout = {{template: template}};
+        if (chart.barmode && barmodeSelect) {{ layout.barmode = barmodeSelect.value; }}
+        Plotly.relayout(chartId, layout);
+    }}
+}}
+
+document.getElementById("template-select").addEventListener("change", updateCharts);
+document.getElementById("barmode-select")?.addEventListener("change", updateCharts);
+updateCharts();
+</script>
+</body>
+</html>
+"""
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(html)
+
+
+    def close(self):
+        """Shuts down the export process pool."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+    def aggregate_by_date(self, df: pd.DataFrame, value_columns: list, group_column: str = None, date_bucket: str = "auto") -> tuple:
+        """Sums the values of a DataFrame (indexed by date) per day/week/month (and per group column).
+        "auto" picks the bucket from the covered time span. Returns the aggregated DataFrame (indexed by the bucket start date) and the used bucket."""
+
+        dates = pd.to_datetime(df.index)
+
+        if date_bucket == "auto":
+            span_days = (dates.max() - dates.min()).days if len(dates) else 0
+            date_bucket = "day" if span_days <= 120 else "week" if span_days <= 730 else "month"
+
+        if date_bucket == "day":
+            return df, date_bucket
+
+        df_bucketed = df.reset_index(drop=True)
+        df_bucketed["date"] = dates.to_period(self.date_buckets[date_bucket]).start_time
+
+        group_by = ["date", group_column] if group_column else ["date"]
+        df_bucketed = df_bucketed.groupby(group_by)[value_columns].sum().reset_index()
+        df_bucketed["date"] = df_bucketed["date"].dt.strftime("%Y-%m-%d")
+
+        return df_bucketed.set_index("date"), date_bucket
+
+
+    def downsample(self, df: pd.DataFrame, y_columns, max_points: int = None) -> pd.DataFrame:
+        """Reduces a time series (indexed by date) to at most 'max_points' rows per series with the Largest-Triangle-Three-Buckets algorithm,
+        which keeps the visual shape (peaks and dips) of the series instead of just taking every n:th point.
+        With several 'y_columns' (compared series), the rows picked for any of them are kept, so no series loses its peaks."""
+
+        max_points = max_points or self.max_points_per_series
+        n_points = len(df)
+
+        if n_points <= max_points or max_points < 3:
+            return df
+
+        x = pd.to_datetime(df.index).values.astype("int64").astype(float)
+        selected = set()
+
+        for y_column in ([y_columns] if isinstance(y_columns, str) else y_columns):
+            selected.update(self._lttb_indexes(x, df[y_column].to_numpy(dtype=float), max_points))
+
+        return df.iloc[sorted(selected)]
+
+
+    @staticmethod
+    def _lttb_indexes(x: np.ndarray, y: np.ndarray, max_points: int) -> list:
+        """The row positions Largest-Triangle-Three-Buckets picks for a single series."""
+
+        n_points = len(x)
+
+        # the first and last point are always kept, the rest is split into (max_points - 2) buckets with 1 point picked per bucket
+        bucket_edges = np.linspace(1, n_points - 1, max_points - 1).astype(int)
+        selected = [0]
+
+        for i in range(max_points - 2):
+            start, end = bucket_edges[i], bucket_edges[i + 1]
+            next_end = bucket_edges[i + 2] if i + 2 < len(bucket_edges) else n_points
+
+            # average point of the next bucket
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+            prev_x, prev_y = x[selected[-1]], y[selected[-1]]
+
+            # pick the point that makes the largest triangle with the previously picked point and the next bucket's average point
+            areas = np.abs((prev_x - avg_x) * (y[start:end] - prev_y) - (prev_x - x[start:end]) * (avg_y - prev_y))
+            selected.append(start + int(np.argmax(areas)))
+
+        selected.append(n_points - 1)
+
+        return selected
+
 
     def plot_top_kw_graph(self, df: pd.DataFrame, top_n: int = 20) -> list:
         '''Prints an interactive graph of the top keywords and how many times they occur in the articles'''
 
-        df = df.sort_values(by=["count"], ascending=False).head(top_n)
+        df = df.nlargest(top_n, "count") # partial sort, only the top n rows get sorted
 
         # plot the bar chart using Plotly Express
         fig = px.bar(df, x="keyword", y="count", color="category")
         fig.update_layout(xaxis={"categoryorder": "total descending"}) # normally the bars would be categorized, we want a linear total view
 
-        saved_files = []
+        # Customize the layout
+        fig.update_layout(
+            title = f"Top {top_n} Keywords - Total amount of occurences in the articles",
+            xaxis_title = "Keyword",
+            yaxis_title = "Count",
+            legend_title="Category"
+        )
+
+        exports = []
 
         for template in self.plot_templates:
-
-            # Customize the layout
-            fig.update_layout(
-                title = f"Top {top_n} Keywords - Total amount of occurences in the articles",
-                xaxis_title = "Keyword",
-                yaxis_title = "Count",
-                legend_title="Category",
-                template = template
-            )
             
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -59,10 +279,9 @@ class GraphManager():
             filename = f"top_{top_n}_keywords_graph"
             template_style = f"_{template}"
             file_path = f"{dirname}{filename}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"template": template}))
 
-        return saved_files
+        return self._export(fig, exports, chart_id=filename)
 
 
     def plot_top_cat_graph(self, df: pd.DataFrame, chart_type="bar") -> list:
@@ -80,18 +299,9 @@ class GraphManager():
                          labels={"category": "Category", "count": "Article Count"})
             fig.update_layout(legend_title="Category")
         
-        saved_files = []
-        
-        # Calculate the total number of exports for tqdm
-        tot_exports = len(self.plot_templates) * len(["bar", "pie"])
-
-        # Wrap the loop with tqdm
-        for template in tqdm(self.plot_templates, total=tot_exports, bar_format=self.custom_bar, ascii=" =", leave=False):
+        exports = []
 
-            # Customize the layout
-            fig.update_layout(
-                template=template
-            )
+        for template in self.plot_templates:
             
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -100,31 +310,29 @@ class GraphManager():
             template_style = f"_{template}"
             chart_style = "_bar" if chart_type == "bar" else "_pie"
             file_path = f"{dirname}{filename}{chart_style}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"template": template}))
 
-        return saved_files
+        return self._export(fig, exports, chart_id=f"{filename}{chart_style}")
 
 
-    def plot_cats_by_date_graph(self, df: pd.DataFrame) -> list:
+    def plot_cats_by_date_graph(self, df: pd.DataFrame, date_bucket: str = "auto") -> list:
         '''Prints an interactive graph of the total amount of categorized articles by date'''
-        
+
+        # sum up the counts per day/week/month and downsample each category's series if it's still too long
+        df, date_bucket = self.aggregate_by_date(df, ["count"], group_column="category", date_bucket=date_bucket)
+        df = pd.concat([self.downsample(df_category, "count") for _, df_category in df.groupby("category", sort=False)])
+
         x_value = df.index
+        date_label = "Date (scrape date)" if date_bucket == "day" else f"Date (scrape date, per {date_bucket})"
 
         # plot the chart using Plotly Express
         fig = px.scatter(df, x=x_value, y="count", color="category", 
-                labels={"date": "Date (scrape date)", "count": "Article Count", "category": "Category"},
+                labels={"date": date_label, "count": "Article Count", "category": "Category"},
                 title="Top Categories per Date (scrape date) - Total amount of categorized articles")
         
-        saved_files = []
-
-        # Calculate the total number of exports for tqdm
-        tot_exports = len(self.plot_templates)
+        exports = []
 
-        # Wrap the loop with tqdm
-        for template in tqdm(self.plot_templates, total=tot_exports, bar_format=self.custom_bar, ascii=" =", leave=False):
-
-            fig.update_layout(template = template)
+        for template in self.plot_templates:
 
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -132,22 +340,26 @@ class GraphManager():
             filename = f"categories_by_date_graph"
             template_style = f"_{template}"
             file_path = f"{dirname}{filename}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"template": template}))
 
-        return saved_files
+        return self._export(fig, exports, chart_id=filename)
 
 
-    def plot_kws_by_date_graph(self, df: pd.DataFrame, kw_1: str, kw_2: str = "") -> list:
+    def plot_kws_by_date_graph(self, df: pd.DataFrame, kw_1: str, kw_2: str = "", date_bucket: str = "auto") -> list:
         '''Prints an interactive graph of the user specidic keyword(s) and how many times it/they occur in the articles by date'''
 
+        # sum up the counts per day/week/month and downsample the series if it's still too long
+        df, date_bucket = self.aggregate_by_date(df, [kw for kw in (kw_1, kw_2) if kw], date_bucket=date_bucket)
+        df = self.downsample(df, [kw for kw in (kw_1, kw_2) if kw])
+
         x_value = df.index
+        date_label = "Date (scrape date)" if date_bucket == "day" else f"Date (scrape date, per {date_bucket})"
 
         # plot the chart using Plotly Express
         if kw_2 == "": # in case only 1 keyword is used
 
             fig = px.scatter(df, x=x_value, y=kw_1, 
-                    labels={"date": "Date (scrape date)", kw_1: "Count"},
+                    labels={"date": date_label, kw_1: "Count"},
                     title="Keyword count per Date (scrape date) - Total amount of keyword occurences")
             # overriding Plotly variables since single traced plots won't have a legend visible as default
             fig["data"][0]["showlegend"]=True
@@ -156,18 +368,14 @@ class GraphManager():
         else:
 
             fig = px.scatter(df, x=x_value, y=[kw_1, kw_2], 
-                    labels={"date": "Date (scrape date)", "value": "Count"},
+                    labels={"date": date_label, "value": "Count"},
                     title="Keyword count per Date (scrape date) - Total amount of keyword occurences")
             
-        saved_files = []
+        fig.update_layout(legend_title="Keyword")
 
-        # Calculate the total number of exports for tqdm
-        tot_exports = len(self.plot_templates)
+        exports = []
 
-        # Wrap the loop with tqdm
-        for template in tqdm(self.plot_templates, total=tot_exports, bar_format=self.custom_bar, ascii=" =", leave=False):
-        
-            fig.update_layout(template=template, legend_title="Keyword")
+        for template in self.plot_templates:
 
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -175,10 +383,9 @@ class GraphManager():
             filename = f"custom_keyword_by_date_graph"
             template_style = f"_{template}"
             file_path = f"{dirname}{filename}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"template": template}))
 
-        return saved_files
+        return self._export(fig, exports, chart_id=filename)
 
 
     def plot_cats_by_domain_graph(self, df: pd.DataFrame) -> list:
@@ -192,19 +399,9 @@ class GraphManager():
                     xaxis_title="Categories per Domain",
                     yaxis_title="Article Count")
         
-        saved_files = []
+        exports = []
 
-        # Calculate the total number of exports for tqdm
-        tot_exports = len(self.plot_barmodes) * len(self.plot_templates)
-        
-        # Wrap the outer loop with tqdm
-        for barmode, template in tqdm(itertools.product(self.plot_barmodes, self.plot_templates), total=tot_exports, bar_format=self.custom_bar, ascii=" =", leave=False):
-            
-            # Customize the layout
-            fig.update_layout(
-                barmode=barmode,
-                template=template
-            )
+        for barmode, template in itertools.product(self.plot_barmodes, self.plot_templates):
             
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -213,17 +410,14 @@ class GraphManager():
             barmode_style = f"_{barmode}"
             template_style = f"_{template}"
             file_path = f"{dirname}{filename}{barmode_style}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"barmode": barmode, "template": template}))
 
-        return saved_files
+        return self._export(fig, exports, chart_id=filename)
 
 
     def plot_country_mentions_heatmap(self, df: pd.DataFrame) -> list:
         """Prints an interactive heatmap of the world showing the number of times each country has been mentioned in the articles."""
 
-        saved_files = []
-
         # plot the heatmap using Plotly Express
         fig = px.choropleth(df, locations="iso3_country_code", color="count", color_continuous_scale="Reds",
                             title="Top Countries - Number of times each country has been mentioned in the articles",
@@ -237,16 +431,11 @@ class GraphManager():
                         showrivers=True, rivercolor="LightBlue")
         
         fig = fig.update_traces(marker_line_width=0.2, hovertemplate="<b>%{z}</b> | %{location}")
+        fig.update_layout(showlegend=True)
 
-        saved_files = []
-
-        # Calculate the total number of exports for tqdm
-        tot_exports = len(self.plot_templates)
+        exports = []
 
-        # Wrap the loop with tqdm
-        for template in tqdm(self.plot_templates, total=tot_exports, bar_format=self.custom_bar, ascii=" =", leave=False):
-
-            fig.update_layout(showlegend=True, template=template)
+        for template in self.plot_templates:
 
             # Save the chart as an HTML file
             dirname = self.export_dir
@@ -255,7 +444,6 @@ class GraphManager():
             geo_proj_style = f"_natural_earth"
             template_style = f"_{template}"
             file_path = f"{dirname}{filename}{geo_proj_style}{template_style}{file_ext}"
-            pyo.plot(fig, filename=file_path, auto_open=False)
-            saved_files.append(f"Chart saved to '{file_path}'")
+            exports.append((file_path, {"template": template}))
 
-        return saved_files
\ No newline at end of file
+        return self._export(fig, exports, chart_id=f"{filename}{geo_proj_style}")
\ No newline at end of file
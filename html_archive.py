@@ -0,0 +1,314 @@
+# Standard modules
+import os
+import sys
+import zlib
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+
+try:
+    import zstandard # -> requirements.txt (without it, the pages are compressed with zlib)
+except ImportError:
+    zstandard = None
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+from scraper import WebScraper, ExtractionError
+from text_processor import TextProcessor
+from duplicate_detector import DuplicateDetector
+from revalidator import Revalidator, extraction_config_hash
+
+
+def compress(data: bytes) -> tuple:
+    """Returns (codec, compressed data)."""
+
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=9).compress(data)
+
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("The archived page is compressed with zstd. Install it with: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return zlib.decompress(data)
+
+
+def read_blob(path: str, offset: int, length: int, codec: str) -> bytes:
+    """Reads a single compressed page from a segment file (also used by the re-extraction worker processes)."""
+
+    with open(path, "rb") as file:
+        file.seek(offset)
+        return decompress(codec, file.read(length))
+
+
+class HTMLArchive():
+    """Optional archive of the raw HTML of the scraped article pages, so articles can be re-extracted later without fetching them again
+    (e.g. after fixing a stale div_filter/p_attr_exclusion of a site, the pages it missed are in 'exclude_articles').
+
+    The pages are content-addressed (BLAKE2b hash of the page, identical pages are stored once), compressed one by one (zstd, or zlib
+    if zstandard isn't installed) and appended to segment files of up to 'segment_size' bytes. Every archive (= scrape process) starts
+    its own segment file, so parallel workers never append to the same file. The 'html_archive' table maps every url
+    to its page, the 'html_blobs' table every page to its segment, offset and length."""
+
+    # custom tqdm loading bar format
+    custom_bar = "    [{bar:30}] {percentage:3.0f}%  "
+
+    def __init__(self, database: str, archive_dir: str = None, segment_size: int = 256_000_000, flush_size: int = 200, full_pages: bool = True):
+
+        self.db = database
+        self.archive_dir = archive_dir or f"{os.path.splitext(database)[0]}_html/" # e.g. sql_data_html/
+        self.segment_size = segment_size # bytes per segment file before a new one is started
+        self.flush_size = flush_size # buffered index rows before they're written to the database
+
+        # True = article pages are downloaded completely (not only up to the content container, see ContainerWatcher),
+        # so a changed div_filter can still find a container further down the page
+        self.full_pages = full_pages
+
+        self._lock = threading.Lock() # the fetches can run in several threads
+        self._pending_urls = [] # (url, content hash, domain, encoding, archived at)
+        self._pending_blobs = {} # content hash -> (segment, offset, length, raw length, codec)
+        self._segment = None # the segment file this archive appends to (claimed on the 1st page)
+        self._segment_bytes = 0
+
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.archive_dir, f"segment_{segment:06d}.pack")
+
+
+    def _claim_segment(self, segment: int) -> int:
+        """Creates a new segment file that only this archive appends to (the scrape workers are separate processes,
+        so a segment is never shared - otherwise another process could append in between the offset and the write)."""
+
+        while True:
+            try:
+                os.close(os.open(self.segment_path(segment), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return segment
+            except FileExistsError: # claimed by another process
+                segment += 1
+
+
+    def _current_segment(self, nbytes: int) -> int:
+        """The segment file the next page gets appended to (a new one once the current one is full)."""
+
+        if self._segment is None:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            segments = [int(name[8:14]) for name in os.listdir(self.archive_dir) if name.startswith("segment_") and name.endswith(".pack")]
+            self._segment = self._claim_segment(max(segments, default=0) + 1)
+            self._segment_bytes = 0
+
+        elif self._segment_bytes + nbytes > self.segment_size:
+            self._segment = self._claim_segment(self._segment + 1)
+            self._segment_bytes = 0
+
+        return self._segment
+
+
+    def _blob_exists(self, content_hash: str) -> bool:
+        return content_hash in self._pending_blobs or bool(sql.execute(self.db, "SELECT 1 FROM html_blobs WHERE content_hash = ?;", (content_hash,)))
+
+
+    def add(self, url: str, html: bytes, encoding: str = None):
+        """Archives the raw HTML of a page ('encoding' = the encoding the page was decoded with when it was scraped)."""
+
+        content_hash = hashlib.blake2b(html, digest_size=16).hexdigest()
+        domain = WebScraper.get_domain(url)
+
+        with self._lock:
+            if not self._blob_exists(content_hash):
+                codec, data = compress(html)
+                segment = self._current_segment(len(data))
+
+                # (only this archive appends to its segment, so the offset is its own byte count)
+                offset = self._segment_bytes
+                with open(self.segment_path(segment), "ab") as file:
+                    file.write(data)
+                self._segment_bytes += len(data)
+
+                self._pending_blobs[content_hash] = (segment, offset, len(data), len(html), codec)
+
+            self._pending_urls.append((url, content_hash, domain, encoding, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            flush_needed = len(self._pending_urls) >= self.flush_size
+
+        if flush_needed:
+            self.flush()
+
+
+    def flush(self):
+        """Writes the buffered index rows to the database (the pages themselves are already in the segment files)."""
+
+        with self._lock:
+            urls, self._pending_urls = self._pending_urls, []
+            blobs, self._pending_blobs = self._pending_blobs, {}
+
+        if blobs:
+            sql.execute_many(self.db, """INSERT OR IGNORE INTO html_blobs (content_hash, segment, offset, length, raw_length, codec)
+                                         VALUES (?, ?, ?, ?, ?, ?);""", [(content_hash, *blob) for content_hash, blob in blobs.items()])
+        if urls:
+            sql.execute_many(self.db, """INSERT OR REPLACE INTO html_archive (url, content_hash, domain, encoding, archived_at)
+                                         VALUES (?, ?, ?, ?, ?);""", urls)
+
+
+    def get(self, url: str) -> str:
+        """The archived HTML of a url (decoded the same way as when it was scraped), or None if it isn't archived."""
+
+        self.flush()
+
+        row = sql.execute(self.db, """SELECT b.segment, b.offset, b.length, b.codec, a.encoding FROM html_archive a
+                                      JOIN html_blobs b ON b.content_hash = a.content_hash WHERE a.url = ?;""", (url,))
+        if not row:
+            return None
+
+        segment, offset, length, codec, encoding = row[0]
+        return read_blob(self.segment_path(segment), offset, length, codec).decode(encoding or "utf-8", errors="replace")
+
+
+    def stats(self) -> list:
+        """Archived pages per domain: [(domain, pages, raw bytes, compressed bytes)]."""
+
+        self.flush()
+
+        return sql.execute(self.db, """SELECT a.domain, count(*), sum(b.raw_length), sum(b.length) FROM html_archive a
+                                       JOIN html_blobs b ON b.content_hash = a.content_hash GROUP BY a.domain ORDER BY a.domain;""")
+
+
+    def print_stats(self):
+
+        rows = self.stats()
+        if not rows:
+            print(f"    The HTML archive is empty.")
+            return
+
+        print(f"    {'Domain':<28}{'Pages':>8}{'Raw':>12}{'Stored':>12}")
+        for domain, pages, raw_bytes, stored_bytes in rows:
+            print(f"    {domain:<28}{pages:>8,}{raw_bytes / 1e6:>10.1f}MB{stored_bytes / 1e6:>10.1f}MB")
+
+        raw_total, stored_total = sum(row[2] for row in rows), sum(row[3] for row in rows)
+        print(f"    {'Total':<28}{sum(row[1] for row in rows):>8,}{raw_total / 1e6:>10.1f}MB{stored_total / 1e6:>10.1f}MB"
+              f"  (shared pages are counted per url, compressed with {'zstd' if zstandard else 'zlib'})")
+
+
+    def reextract(self, domain: str = None, workers: int = None, dry_run: bool = False, dedup_mode: str = "flag") -> dict:
+        """Re-runs the text extraction + cleaning over the archived pages of the excluded articles with the current site configs
+        of data_init.news_sites, in parallel worker processes. The articles that pass now are moved from 'exclude_articles' to 'articles'.
+        Returns {"recovered": amount, "still_excluded": amount}."""
+
+        self.flush()
+
+        sites = {site["domain"]: site for site in data_init.news_sites}
+        domain_filter = "AND a.domain = ?" if domain else ""
+
+        jobs = [(url, site_domain, self.segment_path(segment), offset, length, codec, encoding, archived_at)
+                for url, site_domain, segment, offset, length, codec, encoding, archived_at in sql.execute(self.db, f"""
+                    SELECT a.url, a.domain, b.segment, b.offset, b.length, b.codec, a.encoding, a.archived_at FROM html_archive a
+                    JOIN html_blobs b ON b.content_hash = a.content_hash
+                    WHERE a.url IN (SELECT url FROM exclude_articles) {domain_filter}
+                    ORDER BY b.segment, b.offset;""", (domain,) if domain else ())
+                if site_domain in sites]
+
+        results = {"recovered": 0, "still_excluded": 0}
+        if not jobs:
+            return results
+
+        dd = DuplicateDetector(self.db, mode=dedup_mode) if not dry_run else None
+        filters = {site_domain: (site["div_filter"], site["p_attr_exclusion"]) for site_domain, site in sites.items()}
+
+        recovered, reasons = [], []
+
+        # the pages are read + parsed in the worker processes, only the file locations and the results are sent between the processes
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            tasks = [(*job[:7], *filters[job[1]]) for job in jobs]
+
+            for (url, site_domain, _, _, _, _, _, archived_at), (text, error, code) in tqdm(zip(jobs, pool.map(_reextract_page, tasks, chunksize=16)),
+                                                                           total=len(jobs), bar_format=self.custom_bar, ascii=" =", leave=False):
+                if error is not None:
+                    results["still_excluded"] += 1
+                    reasons.append((error, code, extraction_config_hash(sites[site_domain]), url))
+                else:
+                    recovered.append((url, archived_at[:10], text))
+
+        # near-duplicates of stored articles stay excluded in "drop" mode, like during the scrape
+        if dd is not None:
+            kept = []
+            for url, date, text in recovered:
+                cluster_url = dd.check_article(url, text)
+                if cluster_url and dd.mode == "drop":
+                    reasons.append((f"near-duplicate of: {cluster_url}", "near_duplicate", None, url))
+                    results["still_excluded"] += 1
+                else:
+                    kept.append((url, date, text))
+            recovered = kept
+
+        results["recovered"] = len(recovered)
+
+        if not dry_run:
+            with sql.SQLiteDBManager(self.db) as db: # 1 transaction
+                db.execute_many("INSERT OR IGNORE INTO articles (url, scrape_date, content) VALUES (?, ?, ?);", recovered)
+                db.execute_many("DELETE FROM exclude_articles WHERE url = ?;", [(url,) for url, _, _ in recovered])
+                db.execute_many("UPDATE exclude_articles SET reason = ?, reason_code = ?, config_hash = ? WHERE url = ?;", reasons) # the latest reason
+
+        return results
+
+
+# re-extraction worker processes (1 scraper + text processor per process)
+_worker = {}
+
+def _reextract_page(task: tuple) -> tuple:
+    """Returns (cleaned article text, None, None) or (None, reason why the page has no usable article text, reason code)."""
+
+    url, _, path, offset, length, codec, encoding, div_filter, p_attr_exclusion = task
+
+    if not _worker:
+        _worker["ws"], _worker["tp"] = WebScraper(), TextProcessor()
+
+    try:
+        html = read_blob(path, offset, length, codec).decode(encoding or "utf-8", errors="replace")
+        text = _worker["ws"].extract_text(html, div_filter, p_attr_exclusion)
+        return _worker["tp"].text_cleaner(text), None, None
+
+    except ExtractionError as e:
+        return None, str(e), e.code
+
+    except (ValueError, OSError, zlib.error, ImportError) as e: # (ImportError: a zstd page without zstandard installed)
+        return None, str(e), "unknown"
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Raw HTML archive of the scraped article pages: statistics and re-extraction without refetching.")
+    parser.add_argument("--database", default="sql_data.db", help="database file (default: sql_data.db)")
+    parser.add_argument("--archive-dir", help="directory of the segment files (default: <database>_html/)")
+    parser.add_argument("--reextract", action="store_true", help="re-extract the archived pages of the excluded articles with the current site configs")
+    parser.add_argument("--domain", help="only re-extract the pages of this site, e.g. bbc.com")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all CPU cores)")
+    parser.add_argument("--dry-run", action="store_true", help="only show how many articles would be recovered")
+    args = parser.parse_args(argv)
+
+    for query in data_init.db_tables:
+        sql.execute(args.database, query)
+    Revalidator.migrate(args.database)
+
+    archive = HTMLArchive(args.database, archive_dir=args.archive_dir)
+
+    if not args.reextract:
+        archive.print_stats()
+        return 0
+
+    print(f"    Re-extracting the archived pages{' of ' + args.domain if args.domain else ''}{' (dry run)' if args.dry_run else ''}..")
+    results = archive.reextract(domain=args.domain, workers=args.workers, dry_run=args.dry_run)
+
+    print(f"    {results['recovered']:,} excluded article(s) {'would be' if args.dry_run else 'were'} recovered, {results['still_excluded']:,} still excluded.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
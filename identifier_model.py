@@ -0,0 +1,202 @@
+# Standard modules
+import os
+import sqlite3
+
+# Third-party modules -> requirements.txt
+import numpy as np
+from scipy import sparse
+
+# Custom made modules
+import sqlite_x33 as sql
+from identifier_store import IdentifierStore
+
+
+class IdentifierModel():
+    """The keywords/categories (identifiers) compiled once per database version: every keyword and category is interned to an integer ID,
+    with a category ID array for the keywords, so keyword hits can be tallied with integer-indexed array adds instead of string dicts.
+    Shared by the classification, the keyword counts and the identifier editor. Use IdentifierModel.load(database) to get the cached model."""
+
+    __slots__ = ("version", "categories", "category_db_ids", "category_ids", "keywords", "keyword_ids", "keyword_category_ids",
+                 "keyword_weights", "single_kw_ids", "phrase_kw_ids", "classification_order")
+
+    classification_modes = ("hits", "tfidf")
+
+    _cache = {} # database path -> model, rebuilt when the identifiers version of the database changes
+
+    def __init__(self, categories: list, keywords: list, version: int = None):
+        """'categories' = [(db id, category name)], 'keywords' = [(keyword, category name, weight)] in database order."""
+
+        self.version = version # the 'identifiers_version' counter of the database this model was built from
+
+        self.categories = [category for _, category in categories] # category ID -> category name
+        self.category_db_ids = np.array([db_id for db_id, _ in categories], dtype=np.int64) # category ID -> id in the categories table
+        self.category_ids = {category: category_id for category_id, category in enumerate(self.categories)} # category name -> category ID
+
+        self.keywords = [keyword for keyword, _, _ in keywords] # keyword ID -> keyword
+        self.keyword_ids = {keyword: keyword_id for keyword_id, keyword in enumerate(self.keywords)} # keyword -> keyword ID
+        self.keyword_category_ids = np.array([self.category_ids[category] for _, category, _ in keywords], dtype=np.int32) # keyword ID -> category ID
+        self.keyword_weights = np.array([1.0 if weight is None else weight for _, _, weight in keywords], dtype=np.float64) # keyword ID -> weight
+
+        # single keywords and phrases are matched differently (token ID lookup vs token ID sequence)
+        self.single_kw_ids = np.array([i for i, keyword in enumerate(self.keywords) if " " not in keyword], dtype=np.int32)
+        self.phrase_kw_ids = np.array([i for i, keyword in enumerate(self.keywords) if " " in keyword], dtype=np.int32)
+
+        # categories in the order of their first keyword (phrases first, then single keywords) - decides ties between categories
+        classification_order = []
+        for keyword_id in np.concatenate((self.phrase_kw_ids, self.single_kw_ids)):
+            category_id = int(self.keyword_category_ids[keyword_id])
+            if category_id not in classification_order:
+                classification_order.append(category_id)
+        self.classification_order = np.array(classification_order, dtype=np.int32)
+
+
+    @classmethod
+    def load(cls, database: str):
+        """Returns the compiled model of the database, only rebuilt when the identifiers have been edited since the last load."""
+
+        IdentifierStore.migrate(database) # (older databases get the keyword weights)
+
+        try:
+            version = sql.execute(database, "SELECT value FROM app_meta WHERE key = 'identifiers_version';")
+            version = version[0][0] if version else None
+        except sqlite3.OperationalError: # older database without the app_meta table -> no caching
+            version = None
+
+        cache_key = os.path.abspath(database)
+        model = cls._cache.get(cache_key)
+        if model is not None and version is not None and model.version == version:
+            return model
+
+        categories = sql.execute(database, "SELECT id, category FROM categories ORDER BY id;")
+        keywords = sql.execute(database, """
+                               SELECT keyword, cat.category, weight FROM keywords
+                               JOIN categories cat ON category_id = cat.id;""")
+
+        model = cls(categories, keywords, version)
+        cls._cache[cache_key] = model
+
+        return model
+
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+
+    def to_dict(self) -> dict:
+        """The identifiers as {category: {"id": db id, "keywords": [...]}} (also categories without keywords), for the identifier editor."""
+
+        dict_cat_kw = {category: {"id": int(db_id), "keywords": []} for category, db_id in zip(self.categories, self.category_db_ids)}
+        for keyword, category_id in zip(self.keywords, self.keyword_category_ids):
+            dict_cat_kw[self.categories[category_id]]["keywords"].append(keyword)
+
+        return dict_cat_kw
+
+
+    def keyword_token_ids(self, corpus) -> np.ndarray:
+        """Maps every token ID of a corpus store to the ID of the single keyword it matches (-1 = no keyword)."""
+
+        token_keyword_ids = np.full(len(corpus.vocab), -1, dtype=np.int32)
+        for keyword_id in self.single_kw_ids:
+            token_id = corpus.word_ids.get(self.keywords[keyword_id])
+            if token_id is not None:
+                token_keyword_ids[token_id] = keyword_id
+
+        return token_keyword_ids
+
+
+    def keyword_counts(self, corpus, article_mask: np.ndarray = None) -> np.ndarray:
+        """Occurences of every keyword (index = keyword ID) in all articles of a corpus store (or the articles of 'article_mask')."""
+
+        counts = np.zeros(len(self.keywords), dtype=np.int64)
+
+        word_counts = corpus.word_counts(article_mask)
+        token_keyword_ids = self.keyword_token_ids(corpus)
+        keyword_tokens = np.flatnonzero(token_keyword_ids >= 0)
+        counts[token_keyword_ids[keyword_tokens]] = word_counts[keyword_tokens]
+
+        for keyword_id in self.phrase_kw_ids:
+            counts[keyword_id] = corpus.counts_per_article(self.keywords[keyword_id])[article_mask if article_mask is not None else slice(None)].sum()
+
+        return counts
+
+
+    def keyword_matrix(self, corpus) -> sparse.csr_matrix:
+        """Keyword occurences per article, as a sparse (articles x keyword IDs) matrix."""
+
+        article_parts, keyword_parts = [], []
+        token_keyword_ids = self.keyword_token_ids(corpus)
+
+        # single keywords - a lookup of every token in the token -> keyword array, scanned in chunks of the token buffer
+        for chunk_start in range(0, len(corpus.tokens), corpus.scan_chunk_size):
+            chunk_keyword_ids = token_keyword_ids[corpus.tokens[chunk_start:chunk_start + corpus.scan_chunk_size]]
+            positions = np.flatnonzero(chunk_keyword_ids >= 0)
+            article_parts.append(corpus.article_index(positions + chunk_start))
+            keyword_parts.append(chunk_keyword_ids[positions])
+
+        # phrases - token ID sequences
+        for keyword_id in self.phrase_kw_ids:
+            token_ids = corpus.encode(self.keywords[keyword_id])
+            if token_ids is not None:
+                articles = corpus.article_index(corpus.phrase_positions(token_ids))
+                article_parts.append(articles)
+                keyword_parts.append(np.full(len(articles), keyword_id, dtype=np.int32))
+
+        articles = np.concatenate(article_parts) if article_parts else np.zeros(0, dtype=np.int64)
+        keywords = np.concatenate(keyword_parts) if keyword_parts else np.zeros(0, dtype=np.int32)
+
+        # (duplicate article/keyword pairs are summed up -> occurences)
+        return sparse.csr_matrix((np.ones(len(articles), dtype=np.float64), (articles, keywords)), shape=(len(corpus), len(self.keywords)))
+
+
+    def category_matrix(self) -> sparse.csr_matrix:
+        """Maps the keyword IDs to their category IDs, as a sparse (keyword IDs x category IDs) matrix."""
+        return sparse.csr_matrix((np.ones(len(self.keywords)), (np.arange(len(self.keywords)), self.keyword_category_ids)),
+                                 shape=(len(self.keywords), len(self.categories)))
+
+
+    def keyword_scores(self, keyword_matrix: sparse.csr_matrix, mode: str = "hits", idf: np.ndarray = None) -> sparse.csr_matrix:
+        """Weighted keyword scores per article.
+        "hits" = occurences x keyword weight, "tfidf" = (1 + log(occurences)) x idf x keyword weight, so keywords that occur
+        in most articles count less and a single keyword repeated over and over can't dominate an article on its own."""
+
+        if mode not in self.classification_modes:
+            raise ValueError(f"Unknown classification mode: '{mode}'. Valid modes are {', '.join(self.classification_modes)}.")
+
+        scores = keyword_matrix.copy()
+        keyword_weights = self.keyword_weights
+
+        if mode == "tfidf":
+            scores.data = 1 + np.log(scores.data)
+            keyword_weights = keyword_weights * (self.idf(keyword_matrix) if idf is None else idf)
+
+        # (no row normalization - the score of an article stays a plain sum over its keywords)
+        return scores @ sparse.diags(keyword_weights)
+
+
+    @staticmethod
+    def idf(keyword_matrix: sparse.csr_matrix) -> np.ndarray:
+        """Smoothed inverse document frequency of every keyword."""
+
+        article_count = keyword_matrix.shape[0]
+        document_frequency = np.bincount(keyword_matrix.indices, minlength=keyword_matrix.shape[1])
+
+        return np.log((1 + article_count) / (1 + document_frequency)) + 1
+
+
+    def category_scores(self, corpus, mode: str = "hits") -> np.ndarray:
+        """Category scores of every article of a corpus store, as a dense (articles x category IDs) array."""
+        return (self.keyword_scores(self.keyword_matrix(corpus), mode) @ self.category_matrix()).toarray()
+
+
+    def classify(self, corpus, mode: str = "hits") -> np.ndarray:
+        """The main category ID (highest score) of every article of a corpus store, for the whole archive in one go."""
+
+        if not len(self.classification_order):
+            raise ValueError("There are no keywords to classify the articles with.")
+
+        return self.best_categories(self.category_scores(corpus, mode))
+
+
+    def best_categories(self, category_scores: np.ndarray) -> np.ndarray:
+        """The category ID with the highest score of every row (ties go to the category that comes first in the classification order)."""
+        return self.classification_order[np.argmax(category_scores[:, self.classification_order], axis=1)]
@@ -0,0 +1,221 @@
+# Standard modules
+import os
+import csv
+import sys
+import json
+import argparse
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+
+
+class IdentifierStore():
+    """Bulk import/export of the identifiers (keywords/categories) as CSV or JSON.
+
+    A batch of keywords is upserted in a single transaction (a new keyword is added, an existing one gets the category/weight of the batch,
+    or keeps its weight when the row has none, an unchanged one isn't touched), so a batch costs one commit instead of one connection per keyword, and the compiled identifier model
+    and the stored classification are updated once afterwards, only for the keywords that actually changed.
+
+    CSV: a 'category,keyword,weight' header ('weight' optional: 1.0 for a new keyword, an existing one keeps its stored weight),
+    a row without keyword only adds the category.
+    JSON: {category: [keyword, ..]} (the format of data_init.db_categories_keywords) or {category: {keyword: weight}}."""
+
+    csv_columns = ("category", "keyword", "weight")
+
+    def __init__(self, database: str):
+        self.db = database
+        self.migrate(self.db)
+
+
+    @staticmethod
+    def migrate(database: str):
+        """Adds the 'weight' column to the keywords table of older databases."""
+
+        columns = [column[1] for column in sql.execute(database, "PRAGMA table_info(keywords);")]
+        if columns and "weight" not in columns:
+            sql.execute(database, "ALTER TABLE keywords ADD COLUMN weight REAL DEFAULT 1.0;")
+
+
+    @staticmethod
+    def normalize(word: str) -> str:
+        """Lowercase, without surrounding/repeated whitespace (the same form the identifier editor stores)."""
+        return " ".join(str(word).lower().split())
+
+
+    @classmethod
+    def rows_from_dict(cls, identifiers: dict) -> list:
+        """{category: [keyword, ..]} or {category: {keyword: weight}} -> [(category, keyword or None, weight)]."""
+
+        rows = []
+        for category, keywords in identifiers.items():
+            if not keywords:
+                rows.append((category, None, None))
+                continue
+
+            if isinstance(keywords, dict):
+                rows += [(category, keyword, weight) for keyword, weight in keywords.items()]
+            elif isinstance(keywords, list):
+                rows += [(category, keyword, None) for keyword in keywords]
+            else:
+                raise ValueError(f"The keywords of category '{category}' have to be a list or a {{keyword: weight}} object.")
+
+        return rows
+
+
+    def upsert(self, rows: list) -> dict:
+        """Adds/updates [(category, keyword or None, weight or None)] in a single transaction. A keyword that is in the batch more than once
+        gets its last row. Without a weight, a new keyword gets 1.0 and an existing one keeps its stored weight. Raises ValueError for an invalid row (nothing is stored then).
+        Returns {"categories": added, "added": keywords, "updated": keywords, "unchanged": keywords}."""
+
+        keywords = {} # keyword -> (category, weight), in the order of the batch
+        categories = []
+
+        for line, (category, keyword, weight) in enumerate(rows, start=1):
+            category = self.normalize(category or "")
+            keyword = self.normalize(keyword or "")
+
+            if not category:
+                raise ValueError(f"Row {line}: the category is missing.")
+
+            try:
+                weight = None if weight in (None, "") else float(weight)
+            except (TypeError, ValueError):
+                raise ValueError(f"Row {line}: invalid weight '{weight}' for keyword '{keyword}'.")
+            if weight is not None and weight < 0:
+                raise ValueError(f"Row {line}: the weight of keyword '{keyword}' is negative.")
+
+            if category not in categories:
+                categories.append(category)
+            if keyword:
+                keywords[keyword] = (category, weight)
+
+        with sql.SQLiteDBManager(self.db) as db:
+
+            # (no UNIQUE constraint on the category names, so the missing ones are looked up first)
+            category_ids = dict(db.execute_query("SELECT category, min(id) FROM categories GROUP BY category;"))
+            new_categories = [category for category in categories if category not in category_ids]
+            db.execute_many("INSERT INTO categories (category) VALUES (?);", [(category,) for category in new_categories])
+            category_ids = dict(db.execute_query("SELECT category, min(id) FROM categories GROUP BY category;"))
+
+            stored = {keyword: (category_id, weight) for keyword, category_id, weight in db.execute_query("SELECT keyword, category_id, weight FROM keywords;")}
+            # a row without weight keeps the stored weight of an existing keyword (a plain keyword list must not reset tuned weights)
+            batch = [(keyword, category_ids[category], stored[keyword][1] if weight is None and keyword in stored else weight)
+                     for keyword, (category, weight) in keywords.items()]
+            changed = [(keyword, category_id, 1.0 if weight is None else weight) for keyword, category_id, weight in batch
+                       if stored.get(keyword) != (category_id, weight)]
+
+            # the WHERE clause skips the unchanged keywords, so they don't fire the version/change log triggers
+            db.execute_many("""INSERT INTO keywords (keyword, category_id, weight) VALUES (?, ?, ?)
+                               ON CONFLICT (keyword) DO UPDATE SET category_id = excluded.category_id, weight = excluded.weight
+                               WHERE category_id IS NOT excluded.category_id OR weight IS NOT excluded.weight;""", changed)
+
+        added = sum(1 for row in changed if row[0] not in stored)
+
+        return {"categories": len(new_categories), "added": added, "updated": len(changed) - added, "unchanged": len(batch) - len(changed)}
+
+
+    def export_rows(self) -> list:
+        """[(category, keyword or None, weight)] of every stored identifier, categories without keywords get a row without keyword."""
+
+        return sql.execute(self.db, """SELECT cat.category, kw.keyword, kw.weight FROM categories cat
+                                       LEFT JOIN keywords kw ON kw.category_id = cat.id
+                                       ORDER BY cat.id, kw.rowid;""")
+
+
+    ## Files
+
+    def import_file(self, file_path: str) -> dict:
+        """Upserts the identifiers of a .csv or .json file (see the class docstring for the formats)."""
+
+        extension = os.path.splitext(file_path)[1].lower()
+
+        if extension == ".json":
+            with open(file_path, "r", encoding="utf-8") as file:
+                identifiers = json.load(file)
+            if not isinstance(identifiers, dict):
+                raise ValueError("The JSON file has to be a {category: keywords} object.")
+            rows = self.rows_from_dict(identifiers)
+
+        elif extension == ".csv":
+            with open(file_path, "r", newline="", encoding="utf-8-sig") as file:
+                reader = csv.DictReader(file)
+                if not reader.fieldnames or not {"category", "keyword"} <= {name.strip().lower() for name in reader.fieldnames}:
+                    raise ValueError(f"The CSV file needs a header with the columns {', '.join(self.csv_columns)} ('weight' is optional).")
+                rows = [(row.get("category"), row.get("keyword"), row.get("weight"))
+                        for row in ({(name or "").strip().lower(): value for name, value in row.items()} for row in reader)]
+
+        else:
+            raise ValueError(f"Unsupported file type '{extension}' (.csv or .json).")
+
+        return self.upsert(rows)
+
+
+    def export_file(self, file_path: str) -> int:
+        """Writes every stored identifier to a .csv or .json file. Returns the amount of keywords."""
+
+        extension = os.path.splitext(file_path)[1].lower()
+        rows = self.export_rows()
+
+        if extension == ".json":
+            identifiers = {}
+            for category, keyword, weight in rows:
+                identifiers.setdefault(category, {})
+                if keyword is not None:
+                    identifiers[category][keyword] = weight
+            with open(file_path, "w", encoding="utf-8") as file:
+                json.dump(identifiers, file, indent=2, ensure_ascii=False)
+
+        elif extension == ".csv":
+            with open(file_path, "w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(self.csv_columns)
+                writer.writerows((category, keyword or "", "" if keyword is None else weight) for category, keyword, weight in rows)
+
+        else:
+            raise ValueError(f"Unsupported file type '{extension}' (.csv or .json).")
+
+        return sum(1 for _, keyword, _ in rows if keyword is not None)
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Import/export the keywords and categories as CSV or JSON.")
+    parser.add_argument("--database", default="sql_data.db", help="database file (default: sql_data.db)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--import", dest="import_path", metavar="FILE", help="upsert the identifiers of a .csv/.json file")
+    group.add_argument("--export", dest="export_path", metavar="FILE", help="write the identifiers to a .csv/.json file")
+    parser.add_argument("--no-reclassify", action="store_true", help="don't update the stored classification after an import")
+    args = parser.parse_args(argv)
+
+    for query in data_init.db_tables:
+        sql.execute(args.database, query)
+
+    store = IdentifierStore(args.database)
+
+    if args.export_path:
+        print(f"    Exported {store.export_file(args.export_path):,} keyword(s) to '{args.export_path}'.")
+        return 0
+
+    try:
+        result = store.import_file(args.import_path)
+    except (OSError, ValueError) as e:
+        print(f"    Import failed: {e}")
+        return 1
+
+    print(f"    Imported '{args.import_path}': {result['added']:,} keyword(s) added, {result['updated']:,} updated, "
+          f"{result['unchanged']:,} unchanged, {result['categories']:,} new category(s).")
+
+    if (result["added"] or result["updated"]) and not args.no_reclassify:
+        # imported here, so exports don't have to load numpy/scipy
+        from reclassifier import Reclassifier
+        try:
+            print(f"    Reclassified {Reclassifier(args.database).sync():,} article(s).")
+        except ValueError: # no keywords to classify with
+            pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
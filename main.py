@@ -3,10 +3,12 @@ import os
 import re
 import shutil
 import sqlite3
+import time
 import logging
-from datetime import datetime, timedelta
-from collections import defaultdict
-from itertools import zip_longest
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
 
 # Third-party modules -> requirements.txt
 import requests
@@ -16,48 +18,89 @@ import data_init # data needed for initializing the app such as site specific sc
 import sqlite_x33 as sql
 from scraper import WebScraper
 from text_processor import TextProcessor
-from article_statistics import ArticleStatistics
-from graph_mgr import GraphManager
+from duplicate_detector import DuplicateDetector
+from work_queue import WorkQueue
+from run_coordinator import RunCoordinator
+from metrics import ScrapeMetrics
+from adaptive_controller import AdaptiveController
+from html_archive import HTMLArchive
+from feed_discovery import FeedDiscovery
+from page_scheduler import PageScheduler
+from identifier_store import IdentifierStore
+from revalidator import Revalidator, extraction_config_hash
 
 
 class NewsScraper():
 
-    def __init__(self):
+    def __init__(self, database: str = "sql_data.db"):
 
         self.news_sites = data_init.news_sites # the news sites for scraping
+        self.sites_by_domain = self.compile_site_profiles(self.news_sites) # the site profiles with precompiled regex filters, looked up by domain
         self.headers = data_init.headers # "requests" headers info
-        self.db = "sql_data.db" # the database file which will be used
+        self.db = database # the database file which will be used
         self.export_dir = "exports/"
         self.link_export = "exported_db_article_links.txt" # the text file which will be created for article link exports
+        self.identifier_export = "exported_identifiers" # the keywords/categories export (.csv or .json)
         self.db_init_tables = data_init.db_tables # initializing tables for the database
         self.db_init_cat_kw = data_init.db_categories_keywords # initializing categories and keywords for the database
         self.tp = TextProcessor() # creating an instance of the TextProcessor class
-        self.ws = WebScraper() # creating an instance of the WebScraper class
+        self.metrics = ScrapeMetrics(self.db) # per-domain timings of the scrape stages (stored in the 'scrape_metrics' table)
+        self.ws = WebScraper(metrics=self.metrics, upstream=data_init.upstream_override) # creating an instance of the WebScraper class
+        self.ws.controller = AdaptiveController() # per-site parallel requests, delay and timeouts adapted to the observed latency/errors (None = fixed sleep delay, 1 request at a time)
+        self.fetch_threads = 8 # parallel article fetches in total (over all sites) when the adaptive controller is used
+        self.discovery_mode = "feeds" # new article urls from the news sitemaps/RSS feeds of the sites ("feeds", HTML crawl as fallback) or always by crawling the listing pages ("html")
+        self.archive_html = False # opt-in: keep the raw HTML of every article page (html_archive.py), to re-extract articles later without refetching
         self.clear_terminal = "cls" if os.name == "nt" else "clear" # "nt" (windows), "posix" (linux/mac) / Ternary conditional operator
+        self.dedup_mode = "flag" # near-duplicate check at ingest: "off", "flag" (store + tag the story cluster) or "drop" (don't store near-duplicates)
+        self.dedup_analytics = False # if True, every story cluster (syndicated copies of the same article) is only counted once in the analytics
+        self.classification_mode = "hits" # article categories by "hits" (most weighted keyword hits) or "tfidf" (TF-IDF weighted keyword scores)
+        self.profile_analytics = False # opt-in: profile every analytics operation (timings, memory, cProfile dump + history in profiles/)
+        self.chart_export_mode = "standalone" # "standalone" (plotly.js inlined in every chart file), "shared" (1 plotly.js file in the export dir) or "dashboard" (1 file with all charts)
+        self.seen_urls = None # cache of all queued/stored/excluded urls, kept between scrape cycles in daemon mode
+        self.seen_article_rowids = (0, 0) # the stored/excluded articles up to these rowids are in the seen urls
+        self.dd = None # the near-duplicate detector (and its index), kept between scrape cycles in daemon mode
+        self.stop_requested = threading.Event() # set to stop a running scrape gracefully after the current article
         
         self.menu_system = {"MAIN MENU": ["Scrape & store data", "Analyze saved data", "Edit identifiers"], 
-                       "ANALYZE SAVED DATA": ["Top keywords", "Custom keywords (single/comparison)", "Top categories", "Country mentions", "Export stored article links", "Scrape statistics"], 
-                       "EDIT IDENTIFIERS": ["Show keywords/categories", "Add keyword/category", "Delete keyword/category"]}
+                       "ANALYZE SAVED DATA": ["Top keywords", "Custom keywords (single/comparison)", "Top categories", "Country mentions", "Export stored article links", "Scrape statistics", "Near-duplicate report", "Export corpus snapshot (Parquet)"], 
+                       "EDIT IDENTIFIERS": ["Show keywords/categories", "Add keyword/category", "Delete keyword/category", "Import keywords/categories (CSV/JSON)", "Export keywords/categories (CSV/JSON)"]}
 
         # acts as a check if the database already has been setup correctly. If the error occurs a new Database with the proper tables will be created and filled with the init data
         try: 
             sql.execute(self.db, "SELECT * FROM keywords LIMIT 1")
+            db_initialized = True
 
         except sqlite3.OperationalError:
+            db_initialized = False
 
-            # creates the db automatically and inserts the 3 tables
-            for query in self.db_init_tables:
-                sql.execute(self.db, query)
-            
-            # inserts the category + keyword data
-            for category, keywords_list in self.db_init_cat_kw.items():
-                sql.execute(self.db, f"INSERT INTO categories (category) VALUES ('{category}')")
+        # creates the db automatically and inserts the tables ("IF NOT EXISTS" also adds tables from newer versions to an existing db)
+        for query in self.db_init_tables:
+            sql.execute(self.db, query)
+
+        if not db_initialized:
+
+            # inserts the category + keyword data (in a single transaction)
+            IdentifierStore(self.db).upsert(IdentifierStore.rows_from_dict(self.db_init_cat_kw))
+
+        self.queue = WorkQueue(self.db) # durable job queue for the article urls waiting to be scraped
+        self.feeds = FeedDiscovery(self.db, self.ws, self.headers) # sitemap/RSS discovery state (conditional GETs, newest entry seen per feed)
+        self.scheduler = PageScheduler(self.db) # how often and how deep every listing page gets crawled, learned from its new urls per crawl
+        Revalidator.migrate(self.db) # structured exclusion reasons (older databases only have the free-text reason)
+
+
+    def compile_site_profiles(self, news_sites: list) -> dict:
+        """Returns the site configs by domain, with the regex filters compiled once instead of on every url/article."""
 
-                cat_id_fetch = sql.execute(self.db, f"SELECT id FROM categories WHERE category='{category}'") # returns a tuple inside a list (fetchall)
-                cat_id_fetch = cat_id_fetch[0][0] # to get the actual id number
+        sites_by_domain = {}
+        for site in news_sites:
+            profile = dict(site)
+            profile["url_filter"] = re.compile(site["url_filter"])
+            profile["url_exclusion"] = [re.compile(regex) for regex in site["url_exclusion"]]
+            profile["div_filter"] = re.compile(site["div_filter"])
+            profile["config_hash"] = extraction_config_hash(site) # stored with every exclusion, see revalidator.py
+            sites_by_domain[re.sub(r"^https://|/.*", "", site["domain"])] = profile
 
-                for keyword in keywords_list:          
-                    sql.execute(self.db, f"INSERT INTO keywords (keyword, category_id) VALUES ('{keyword}', {cat_id_fetch})")
+        return sites_by_domain
 
 
     def validate_user_input(self, word: str) -> bool:
@@ -75,24 +118,23 @@ class NewsScraper():
     def fetch_cat_kw_from_db(self) -> dict:
         '''Fetch the stored identifiers (keyword/categories) from the database'''
 
-        # fetch the stored identifiers (keyword/categories) from the database
-        db_cat_kw = sql.execute(self.db, """
-                            SELECT categories.id, category, kw.keyword FROM categories
-                            LEFT JOIN keywords kw ON category_id = categories.id;""")
-    
-        # Create an empty dictionary to hold the results
-        dict_cat_kw = {}
-        
-        # Populate the dictionary
-        for cat_id, cat_name, keyword in db_cat_kw:
+        # the compiled identifier model is shared with the analytics, and only reloaded after the identifiers have been edited
+        from identifier_model import IdentifierModel
+
+        return IdentifierModel.load(self.db).to_dict() # {category: {'id': id, 'keywords': [...]}}
 
-            if cat_name not in dict_cat_kw:
-                dict_cat_kw[cat_name] = {'id': cat_id, 'keywords': []}
-            
-            if keyword:
-                dict_cat_kw[cat_name]['keywords'].append(keyword)
-        
-        return dict_cat_kw
+
+    def reclassify_articles(self):
+        """Updates the stored classification after an identifier edit (only the articles containing the edited keywords get rescored)."""
+
+        # imported here instead of at the top, so the scraper doesn't have to load numpy/scipy
+        from reclassifier import Reclassifier
+
+        try:
+            reclassified = Reclassifier(self.db, self.classification_mode).sync()
+            print(f"    Reclassified {reclassified} article(s).")
+        except ValueError: # no keywords left to classify with
+            pass
 
 
     def main(self):
@@ -186,9 +228,20 @@ class NewsScraper():
 
     def page_analyze(self):
 
+        # imported here instead of at the top, so the scraper (scheduled runs) doesn't have to load pandas/plotly/country_converter
+        from article_statistics import ArticleStatistics
+        from graph_mgr import GraphManager
+
         # analyze data and plot charts
-        st = ArticleStatistics(self.db)
-        gm = GraphManager() # using the GraphManager() to print charts
+        if self.profile_analytics:
+            from profiler import OperationProfiler
+            profiler = OperationProfiler()
+            st = profiler.wrap(profiler.run("ArticleStatistics.__init__", ArticleStatistics, self.db, dedup_clusters=self.dedup_analytics,
+                                            classification_mode=self.classification_mode), "ArticleStatistics")
+            gm = profiler.wrap(GraphManager(export_mode=self.chart_export_mode), "GraphManager")
+        else:
+            st = ArticleStatistics(self.db, dedup_clusters=self.dedup_analytics, classification_mode=self.classification_mode)
+            gm = GraphManager(export_mode=self.chart_export_mode) # using the GraphManager() to print charts
 
         sub_page_active = False
 
@@ -206,6 +259,7 @@ class NewsScraper():
                 input_choice = input(f"    Please select an option: ")
 
             if input_choice.lower() == "q":
+                gm.close() # shut down the chart export processes
                 break
 
             elif input_choice == str(1 + self.menu_system["ANALYZE SAVED DATA"].index("Top keywords")):
@@ -412,6 +466,56 @@ class NewsScraper():
                 input(f"    Press ENTER to continue: ")
                 sub_page_active = False
 
+            elif input_choice == str(1 + self.menu_system["ANALYZE SAVED DATA"].index("Near-duplicate report")):
+                if sub_page_active == False:
+                    sub_page_active = True
+                    continue
+
+                print(f"    ________________________________________")
+                print(f"    Near-duplicate report:")
+                print(f"    ‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾")
+
+                # story clusters = the same (syndicated) article stored from several urls (read-only, the index isn't loaded/backfilled)
+                clusters = DuplicateDetector(self.db, mode="off").get_cluster_report()
+                duplicate_count = sum(cluster["size"] - 1 for cluster in clusters)
+
+                print()
+                print(f"    Story clusters with near-duplicates: {len(clusters)} ({duplicate_count} duplicate article(s))\n")
+
+                for cluster in clusters[:20]:
+                    print(f"    [{cluster['size']}] {cluster['cluster_url']}")
+                    print(f"        {', '.join(cluster['domains'])}")
+
+                print(f"\n")
+                input(f"    Press ENTER to continue: ")
+                sub_page_active = False
+
+            elif input_choice == str(1 + self.menu_system["ANALYZE SAVED DATA"].index("Export corpus snapshot (Parquet)")):
+                if sub_page_active == False:
+                    sub_page_active = True
+                    continue
+
+                print(f"    ________________________________________")
+                print(f"    Exporting corpus snapshot:")
+                print(f"    ‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾")
+
+                try:
+                    from snapshot_export import SnapshotExporter
+                    exporter = SnapshotExporter(st, export_dir=f"{self.export_dir}snapshot/")
+
+                    # (only the scrape dates that weren't exported yet are written)
+                    saved_files = exporter.export_articles() + exporter.export_aggregates()
+
+                    print()
+                    print(f"    Successfully exported the corpus snapshot ({len(saved_files)} file(s)) to '{exporter.export_dir}'.")
+
+                except ImportError as e:
+                    print(f"\n    {e}")
+
+                print(f"\n")
+                input(f"    Press ENTER to continue: ")
+                sub_page_active = False
+
             else: # if the user failed to input one of the valid menu options
                 input("\n    Invalid menu option. Press ENTER to try again: ")
 
@@ -619,6 +723,7 @@ class NewsScraper():
 
                     print()
                     print(f"    Stored the new keyword '{new_keyword.title()}' to category '{cat_select.title()}' in the database.")
+                    self.reclassify_articles()
                     print(f"\n")
                     input(f"    Press ENTER to continue: ")
                     retry_cat_pre_select = None
@@ -690,6 +795,7 @@ class NewsScraper():
 
                     print()
                     print(f"    Deleted the category '{del_category.title()}' from the database.")
+                    self.reclassify_articles()
                     print(f"\n")
                     input(f"    Press ENTER to continue: ")
                     sub_page_active = False
@@ -771,6 +877,7 @@ class NewsScraper():
 
                     print()
                     print(f"    Deleted the keyword '{del_keyword}' from category '{cat_select.title()}' in the database.")
+                    self.reclassify_articles()
                     print(f"\n")
                     input(f"    Press ENTER to continue: ")
                     retry_cat_pre_select = None
@@ -780,191 +887,372 @@ class NewsScraper():
                     input("\n    Invalid option. Press ENTER to try again: ")
                     continue
 
+            elif input_choice == str(1 + self.menu_system["EDIT IDENTIFIERS"].index("Import keywords/categories (CSV/JSON)")):
+
+                print()
+                print(f"    CSV: a 'category,keyword,weight' header ('weight' is optional)")
+                print(f"    JSON: {{category: [keyword, ..]}} or {{category: {{keyword: weight}}}}")
+
+                import_path = input("\n    Please type in the path of the file to import (ENTER to cancel): ").strip().strip('"')
+
+                if not import_path:
+                    continue
+
+                try:
+                    result = IdentifierStore(self.db).import_file(import_path)
+                except (OSError, ValueError) as e:
+                    input(f"\n    Import failed: {e}. Press ENTER to continue: ")
+                    continue
+
+                print()
+                print(f"    Imported '{import_path}': {result['added']} keyword(s) added, {result['updated']} updated, {result['unchanged']} unchanged, {result['categories']} new category(s).")
+                if result["added"] or result["updated"]:
+                    self.reclassify_articles() # once for the whole file
+                print(f"\n")
+                input(f"    Press ENTER to continue: ")
+
+            elif input_choice == str(1 + self.menu_system["EDIT IDENTIFIERS"].index("Export keywords/categories (CSV/JSON)")):
+
+                export_format = input("\n    Export as CSV [1] or JSON [2] (ENTER to cancel): ").strip()
+
+                if export_format not in ("1", "2"):
+                    continue
+
+                # creating a directory for our files if it doesn't exist already
+                if not os.path.exists(self.export_dir):
+                    os.mkdir(self.export_dir)
+
+                export_file_path = f"{self.export_dir}{self.identifier_export}.{'csv' if export_format == '1' else 'json'}"
+                keyword_count = IdentifierStore(self.db).export_file(export_file_path)
+
+                print()
+                print(f"    Successfully exported {keyword_count} keyword(s) to file '{export_file_path}'.")
+                print(f"\n")
+                input(f"    Press ENTER to continue: ")
+
             else: # if the user failed to input one of the valid menu options
                 input("\n    Invalid menu option. Press ENTER to try again: ")
 
 
     def scrape_domains(self, pagin_amount, debug_mode):
 
-        total_amount_of_sites = len(self.news_sites)
+        total_amount_of_sites = len(self.sites_by_domain)
 
-        # Fetch existing URLs from scrape_que, articles, and exclude_articles into a set
-        all_existing_urls = set(url[0] for url in sql.execute(self.db, """
-            SELECT url FROM scrape_que
-            UNION
-            SELECT url FROM articles
-            UNION
-            SELECT url FROM exclude_articles;
-        """))
+        # Fetch existing URLs from the job queue, articles, and exclude_articles into a set
+        self.update_seen_urls()
 
         # self.news_sites = [site for site in self.news_sites if site['domain'] == 'apnews.com'] # DEBUG
         
         # fetch page urls
-        for i, site in enumerate(self.news_sites):
+        for i, site in enumerate(self.sites_by_domain.values()):
+
+            if self.stop_requested.is_set():
+                break
             
             print(f"    Scraping {site['domain']} ({i+1}/{total_amount_of_sites} sites)..")
 
             try:
-                article_urls_per_site = self.ws.URLScraper(self.headers, site["domain"], site["pages"], site["url_filter"], 
-                                                    site["url_exclusion"], site["pagin_filter"], pagin_amount, debug_mode)
-                
-                # Filter out URLs already in the scrape_que
-                new_article_urls_per_site = [url for url in article_urls_per_site if url not in all_existing_urls]
-                
-                # Insert the scraped URLs into the scrape_que table only if they don't already exist
-                for url in new_article_urls_per_site:
+                # new urls from the news sitemaps/RSS feeds of the site, the listing pages are only crawled if it has no usable feed
+                article_urls_per_site = self.feeds.discover(site) if self.discovery_mode == "feeds" else None
 
-                        scrape_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if article_urls_per_site is None:
+                    self.crawl_due_pages(site, pagin_amount, debug_mode)
+                    continue
 
-                        sql.execute(self.db, 
-                                    f"""INSERT INTO scrape_que
-                                    (url, scrape_time, scrape_retries)
-                                    VALUES ('{url}', '{scrape_time}', 0);""")
+                print(f"    {len(article_urls_per_site)} new url(s) from the feeds of {site['domain']}") if debug_mode else None # DEBUG
+                self.enqueue_new_urls(article_urls_per_site, site)
             
             except Exception as e:
                 logging.error(f"Error while scraping {site['domain']}: {e}")
                 continue
 
 
-    def scrape_article_urls(self, debug_mode):
+    def crawl_due_pages(self, site: dict, pagin_amount: int, debug_mode: bool):
+        """Crawls the listing pages of a site that are due according to the page scheduler, each to its own pagination depth
+        (at most 'pagin_amount'), and feeds the amount of new urls every page yielded back into its schedule."""
+
+        due_pages = self.scheduler.due_pages(site["domain"], site["pages"], pagin_amount)
+        print(f"    {len(due_pages)}/{len(site['pages'])} page(s) of {site['domain']} due: {due_pages}") if debug_mode else None # DEBUG
+
+        for page, depth in due_pages:
+
+            if self.stop_requested.is_set():
+                break
 
-        # Remove any scrape_que urls that are already in either articles or exclude_articles
-        sql.execute(self.db, """DELETE FROM scrape_que
-                                 WHERE url IN (SELECT url FROM articles)
-                                    OR url IN (SELECT url FROM exclude_articles);""")
+            try:
+                article_urls = self.ws.URLScraper(self.headers, site["domain"], [page], site["url_filter"], site["url_exclusion"],
+                                                  site["pagin_filter"], depth, debug_mode, max_bytes=site.get("max_bytes"))
+            except Exception as e:
+                logging.error(f"Error while scraping {site['domain']}{page}: {e}")
+                continue # the page stays due, so it's retried in the next run
 
-        # Reset the AUTOINCR sequence before inserting
-        sql.execute(self.db, f"DELETE FROM `sqlite_sequence` WHERE `name` = 'scrape_que';") 
+            self.scheduler.record(site["domain"], page, depth, self.enqueue_new_urls(article_urls, site), paginated=bool(site["pagin_filter"]))
 
-        # Fetch URLs from the table
-        all_scraped_article_urls = sql.execute(self.db, "SELECT url FROM scrape_que;")
 
-        # Extract URLs into a list
-        all_scraped_article_urls = [row[0] for row in all_scraped_article_urls]
+    def update_seen_urls(self):
+        """Adds the queued/stored/excluded urls to the seen urls. In daemon mode the set is kept between the cycles, so only the
+        articles stored/excluded since the previous cycle are read (also the ones of other workers or a re-extraction), plus the (small) job queue."""
 
-        total_new_articles_count = len(all_scraped_article_urls)
+        if self.seen_urls is None:
+            self.seen_urls = set()
 
-        # Create a defaultdict to hold URLs grouped by domain
-        urls_by_domain = defaultdict(list)
+        article_rowid, exclude_rowid = self.seen_article_rowids
+        new_article_rowid, new_exclude_rowid = sql.execute(self.db, """SELECT (SELECT coalesce(max(rowid), 0) FROM articles),
+                                                                              (SELECT coalesce(max(rowid), 0) FROM exclude_articles);""")[0]
 
-        # Populate the defaultdict
-        for url in all_scraped_article_urls:
-            domain = re.sub(r"^https://(www.)?|/.*", "", url)
-            urls_by_domain[domain].append(url)
+        self.seen_urls.update(url[0] for url in sql.execute(self.db, """
+            SELECT url FROM scrape_jobs
+            UNION
+            SELECT url FROM articles WHERE rowid > ? AND rowid <= ?
+            UNION
+            SELECT url FROM exclude_articles WHERE rowid > ? AND rowid <= ?;
+        """, (article_rowid, new_article_rowid, exclude_rowid, new_exclude_rowid)))
+        self.seen_article_rowids = (new_article_rowid, new_exclude_rowid)
 
-        # Convert the defaultdict to a list of lists
-        sorted_article_urls = list(urls_by_domain.values())
-        
-        prev_url = ""
+
+    def enqueue_new_urls(self, article_urls: list, site: dict) -> int:
+        """Adds the urls that aren't queued, stored or excluded yet to the job queue. Returns the amount of new urls."""
+
+        # Filter out URLs already in the queue
+        new_article_urls = [url for url in article_urls if url not in self.seen_urls]
+
+        # Add the scraped URLs to the job queue (the site priority decides which domains get scraped first)
+        self.queue.enqueue(new_article_urls, priority=site.get("priority", 0))
+        self.seen_urls.update(new_article_urls)
+
+        return len(new_article_urls)
+
+
+    def scrape_article_urls(self, debug_mode, coordinator: RunCoordinator = None):
+
+        # Remove any queued urls that are already in either articles or exclude_articles
+        self.queue.purge_known()
+
+        total_new_articles_count = self.queue.due_count()
+
+        prev_domain = None
         date = str(datetime.now().date()) # save the date together with the article url + text
         curr_article_url_no = 0
         urls_not_saved = 0
 
-        for article_url in zip_longest(*sorted_article_urls):
-            for url in article_url:
-                if url is not None:
+        if self.archive_html and self.ws.archive is None:
+            self.ws.archive = HTMLArchive(self.db)
+
+        # near-duplicate check (syndicated wire stories etc) before storing
+        if self.dd is None:
+            self.dd = DuplicateDetector(self.db, mode=self.dedup_mode)
+        elif self.dd.mode != "off": # daemon mode: the articles other workers/tools stored since the previous cycle
+            self.dd.load_index()
+        dd = self.dd
+
+        # the fetches (request + text extraction) run in a thread pool, the cleaning, dedup and db writes stay in this thread.
+        # Without the adaptive controller there's 1 fetch at a time (with the sleep delay in between requests to the same site),
+        # with it every site gets as many parallel requests as the controller allows it
+        fetch_threads = self.fetch_threads if self.ws.controller else 1
+        in_flight = {} # future -> (url, domain)
+        renew_interval = self.queue.visibility_timeout / 3 # the leases of the running fetches are renewed this often, so no other worker leases them again
+        last_renewal = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=fetch_threads) as pool:
+
+            # lease jobs until nothing is due anymore. Jobs of another domain than the previous one are leased first, 
+            # so the sites take turns and we only need the sleep time delay when the same site is requested twice in a row
+            while True:
+
+                while not self.stop_requested.is_set() and len(in_flight) < fetch_threads:
+
+                    # in worker mode every worker only leases jobs from its own share of the domains
+                    my_domains = coordinator.claim_domains(self.queue.due_domains(), {domain for _, domain in in_flight.values()}) if coordinator else None
+
+                    # sites that already use all of their request slots are skipped until one of their fetches is done
+                    busy_domains = self._busy_domains(in_flight.values())
+                    if busy_domains:
+                        my_domains = [domain for domain in (my_domains if my_domains is not None else self.queue.due_domains()) if domain not in busy_domains]
+                        if not my_domains:
+                            break
+
+                    job = self.queue.lease(domains=my_domains)
+                    if job is None:
+                        break
+
+                    url, scraped_domain, _ = job
 
                     # matching filters for which web site we're trying to scrape
-                    scraped_domain = re.sub(r"^https://(www.)?|/.*", "", url)
-                    
-                    site = next(site for site in self.news_sites if re.sub(r"^https://|/.*", "", site["domain"]) == scraped_domain)
-                    
-                    div_filter = site["div_filter"]
-                    p_attr_exclusion = site["p_attr_exclusion"]
+                    site = self.sites_by_domain.get(scraped_domain)
 
-                    # Increment the scrape_retries count for the current URL in the scrape_que table
-                    sql.execute(self.db, f"UPDATE scrape_que SET scrape_retries = scrape_retries + 1 WHERE url='{url}';")
+                    if site is None: # the site has been removed from the config since the url was queued
+                        self.queue.complete(url)
+                        continue
 
-                    # check if the current domain is the same as the last one. [:14] slices a url like this: https://123456 where "123456" are all wildcard chars
-                    # also skip article url completely if we didn't get a proper article text
-                    try:
-                        if url.startswith(prev_url[:14]) and prev_url != "":
-                            article_text = self.ws.TextScraper(self.headers, url, div_filter, p_attr_exclusion, debug_mode, sleep=True)
-                        else:
-                            article_text = self.ws.TextScraper(self.headers, url, div_filter, p_attr_exclusion, debug_mode, sleep=False)
+                    future = pool.submit(self.ws.TextScraper, self.headers, url, site["div_filter"], site["p_attr_exclusion"], debug_mode, 
+                                         sleep=(scraped_domain == prev_domain), max_bytes=site.get("max_bytes"))
+                    in_flight[future] = (url, scraped_domain)
+                    prev_domain = scraped_domain
 
-                    except requests.exceptions.RequestException:
-                        urls_not_saved += 1
+                if not in_flight:
+                    # wait for the leader while it's still discovering new urls, or for domains that other workers might release
+                    if not self.stop_requested.is_set() and coordinator and (coordinator.discovery_running() or self.queue.due_count() > 0):
+                        time.sleep(5)
                         continue
-                   
-                    except ValueError as ve:
-                        # Log the failure and its reason to the database
-                        sql.execute(self.db, 
-                                    f"""INSERT INTO exclude_articles
-                                    (url, reason)
-                                    VALUES ('{url}', '{str(ve)}')""")
-                        
-                        # Remove the URL from the scrape_que
-                        sql.execute(self.db, f"DELETE FROM scrape_que WHERE url='{url}';")
+                    break
+
+                done, _ = wait(in_flight, timeout=renew_interval, return_when=FIRST_COMPLETED)
 
+                if time.monotonic() - last_renewal >= renew_interval:
+                    for future, (url, _) in in_flight.items():
+                        if future not in done:
+                            self.queue.renew(url)
+                    last_renewal = time.monotonic()
+
+                for future in done:
+                    url, scraped_domain = in_flight.pop(future)
+
+                    if self.store_article(url, scraped_domain, future, date, dd):
+                        curr_article_url_no += 1
+                        print(f"    Scraped URL ({curr_article_url_no}/{total_new_articles_count}): {url}")
+                    else:
                         urls_not_saved += 1
-                        continue
-                        
-                    # clean the article text from stopwords etc
-                    article_text_cleaned = self.tp.text_cleaner(article_text)
-
-                    # Save the cleaned article text directly to the database
-                    sql.execute(self.db, 
-                                f"""INSERT INTO articles
-                                (url, scrape_date, content)
-                                VALUES ('{url}', '{date}', '{article_text_cleaned}')""")
-                    
-                    # Remove the URL from the scrape_que
-                    sql.execute(self.db, f"DELETE FROM scrape_que WHERE url='{url}';")
-                    
-                    curr_article_url_no += 1
-                    prev_url = url
 
-                    print(f"    Scraped URL ({curr_article_url_no}/{total_new_articles_count}): {url}")
-                    
+        if self.ws.controller and debug_mode:
+            self.print_controller_state()
+
         return curr_article_url_no, urls_not_saved
 
 
-    def scrape_all_sites(self, pagin_amount: int = 1, debug_mode: bool = True, batch: bool = False):
+    def _busy_domains(self, in_flight_jobs) -> set:
+        """Domains whose running fetches already use all of their request slots."""
 
-        if self.full_scrape_needed(time_threshold_in_hours=1):
+        running = Counter(domain for _, domain in in_flight_jobs)
+        slots = self.ws.controller.slots if self.ws.controller else (lambda domain: 1)
 
-            print(f"    ________________________________________")
-            print(f"    Scraping sites (pgn level {pagin_amount}):")
-            print(f"    ‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾")
+        return {domain for domain, amount in running.items() if amount >= slots(domain)}
 
-            self.scrape_domains(pagin_amount, debug_mode)
+
+    def store_article(self, url: str, scraped_domain: str, fetch, date: str, dd: DuplicateDetector) -> bool:
+        """Stores the article text of a finished fetch (future of WebScraper.TextScraper). Returns False if the article wasn't stored."""
+
+        # skip article url completely if we didn't get a proper article text
+        try:
+            article_text = fetch.result()
+
+        except requests.exceptions.RequestException as e:
+            # reschedule the job with backoff (dead-lettered after too many attempts)
+            self.queue.fail(url, str(e))
+            return False
+       
+        except ValueError as ve:
+            # Log the failure and its reason to the database
+            self.exclude_article(url, scraped_domain, str(ve), getattr(ve, "code", "unknown"))
+            
+            # Remove the URL from the job queue
+            self.queue.complete(url)
+            return False
+            
+        # clean the article text from stopwords etc
+        with self.metrics.timer(scraped_domain, "clean"):
+            article_text_cleaned = self.tp.text_cleaner(article_text)
+
+        # skip storing the article if it's a near-duplicate of an already stored story (only in "drop" mode)
+        cluster_url = dd.check_article(url, article_text_cleaned)
+        if cluster_url and dd.mode == "drop":
+            self.exclude_article(url, scraped_domain, f"near-duplicate of: {cluster_url}", "near_duplicate")
+            self.queue.complete(url)
+            return False
+
+        # Save the cleaned article text directly to the database + remove the URL from the job queue
+        with self.metrics.timer(scraped_domain, "db_write"):
+            sql.execute(self.db, "INSERT INTO articles (url, scrape_date, content) VALUES (?, ?, ?);", (url, date, article_text_cleaned))
+            self.queue.complete(url)
+
+        return True
+
+
+    def exclude_article(self, url: str, scraped_domain: str, reason: str, reason_code: str):
+        """Stores why an article wasn't stored (+ the extraction config of its site at that time, for the revalidation)."""
+
+        site = self.sites_by_domain.get(scraped_domain)
+        sql.execute(self.db, "INSERT OR REPLACE INTO exclude_articles (url, reason, reason_code, domain, config_hash) VALUES (?, ?, ?, ?, ?);", 
+                    (url, reason, reason_code, scraped_domain, site["config_hash"] if site else None))
+
+
+    def print_controller_state(self):
+        """Prints the current pacing of every site by the adaptive controller."""
+
+        print()
+        print(f"    {'Domain':<28}{'Slots':>7}{'Delay':>8}{'p95':>8}{'Timeout':>9}{'Errors':>8}{'Requests':>10}")
+        for domain, state in sorted(self.ws.controller.snapshot().items()):
+            p95 = f"{state['p95']:.2f}s" if state["p95"] is not None else "-"
+            print(f"    {domain:<28}{state['concurrency']:>7.2f}{state['delay']:>7.2f}s{p95:>8}{state['timeout']:>8.1f}s{state['error_rate']:>8.0%}{state['requests']:>10,}")
+
+
+    def scrape_all_sites(self, pagin_amount: int = 1, debug_mode: bool = True, batch: bool = False):
+
+        # every run checks the feeds (conditional GETs), the listing pages are only crawled when the page scheduler says they're due
+        print(f"    ________________________________________")
+        print(f"    Scraping sites (pgn level {pagin_amount}):")
+        print(f"    ‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾")
+
+        self.scrape_domains(pagin_amount, debug_mode)
 
         print(f"    ________________________________________")
         print(f"    Scraping articles:")
         print(f"    ‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾")
         
-        curr_article_url_no, urls_not_saved = self.scrape_article_urls(debug_mode)
+        try:
+            curr_article_url_no, urls_not_saved = self.scrape_article_urls(debug_mode)
+        finally:
+            self.metrics.flush()
+            if self.ws.archive:
+                self.ws.archive.flush()
         
         print()
         print(f"    Successfully stored {curr_article_url_no} new article(s) in the database ({urls_not_saved} were omitted).")
 
         # if run from batch script - save the amount stored to a file
         if batch:
-            now = datetime.now()
-            scheduled_message = f"Successfully stored {curr_article_url_no} new article(s) in the database ({urls_not_saved} were omitted)."
-            scheduled_format = f"------------------\n{now.strftime('%Y-%m-%d %H:%M')}\n------------------\n{scheduled_message}\n\n"
-            with open("scheduled_scraper.txt", "a") as file:
-                    file.write(scheduled_format)
+            self.log_batch_result(curr_article_url_no, urls_not_saved)
 
 
-    def full_scrape_needed(self, time_threshold_in_hours=1) -> bool:
+    def scrape_worker(self, pagin_amount: int = 1, debug_mode: bool = False, batch: bool = False):
+        """Worker mode: several worker processes (or overlapping scheduled runs) share one scrape run. 
+        The leader discovers new article urls, and all workers split the job queue between them by domain."""
+
+        coordinator = RunCoordinator(self.db, self.queue.worker_id)
+        run_id, is_leader = coordinator.join_run()
+
+        print(f"    Worker {self.queue.worker_id} joined run '{run_id}' as {'leader' if is_leader else 'follower'}.")
+
+        try:
+            if is_leader:
+                self.scrape_domains(pagin_amount, debug_mode)
+                coordinator.discovery_done()
+
+            curr_article_url_no, urls_not_saved = self.scrape_article_urls(debug_mode, coordinator=coordinator)
+
+        finally:
+            coordinator.leave_run()
+            self.metrics.flush()
+            if self.ws.archive:
+                self.ws.archive.flush()
+
+        print()
+        print(f"    Successfully stored {curr_article_url_no} new article(s) in the database ({urls_not_saved} were omitted).")
+
+        if batch:
+            self.log_batch_result(curr_article_url_no, urls_not_saved, worker_id=self.queue.worker_id)
+
+
+    def log_batch_result(self, curr_article_url_no: int, urls_not_saved: int, worker_id: str = ""):
+        """Appends the result of a batch run to the scheduled scraper log file."""
+
+        now = datetime.now()
+        scheduled_message = f"Successfully stored {curr_article_url_no} new article(s) in the database ({urls_not_saved} were omitted)."
+        if worker_id:
+            scheduled_message += f" [worker {worker_id}]"
+        scheduled_format = f"------------------\n{now.strftime('%Y-%m-%d %H:%M')}\n------------------\n{scheduled_message}\n\n"
+        with open("scheduled_scraper.txt", "a") as file:
+                file.write(scheduled_format)
 
-        scrape_time_limit = datetime.now() - timedelta(hours=time_threshold_in_hours)
-        
-        # Fetch URLs and their scrape_time from the table
-        scrape_que = sql.execute(self.db, "SELECT url, scrape_time FROM scrape_que;")
-        
-        # If the table is empty, return True
-        if not scrape_que:
-            return True
-        
-        # Get the newest URL's time
-        newest_url_time = max(scrape_que, key=lambda x: datetime.strptime(x[1], "%Y-%m-%d %H:%M:%S"))[1]
-        newest_url_time = datetime.strptime(newest_url_time, "%Y-%m-%d %H:%M:%S")
-        
-        return newest_url_time < scrape_time_limit
-        
 
 if __name__ == "__main__":
 
@@ -0,0 +1,305 @@
+# Standard modules
+import os
+import re
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Third-party modules -> requirements.txt
+import requests
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+# DNS/connect times of the connection opened by the current request (requests only reports the time until the response headers)
+_connection_timings = threading.local()
+
+
+class _ConnectionTimingMixin():
+    """Times the DNS lookup and the connect (TCP + TLS handshake) of every new connection of the pool."""
+
+    def _new_conn(self):
+
+        start = time.perf_counter()
+        try:
+            # every resolved address once, in the order of the resolver (e.g. IPv6 first, then IPv4)
+            addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)))
+        except OSError: # let urllib3 raise its own (resolve) error
+            addresses = []
+        _connection_timings.dns = time.perf_counter() - start
+
+        if not addresses:
+            return super()._new_conn()
+
+        # connect to the resolved addresses one after the other (like urllib3's create_connection does), so the lookup isn't done twice
+        # and an unreachable address still falls back to the next one (the host name is still used for TLS/SNI)
+        dns_host = self._dns_host
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError):
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+
+
+    def connect(self):
+
+        start = time.perf_counter()
+        super().connect()
+        _connection_timings.connect = time.perf_counter() - start - (getattr(_connection_timings, "dns", None) or 0)
+
+
+class _TimedHTTPConnection(_ConnectionTimingMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_ConnectionTimingMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class ScrapeMetrics():
+    """Per-domain timings of every stage of the scrape pipeline, to see which site or stage is eating the scrape window.
+
+    Stages: "request" (every attempt, with its status code and size), "dns", "connect" (TCP + TLS, only for new connections),
+    "ttfb" (server wait until the response headers), "download" (response body), "parse_listing", "parse_article", "clean" and "db_write".
+
+    The measurements are buffered and stored in the 'scrape_metrics' table in batches, and kept as cumulative counters/histograms
+    which can be exposed in the Prometheus text format (a file for the node_exporter textfile collector, or a local HTTP endpoint)."""
+
+    time_format = "%Y-%m-%d %H:%M:%S"
+    histogram_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # seconds
+
+    def __init__(self, database: str = None, worker_id: str = None, flush_size: int = 500, prometheus_file: str = None, worker_label: str = None):
+
+        self.db = database # None = only the in-memory counters (e.g. for the benchmarks)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.worker_label = worker_label # (optional) stable "worker" label of the Prometheus series (e.g. the worker slot), default: the worker id
+        self.flush_size = flush_size # buffered measurements before they're written to the database
+        self.prometheus_file = prometheus_file # (optional) text file that gets rewritten on every flush
+
+        self._lock = threading.Lock() # the fetches can run in several threads
+        self._buffer = []
+        self._histograms = {} # (domain, stage) -> [bucket counts..., count, sum]
+        self._bytes = {} # domain -> downloaded bytes
+        self._responses = {} # (domain, status code) -> amount of responses (status code 0 = failed request)
+
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        return re.sub(r"^https?://(www.)?|/.*", "", url)
+
+
+    def instrument_session(self, session: requests.Session):
+        """Mounts the connection timing adapter on a requests session (for the DNS/connect timings)."""
+
+        adapter = _TimedHTTPAdapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+
+    def record(self, domain: str, stage: str, seconds: float, nbytes: int = None, status_code: int = None):
+        """Adds a single measurement."""
+
+        with self._lock:
+            self._buffer.append((datetime.now().strftime(self.time_format), self.worker_id, domain, stage, seconds, nbytes, status_code))
+
+            histogram = self._histograms.setdefault((domain, stage), [0] * (len(self.histogram_buckets) + 2))
+            for i, bucket in enumerate(self.histogram_buckets):
+                if seconds <= bucket:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+            if nbytes and stage == "request": # (the download stage repeats the size of the response)
+                self._bytes[domain] = self._bytes.get(domain, 0) + nbytes
+            if status_code is not None:
+                self._responses[(domain, status_code)] = self._responses.get((domain, status_code), 0) + 1
+
+            flush_needed = len(self._buffer) >= self.flush_size
+
+        if flush_needed:
+            self.flush()
+
+
+    @contextmanager
+    def timer(self, domain: str, stage: str):
+        """Times the code inside the "with" block (also when it raises an exception)."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(domain, stage, time.perf_counter() - start)
+
+
+    def start_request(self):
+        """Resets the connection timings of this thread, call it right before sending a request."""
+        _connection_timings.dns = None
+        _connection_timings.connect = None
+
+
+    def record_request(self, url: str, seconds: float, response: requests.Response = None):
+        """Records a request attempt (failed if 'response' is None) and the time breakdown of its response."""
+
+        domain = self.get_domain(url)
+
+        if response is None:
+            self.record(domain, "request", seconds, status_code=0)
+            return
+
+        nbytes = len(response.content)
+        self.record(domain, "request", seconds, nbytes, response.status_code)
+
+        # "elapsed" = from sending the request until the response headers were parsed (incl. the lookup + connect of a new connection)
+        headers_time = response.elapsed.total_seconds()
+        dns_time = getattr(_connection_timings, "dns", None)
+        connect_time = getattr(_connection_timings, "connect", None)
+
+        if dns_time is not None:
+            self.record(domain, "dns", dns_time)
+        if connect_time is not None:
+            self.record(domain, "connect", connect_time)
+        self.record(domain, "ttfb", max(0, headers_time - (dns_time or 0) - (connect_time or 0)))
+        self.record(domain, "download", max(0, seconds - headers_time), nbytes)
+
+
+    def flush(self):
+        """Writes the buffered measurements to the database (and rewrites the Prometheus file)."""
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+
+        if buffer and self.db:
+            sql.execute_many(self.db, """INSERT INTO scrape_metrics (recorded_at, worker_id, domain, stage, seconds, bytes, status_code)
+                                         VALUES (?, ?, ?, ?, ?, ?, ?);""", buffer)
+
+        if self.prometheus_file:
+            self.write_prometheus(self.prometheus_file)
+
+
+    def get_summary(self, hours: int = 24) -> list:
+        """Time spent per domain and stage during the last hours, most time consuming first.
+        Returns [(domain, stage, count, total seconds, avg seconds, max seconds, bytes)]."""
+
+        since = (datetime.now() - timedelta(hours=hours)).strftime(self.time_format)
+        return sql.execute(self.db, """SELECT domain, stage, count(*), sum(seconds), avg(seconds), max(seconds), sum(bytes)
+                                       FROM scrape_metrics
+                                       WHERE recorded_at >= ? AND stage != 'request'
+                                       GROUP BY domain, stage
+                                       ORDER BY sum(seconds) DESC;""", (since,))
+
+
+    def get_status_codes(self, hours: int = 24) -> list:
+        """Responses per domain and status code during the last hours (status code 0 = failed request). Returns [(domain, status code, count)]."""
+
+        since = (datetime.now() - timedelta(hours=hours)).strftime(self.time_format)
+        return sql.execute(self.db, """SELECT domain, status_code, count(*) FROM scrape_metrics
+                                       WHERE recorded_at >= ? AND stage = 'request'
+                                       GROUP BY domain, status_code
+                                       ORDER BY domain, status_code;""", (since,))
+
+
+    def print_summary(self, hours: int = 24, top_n: int = 20):
+
+        summary = self.get_summary(hours)
+        total_time = sum(row[3] for row in summary) or 1
+
+        print(f"\n    Scrape time per site and stage (last {hours} h):\n")
+        print(f"    {'Domain':<28}{'Stage':<15}{'Count':>8}{'Total':>11}{'Share':>8}{'Avg':>10}{'Max':>10}{'MB':>9}")
+        for domain, stage, count, total, avg, maximum, nbytes in summary[:top_n]:
+            print(f"    {domain:<28}{stage:<15}{count:>8,}{total:>10.1f}s{total / total_time:>8.1%}{avg * 1000:>8.0f}ms{maximum * 1000:>8.0f}ms{(nbytes or 0) / 1e6:>9.2f}")
+
+        status_codes = {}
+        for domain, status_code, count in self.get_status_codes(hours):
+            status_codes.setdefault(domain, []).append(f"{status_code or 'failed'}: {count:,}")
+
+        print(f"\n    Responses per site:\n")
+        for domain, codes in status_codes.items():
+            print(f"    {domain:<28}{', '.join(codes)}")
+
+
+    def prometheus_text(self) -> str:
+        """The cumulative counters/histograms of this process in the Prometheus text exposition format."""
+
+        # (the worker label keeps the series of several worker processes apart)
+        def labels(**label_values) -> str:
+            return ",".join(f'{key}="{value}"' for key, value in dict(worker=self.worker_label or self.worker_id, **label_values).items())
+
+        lines = ["# HELP scrape_stage_seconds Time spent per scrape stage.", "# TYPE scrape_stage_seconds histogram"]
+
+        with self._lock:
+            for (domain, stage), histogram in sorted(self._histograms.items()):
+                for bucket, count in zip(self.histogram_buckets, histogram):
+                    lines.append(f"scrape_stage_seconds_bucket{{{labels(domain=domain, stage=stage, le=bucket)}}} {count}")
+                lines.append(f"scrape_stage_seconds_bucket{{{labels(domain=domain, stage=stage, le='+Inf')}}} {histogram[-2]}")
+                lines.append(f"scrape_stage_seconds_sum{{{labels(domain=domain, stage=stage)}}} {histogram[-1]:.6f}")
+                lines.append(f"scrape_stage_seconds_count{{{labels(domain=domain, stage=stage)}}} {histogram[-2]}")
+
+            lines += ["# HELP scrape_response_bytes_total Downloaded bytes per site.", "# TYPE scrape_response_bytes_total counter"]
+            lines += [f"scrape_response_bytes_total{{{labels(domain=domain)}}} {nbytes}" for domain, nbytes in sorted(self._bytes.items())]
+
+            lines += ["# HELP scrape_responses_total Responses per site and status code (0 = failed request).", "# TYPE scrape_responses_total counter"]
+            lines += [f"scrape_responses_total{{{labels(domain=domain, status=status_code)}}} {count}"
+                      for (domain, status_code), count in sorted(self._responses.items())]
+
+        return "\n".join(lines) + "\n"
+
+
+    def write_prometheus(self, file_path: str):
+
+        # write to a temporary file first, so the collector never reads a half written file
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus_text())
+        os.replace(tmp_path, file_path)
+
+
+    def serve(self, port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves the metrics on http://host:port/metrics from a background thread. Returns the server (server.shutdown() stops it)."""
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # no request logging to the terminal
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return server
@@ -0,0 +1,322 @@
+# Standard modules
+import re
+import sys
+import time
+import zlib
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Custom made modules
+import data_init
+from benchmark import Benchmark
+
+
+class MockNewsServer():
+    """A local stand-in for the news sites of data_init.news_sites, for offline load and regression testing of the whole crawl.
+
+    The requested site is picked by the "Host" header (see WebScraper.upstream / data_init.upstream_override). Every configured page of a site
+    is a listing page with article links that pass the url filter of the site, and 'pages_per_section' pagination levels if the site has
+    a pagination filter. Every other path is an article page. The pages are the recorded fixtures of the benchmark (--record-fixtures)
+    or synthetic pages shaped like the site config.
+
+    Every site also has a robots.txt that points to a news sitemap (/sitemap-news.xml) and an RSS feed (/rss.xml), both listing the
+    articles of the first listing page of every section (with ETags, so conditional GETs get a 304). 'feeds' = False removes them.
+
+    Faults can be injected globally or per domain: latency (+ jitter), 429 responses (with Retry-After), 5xx responses and
+    hanging requests (timeouts)."""
+
+    fault_names = ("latency", "jitter", "rate_limit_rate", "error_rate", "timeout_rate", "hang_seconds")
+
+    def __init__(self, port: int = 8033, host: str = "127.0.0.1", fixtures_dir: str = "bench_fixtures/", use_recorded: bool = True,
+                 articles_per_page: int = 20, pages_per_section: int = 5, latency: float = 0.0, jitter: float = 0.0, rate_limit_rate: float = 0.0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, hang_seconds: float = 15.0, domain_faults: dict = None, seed: int = 33,
+                 article_padding: int = 0, feeds: bool = True):
+
+        self.host = host
+        self.port = port # 0 = any free port (see self.url after start())
+        self.articles_per_page = articles_per_page
+        self.pages_per_section = pages_per_section # pagination levels of every listing page (sites with a pagination filter)
+        self.use_recorded = use_recorded # serve the recorded pages of a site if there are any, otherwise synthetic ones
+        self.seed = seed
+        self.article_padding = int(article_padding) # bytes of reader comments appended after the article (bloated pages, live blogs)
+        self.feeds = feeds # serve robots.txt, the news sitemap and the RSS feed of every site
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0) # publication time of the newest story in the feeds
+
+        # the faults of every site, 'domain_faults' overrides them per domain, e.g. {"bbc.com": {"error_rate": 0.5}}
+        self.faults = {"latency": latency, "jitter": jitter, "rate_limit_rate": rate_limit_rate, "error_rate": error_rate,
+                       "timeout_rate": timeout_rate, "hang_seconds": hang_seconds}
+        self.domain_faults = domain_faults or {}
+
+        self.sites = {re.sub(r"^https://|/.*", "", site["domain"]): site for site in data_init.news_sites}
+        self.pages = Benchmark(fixtures_dir=fixtures_dir, seed=seed) # the recorded/synthetic page generator
+        self._recorded = {} # domain -> (listing html, [article html]) or None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {} # (domain, status code) -> amount of responses
+        self.server = None
+
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+    def _site_faults(self, domain: str) -> dict:
+        return {**self.faults, **self.domain_faults.get(domain, {})}
+
+
+    def _recorded_pages(self, site: dict) -> tuple:
+
+        domain = site["domain"]
+        if domain not in self._recorded:
+            listing, articles, recorded = self.pages.load_fixtures(site)
+            self._recorded[domain] = (listing, articles) if recorded and articles and self.use_recorded else None
+
+        return self._recorded[domain]
+
+
+    def _feed_links(self, site: dict) -> list:
+        """The absolute article urls on the first listing page of every section of a site, newest first."""
+
+        links = []
+        for page in site["pages"]:
+            listing = self.render(site["domain"], page, "")
+            for href in re.findall(r'href="([^"]+)"', listing):
+                link = href if href.startswith("http") else f"https://{site['domain']}{href}"
+                if re.search(site["url_filter"], href) and link not in links:
+                    links.append(link)
+
+        return links
+
+
+    def render_feed(self, domain: str, path: str) -> tuple:
+        """robots.txt, the news sitemap or the RSS feed of a site. Returns (content type, body) or None."""
+
+        site = self.sites.get(re.sub(r"^www\.", "", domain))
+        if site is None or not self.feeds:
+            return None
+
+        if path == "/robots.txt":
+            return "text/plain", f"User-agent: *\nDisallow: /search\n\nSitemap: https://{site['domain']}/sitemap-news.xml\n"
+
+        # every story is 10 minutes older than the one before it
+        entries = [(link, self.started_at - timedelta(minutes=10 * i)) for i, link in enumerate(self._feed_links(site))]
+
+        if path == "/sitemap-news.xml":
+            urls = "".join(f"<url><loc>{link}</loc><news:news><news:publication_date>{published.isoformat()}</news:publication_date></news:news></url>"
+                           for link, published in entries)
+            return "application/xml", ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                                       f'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">{urls}</urlset>')
+
+        if path == "/rss.xml":
+            items = "".join(f"<item><title>Story</title><link>{link}</link><pubDate>{format_datetime(published)}</pubDate></item>" for link, published in entries)
+            return "application/rss+xml", f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{domain}</title>{items}</channel></rss>'
+
+        return None
+
+
+    def render(self, domain: str, path: str, query: str) -> str:
+        """The HTML of a page of a site, or None if the site isn't configured."""
+
+        site = self.sites.get(re.sub(r"^www\.", "", domain))
+        if site is None:
+            return None
+
+        recorded = self._recorded_pages(site)
+        path = path.rstrip("/") or "/"
+
+        # listing pages (+ their pagination levels)
+        if path in [page.rstrip("/") or "/" for page in site["pages"]]:
+            if recorded:
+                return recorded[0]
+
+            page_no = int(parse_qs(query).get("page", ["1"])[0])
+            section = [page.rstrip("/") or "/" for page in site["pages"]].index(path)
+            next_page = f"?page={page_no + 1}" if page_no < self.pages_per_section else None
+            first_story = (section * 1000 + page_no - 1) * self.articles_per_page
+
+            return self.pages.synthetic_listing(site, first_story, self.articles_per_page, next_page)
+
+        # article pages (the same path always gets the same page)
+        path_seed = zlib.crc32(path.encode("utf-8"))
+        if recorded:
+            html = recorded[1][path_seed % len(recorded[1])]
+        else:
+            html = self.pages.synthetic_article(site, seed=path_seed)
+
+        if self.article_padding:
+            comment = "<p class='comment'>A reader comment below the article.</p>"
+            html = html.replace("</body>", f"<div class='comments'>{comment * (self.article_padding // len(comment))}</div></body>")
+
+        return html
+
+
+    def _fault(self, domain: str) -> tuple:
+        """Rolls the faults of a request. Returns (delay in seconds, fault: None, "rate_limit", "error" or "timeout")."""
+
+        faults = self._site_faults(re.sub(r"^www\.", "", domain))
+
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(faults["latency"], faults["jitter"])) if faults["latency"] or faults["jitter"] else 0.0
+            roll = self._rng.random()
+
+        if roll < faults["timeout_rate"]:
+            return faults["hang_seconds"], "timeout"
+        roll -= faults["timeout_rate"]
+        if roll < faults["rate_limit_rate"]:
+            return delay, "rate_limit"
+        roll -= faults["rate_limit_rate"]
+        if roll < faults["error_rate"]:
+            return delay, "error"
+
+        return delay, None
+
+
+    def _count(self, domain: str, status_code: int):
+        with self._lock:
+            self._stats[(domain, status_code)] = self._stats.get((domain, status_code), 0) + 1
+
+
+    def stats(self) -> dict:
+        """Responses per (domain, status code) since the server was started (status code 0 = hanging request)."""
+        with self._lock:
+            return dict(self._stats)
+
+
+    def start(self):
+        """Starts the server in a background thread."""
+
+        mock = self
+
+        class MockSiteHandler(BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1" # keep-alive, so the connection pooling of the scraper gets tested as well
+            disable_nagle_algorithm = True # the headers and the body are written separately
+
+            def _send(self, status_code: int, body: str, extra_headers: dict = None, content_type: str = "text/html"):
+                body = body.encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for header, value in (extra_headers or {}).items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+
+                domain = re.sub(r":\d+$", "", self.headers.get("Host", ""))
+                parts = urlsplit(self.path)
+                delay, fault = mock._fault(domain)
+                time.sleep(delay)
+
+                try:
+                    if fault == "timeout": # the client gave up already (usually)
+                        mock._count(domain, 0)
+                        self._send(504, "<html><body>Gateway Timeout</body></html>")
+                    elif fault == "rate_limit":
+                        mock._count(domain, 429)
+                        self._send(429, "<html><body>Too Many Requests</body></html>", {"Retry-After": "1"})
+                    elif fault == "error":
+                        status_code = mock._rng.choice([500, 502, 503])
+                        mock._count(domain, status_code)
+                        self._send(status_code, "<html><body>Server Error</body></html>")
+                    elif mock.render_feed(domain, parts.path) is not None:
+                        content_type, body = mock.render_feed(domain, parts.path)
+                        etag = f'"{zlib.crc32(body.encode("utf-8")):08x}"'
+                        if self.headers.get("If-None-Match") == etag: # conditional GET, nothing changed
+                            mock._count(domain, 304)
+                            self.send_response(304)
+                            self.send_header("ETag", etag)
+                            self.send_header("Content-Length", "0")
+                            self.end_headers()
+                        else:
+                            mock._count(domain, 200)
+                            self._send(200, body, {"ETag": etag}, content_type=content_type)
+                    else:
+                        html = mock.render(domain, parts.path, parts.query)
+                        status_code = 200 if html is not None else 404
+                        mock._count(domain, status_code)
+                        self._send(status_code, html if html is not None else "<html><body>Not Found</body></html>")
+
+                except (BrokenPipeError, ConnectionResetError): # the client closed the connection (timeout)
+                    pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError): # the client stopped reading (early abort of the download, timeout)
+                    pass
+
+            def log_message(self, format, *args): # no request logging to the terminal
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), MockSiteHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return self
+
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_class, exc, traceback):
+        self.stop()
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Local mock of the configured news sites (point the scraper at it with data_init.upstream_override).")
+    parser.add_argument("--port", type=int, default=8033, help="port to listen on (default: 8033)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--fixtures-dir", default="bench_fixtures/", help="directory of the recorded HTML pages (default: bench_fixtures/)")
+    parser.add_argument("--synthetic", action="store_true", help="always serve synthetic pages, even for sites with recorded pages")
+    parser.add_argument("--articles-per-page", type=int, default=20, help="article links per listing page (default: 20)")
+    parser.add_argument("--pages", type=int, default=5, help="pagination levels per listing page (default: 5)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response delay in seconds (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the response delay in seconds (default: 0)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429 (default: 0)")
+    parser.add_argument("--errors", type=float, default=0.0, help="share of requests answered with 500/502/503 (default: 0)")
+    parser.add_argument("--timeouts", type=float, default=0.0, help="share of requests that hang for --hang seconds (default: 0)")
+    parser.add_argument("--hang", type=float, default=15.0, help="seconds a hanging request takes (default: 15)")
+    parser.add_argument("--padding", type=int, default=0, help="bytes of reader comments appended to every article page (default: 0)")
+    parser.add_argument("--no-feeds", action="store_true", help="no robots.txt, news sitemaps and RSS feeds (only the HTML listing pages)")
+    args = parser.parse_args(argv)
+
+    server = MockNewsServer(port=args.port, host=args.host, fixtures_dir=args.fixtures_dir, use_recorded=not args.synthetic,
+                            articles_per_page=args.articles_per_page, pages_per_section=args.pages, latency=args.latency, jitter=args.jitter,
+                            rate_limit_rate=args.rate_limit, error_rate=args.errors, timeout_rate=args.timeouts, hang_seconds=args.hang,
+                            article_padding=args.padding, feeds=not args.no_feeds)
+    server.start()
+
+    print(f"    Serving {len(server.sites)} mock news sites on {server.url} (Ctrl+C to stop)")
+    print(f"    Set upstream_override = \"{server.url}\" in data_init.py to scrape them.")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+    for (domain, status_code), count in sorted(server.stats().items()):
+        print(f"    {domain:<28}{status_code or 'hang':>6}{count:>8,}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# Standard modules
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+
+
+class PageScheduler():
+    """Decides which listing pages (the "pages" of a site config) get crawled in a run, and how deep (pagination levels).
+
+    Every page learns how many new article urls per hour appear on it (an EWMA of the new urls of a crawl / the hours since its previous crawl,
+    kept in the 'page_schedule' table):
+    - the crawl interval of a page is the time it takes to collect 'target_yield' new urls, so a high-churn section (/world) is polled often
+      and a page that rarely has anything new only every few hours (within min/max_interval_minutes, at most halved/doubled per crawl).
+    - the depth grows by 1 level while a page yields at least 'deep_yield' new urls per level (the older pages of its pagination
+      probably have new articles too), and shrinks by 1 level when it yields fewer than 'shallow_yield' per level.
+
+    A page without any history is due right away with the full depth of the run."""
+
+    time_format = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, database: str, initial_interval_minutes: float = 60, min_interval_minutes: float = 15, max_interval_minutes: float = 24 * 60,
+                 target_yield: float = 5, deep_yield: float = 5, shallow_yield: float = 1, max_depth: int = 15, ewma_alpha: float = 0.3):
+
+        self.db = database
+        self.initial_interval_minutes = initial_interval_minutes # until a page has been crawled twice (the old global "full scrape needed" threshold)
+        self.min_interval_minutes = min_interval_minutes
+        self.max_interval_minutes = max_interval_minutes
+        self.target_yield = target_yield # new urls a page should have collected by its next crawl
+        self.deep_yield = deep_yield # new urls per pagination level at least -> 1 level deeper
+        self.shallow_yield = shallow_yield # new urls per pagination level at most -> 1 level shallower
+        self.max_depth = max_depth # the highest pagination level of the menu
+        self.ewma_alpha = ewma_alpha # weight of the newest crawl in the new urls per hour average
+
+
+    def _schedule(self, domain: str) -> dict:
+        """{page: (interval minutes, depth, new urls per hour, next due, last crawled)} of a site."""
+
+        rows = sql.execute(self.db, "SELECT page, interval_minutes, depth, yield_ewma, next_due, last_crawled FROM page_schedule WHERE domain = ?;", (domain,))
+        return {page: (interval, depth, yield_ewma, datetime.strptime(next_due, self.time_format), datetime.strptime(last_crawled, self.time_format))
+                for page, interval, depth, yield_ewma, next_due, last_crawled in rows}
+
+
+    def due_pages(self, domain: str, pages: list, max_depth: int, now: datetime = None) -> list:
+        """[(page, depth)] of the pages of a site that are due in this run. 'max_depth' = the pagination amount of the run."""
+
+        now = now or datetime.now()
+        schedule = self._schedule(domain)
+        due = []
+
+        for page in pages:
+            if page not in schedule:
+                due.append((page, max_depth))
+                continue
+
+            _, depth, _, next_due, _ = schedule[page]
+            if next_due <= now:
+                due.append((page, min(depth, max_depth)))
+
+        return due
+
+
+    def record(self, domain: str, page: str, depth: int, new_urls: int, paginated: bool = True, now: datetime = None):
+        """Updates the interval, depth and next due time of a page after it was crawled 'depth' levels deep and yielded 'new_urls'.
+        'paginated' = False for sites without a pagination filter (only the 1st level is ever crawled)."""
+
+        now = now or datetime.now()
+        previous = self._schedule(domain).get(page)
+
+        if previous is None:
+            # the 1st crawl of a page yields its whole backlog, not the urls of a known time span
+            interval, rate = self.initial_interval_minutes, None
+        else:
+            interval, _, rate, _, last_crawled = previous
+            hours = max((now - last_crawled).total_seconds() / 3600, 1 / 60)
+            rate = new_urls / hours if rate is None else self.ewma_alpha * new_urls / hours + (1 - self.ewma_alpha) * rate
+
+            # at most halved/doubled per crawl, so a single quiet or busy crawl doesn't park or hammer a page
+            target_interval = self.target_yield / max(rate, 1e-3) * 60
+            interval = min(interval * 2, max(interval / 2, target_interval))
+            interval = min(self.max_interval_minutes, max(self.min_interval_minutes, interval))
+
+        per_level = new_urls / max(1, depth)
+        if not paginated:
+            depth = 1
+        elif per_level >= self.deep_yield:
+            depth = min(self.max_depth, depth + 1)
+        elif per_level < self.shallow_yield:
+            depth = max(1, depth - 1)
+
+        sql.execute(self.db, """INSERT OR REPLACE INTO page_schedule (domain, page, interval_minutes, depth, yield_ewma, next_due, last_crawled, last_yield)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?);""",
+                    (domain, page, interval, depth, rate, (now + timedelta(minutes=interval)).strftime(self.time_format), now.strftime(self.time_format), new_urls))
+
+
+    def reset(self, domain: str = None):
+        """Forgets the learned schedule (of a single site), so all its pages are crawled in the next run."""
+        sql.execute(self.db, "DELETE FROM page_schedule WHERE (? IS NULL OR domain = ?);", (domain, domain))
+
+
+    def print_schedule(self, domain: str = None):
+
+        rows = sql.execute(self.db, """SELECT domain, page, interval_minutes, depth, yield_ewma, last_yield, next_due FROM page_schedule
+                                       WHERE (? IS NULL OR domain = ?) ORDER BY domain, next_due;""", (domain, domain))
+        if not rows:
+            print(f"    No listing pages crawled yet.")
+            return
+
+        print(f"    {'Domain':<24}{'Page':<24}{'Interval':>10}{'Depth':>7}{'New/h':>8}{'Last':>6}  Next due")
+        for row_domain, page, interval, depth, rate, last_yield, next_due in rows:
+            rate = f"{rate:.1f}" if rate is not None else "-"
+            print(f"    {row_domain:<24}{page:<24}{interval:>9.0f}m{depth:>7}{rate:>8}{last_yield:>6}  {next_due}")
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Show or reset the learned crawl schedule of the listing pages.")
+    parser.add_argument("--database", default="sql_data.db", help="database file (default: sql_data.db)")
+    parser.add_argument("--domain", help="only this site, e.g. bbc.com")
+    parser.add_argument("--reset", action="store_true", help="forget the schedule, all pages are crawled in the next run")
+    args = parser.parse_args(argv)
+
+    for query in data_init.db_tables:
+        sql.execute(args.database, query)
+
+    scheduler = PageScheduler(args.database)
+
+    if args.reset:
+        scheduler.reset(args.domain)
+        print(f"    The crawl schedule{' of ' + args.domain if args.domain else ''} was reset.")
+        return 0
+
+    scheduler.print_schedule(args.domain)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# Standard modules
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+import argparse
+import threading
+import statistics
+from datetime import datetime
+
+try:
+    import resource # not available on windows
+except ImportError:
+    resource = None
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes (None if it can't be read on this platform)."""
+
+    try:
+        with open("/proc/self/statm") as file: # linux
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if resource is not None: # peak of the whole process instead (macOS reports bytes, linux kilobytes)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+    return None
+
+
+class _RSSSampler():
+    """Samples the resident memory in a background thread while an operation runs, to get its peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_class, exc, traceback):
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+class _ProfiledProxy():
+    """Stands in for an ArticleStatistics/GraphManager instance: every public method call is profiled, everything else is passed through."""
+
+    def __init__(self, profiler, target, name: str):
+        object.__setattr__(self, "_profiler", profiler)
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str):
+
+        value = getattr(self._target, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+
+        def profiled_method(*args, **kwargs):
+            return self._profiler.run(f"{self._name}.{attr}", value, *args, rows_source=self._target, **kwargs)
+
+        return profiled_method
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._target, attr, value)
+
+
+class OperationProfiler():
+    """Opt-in profiling of the analytics operations (ArticleStatistics and GraphManager calls).
+
+    Every profiled operation records its wall time, CPU time, processed rows, peak resident memory and a cProfile dump
+    (profiles/<time>_<operation>.prof, open it with "python -m pstats" or snakeviz). The measurements are appended to a rolling
+    history (profiles/history.jsonl), so slowdowns show up as the corpus grows: "python3 profiler.py" prints the history."""
+
+    def __init__(self, profile_dir: str = "profiles/", cprofile: bool = True, history_size: int = 2000, top_n: int = 15, verbose: bool = True):
+
+        self.profile_dir = profile_dir
+        self.history_file = os.path.join(profile_dir, "history.jsonl")
+        self.cprofile = cprofile # False = only the timings/memory (cProfile slows down pure python code noticeably)
+        self.history_size = history_size # measurements kept in the history file (oldest dropped first)
+        self.top_n = top_n # functions shown in the printed cProfile summary
+        self.verbose = verbose
+
+
+    def wrap(self, target, name: str = None) -> _ProfiledProxy:
+        """Returns a proxy of 'target' whose public method calls are profiled."""
+        return _ProfiledProxy(self, target, name or type(target).__name__)
+
+
+    @staticmethod
+    def _count_rows(value) -> int:
+        try:
+            return len(value)
+        except TypeError:
+            return None
+
+
+    def run(self, operation: str, func, *args, rows_source=None, **kwargs):
+        """Runs func(*args, **kwargs) as a profiled operation and returns its result."""
+
+        # processed rows: the DataFrame that gets passed in (charts), otherwise the loaded articles of the statistics
+        rows_in = next((self._count_rows(arg) for arg in args if hasattr(arg, "shape")), None)
+        if rows_in is None and hasattr(rows_source, "df_articles"):
+            rows_in = len(rows_source.df_articles)
+
+        profile = cProfile.Profile() if self.cprofile else None
+
+        with _RSSSampler() as rss:
+            rss_before = rss.peak
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+            if profile:
+                profile.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profile:
+                    profile.disable()
+                wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        record = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "operation": operation,
+            "wall_s": round(wall_time, 4),
+            "cpu_s": round(cpu_time, 4),
+            "rows_in": rows_in,
+            "rows_out": self._count_rows(result),
+            "peak_rss_mb": round(rss.peak / 1e6, 1) if rss.peak is not None else None,
+            "rss_growth_mb": round((rss.peak - rss_before) / 1e6, 1) if rss.peak is not None and rss_before is not None else None,
+        }
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+        if profile:
+            record["profile"] = os.path.join(self.profile_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{operation}.prof")
+            profile.dump_stats(record["profile"])
+
+        self._append_history(record)
+
+        if self.verbose:
+            self.print_record(record, profile)
+
+        return result
+
+
+    def _append_history(self, record: dict):
+
+        history = self.history()
+        history.append(record)
+
+        # the cProfile dumps of the dropped measurements are removed as well
+        for dropped in history[:-self.history_size]:
+            if dropped.get("profile") and os.path.exists(dropped["profile"]):
+                os.remove(dropped["profile"])
+        history = history[-self.history_size:]
+
+        # write to a temporary file first, so an interrupted write never loses the history
+        tmp_path = f"{self.history_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(entry) + "\n" for entry in history)
+        os.replace(tmp_path, self.history_file)
+
+
+    def history(self, operation: str = None) -> list:
+        """The recorded measurements (of one operation), oldest first."""
+
+        if not os.path.exists(self.history_file):
+            return []
+
+        with open(self.history_file, encoding="utf-8") as file:
+            history = [json.loads(line) for line in file if line.strip()]
+
+        return [record for record in history if operation is None or record["operation"] == operation]
+
+
+    def print_record(self, record: dict, profile: cProfile.Profile = None):
+
+        rows = f"{record['rows_in']:,} rows" if record["rows_in"] is not None else "- rows"
+        memory = f"peak RSS {record['peak_rss_mb']:,.0f} MB (+{record['rss_growth_mb']:,.0f} MB)" if record["peak_rss_mb"] is not None else ""
+        print(f"    [profile] {record['operation']}: {record['wall_s']:.3f} s wall, {record['cpu_s']:.3f} s CPU, {rows}, {memory}")
+
+        # compared to the previous runs of the same operation, per processed row (the corpus grows between runs)
+        previous = [entry for entry in self.history(record["operation"])[:-1] if entry.get("rows_in")][-10:]
+        if previous and record["rows_in"]:
+            median_per_row = statistics.median(entry["wall_s"] / entry["rows_in"] for entry in previous)
+            change = (record["wall_s"] / record["rows_in"]) / median_per_row - 1 if median_per_row else 0
+            print(f"    [profile] {change:+.0%} time per row compared to the median of the last {len(previous)} run(s)")
+
+        if profile and self.top_n:
+            stats = pstats.Stats(profile, stream=sys.stdout)
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+
+
+    def print_history(self, operation: str = None, last: int = 10):
+        """Prints the last measurements of every operation (or of one operation)."""
+
+        history = self.history(operation)
+        operations = sorted({record["operation"] for record in history})
+
+        if not operations:
+            print(f"    No profiled operations in '{self.history_file}'.")
+            return
+
+        for name in operations:
+            print(f"\n    {name}:")
+            print(f"    {'Time':<21}{'Wall':>10}{'CPU':>10}{'Rows':>12}{'ms/1k rows':>12}{'Peak RSS':>12}")
+            for record in [record for record in history if record["operation"] == name][-last:]:
+                per_1k_rows = f"{record['wall_s'] * 1e6 / record['rows_in']:.1f}" if record.get("rows_in") else "-"
+                peak_rss = f"{record['peak_rss_mb']:,.0f} MB" if record.get("peak_rss_mb") is not None else "-"
+                rows = f"{record['rows_in']:,}" if record.get("rows_in") is not None else "-"
+                print(f"    {record['time']:<21}{record['wall_s']:>9.3f}s{record['cpu_s']:>9.3f}s{rows:>12}{per_1k_rows:>12}{peak_rss:>12}")
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Show the history of the profiled analytics operations.")
+    parser.add_argument("--operation", help="only show this operation, e.g. ArticleStatistics.get_top_kw")
+    parser.add_argument("--last", type=int, default=10, help="measurements per operation (default: 10)")
+    parser.add_argument("--profile-dir", default="profiles/", help="directory of the profiles and the history (default: profiles/)")
+    parser.add_argument("--stats", metavar="PROF_FILE", help="print the cProfile summary of a .prof dump instead")
+    parser.add_argument("--top-n", type=int, default=25, help="functions shown with --stats (default: 25)")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        pstats.Stats(args.stats, stream=sys.stdout).sort_stats("cumulative").print_stats(args.top_n)
+    else:
+        OperationProfiler(profile_dir=args.profile_dir).print_history(args.operation, args.last)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
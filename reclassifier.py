@@ -0,0 +1,151 @@
+# Standard modules
+import numpy as np
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+from corpus_store import CorpusStore
+from identifier_model import IdentifierModel
+
+
+class Reclassifier():
+    """Keeps the stored classification (category scores + main category of every article) up to date.
+
+    The first run classifies the whole archive. After that, only the new articles and the articles that contain an edited keyword
+    (found with the keyword -> articles posting lists of the corpus store) get rescored, so editing one keyword costs time
+    proportional to its hits instead of the corpus size. Keyword edits are logged by triggers in the 'identifier_changes' table."""
+
+    def __init__(self, database: str, mode: str = "hits", corpus: CorpusStore = None):
+
+        self.db = database
+        self.mode = mode # "hits" or "tfidf", see IdentifierModel.keyword_scores()
+        self.corpus = corpus # an opened corpus store (optional, otherwise it's updated + opened on sync)
+        self.batch_size = 500 # urls per "IN (...)" query
+        self.tfidf_refresh_share = 0.1 # TF-IDF mode: full reclassification (new idf for every article) once the archive has grown by this share
+
+        # (older databases get the classification tables + change triggers)
+        for query in data_init.db_tables:
+            sql.execute(self.db, query)
+
+
+    def _get_state(self) -> dict:
+        return dict(sql.execute(self.db, "SELECT key, value FROM app_meta WHERE key LIKE 'classification_%';"))
+
+
+    def _get_urls(self, rowids: np.ndarray) -> list:
+        """The urls of the given article rowids (same order)."""
+
+        urls = {}
+        rowids = [int(rowid) for rowid in rowids]
+        for i in range(0, len(rowids), self.batch_size):
+            batch = rowids[i:i + self.batch_size]
+            urls.update(sql.execute(self.db, f"SELECT rowid, url FROM articles WHERE rowid IN ({', '.join('?' for _ in batch)});", tuple(batch)))
+
+        return [urls.get(rowid) for rowid in rowids]
+
+
+    def _get_document_frequencies(self, model: IdentifierModel) -> np.ndarray:
+        """Amount of articles that contain each keyword of the model (from the 'keyword_stats' table)."""
+        stored = dict(sql.execute(self.db, "SELECT keyword, document_frequency FROM keyword_stats;"))
+        return np.array([stored.get(keyword, 0) for keyword in model.keywords], dtype=np.float64)
+
+
+    def sync(self) -> int:
+        """Brings the stored classification up to date. Returns the amount of (re)classified articles."""
+
+        if self.corpus is None:
+            self.corpus = CorpusStore(self.db)
+            self.corpus.update()
+            self.corpus.open()
+        self.corpus.update_postings()
+
+        model = IdentifierModel.load(self.db)
+        if not len(model.classification_order):
+            raise ValueError("There are no keywords to classify the articles with.")
+
+        state = self._get_state()
+        last_rowid = int(state.get("classification_last_rowid", -1)) # the newest article (rowid) that is classified
+        full_articles = int(state.get("classification_full_articles", 0)) # amount of articles at the last full classification
+        default_category = int(model.category_db_ids[model.classification_order[0]]) # category of the articles without any keyword hits
+
+        last_change_id = sql.execute(self.db, "SELECT max(id) FROM identifier_changes;")[0][0] or 0
+
+        # a full classification is needed the first time (also for the state of older versions, which counted corpus indexes),
+        # after a mode change, and in TF-IDF mode once the archive has grown by 'tfidf_refresh_share' since the last full run
+        # (the idf of every keyword depends on the amount of articles, in between the older scores keep their slightly older idf)
+        full_classification = state.get("classification_mode") != self.mode or last_rowid < 0 \
+                              or int(state.get("classification_default_category", -1)) != default_category \
+                              or (self.mode == "tfidf" and len(self.corpus) > full_articles * (1 + self.tfidf_refresh_share))
+
+        if full_classification:
+            affected_articles = np.arange(len(self.corpus))
+            keyword_matrix = model.keyword_matrix(self.corpus)
+
+            if self.mode == "tfidf":
+                document_frequency = np.bincount(keyword_matrix.indices, minlength=len(model.keywords))
+                with sql.SQLiteDBManager(self.db) as db:
+                    db.execute_query("DELETE FROM keyword_stats;")
+                    db.execute_many("INSERT INTO keyword_stats (keyword, document_frequency) VALUES (?, ?);",
+                                    [(keyword, int(count)) for keyword, count in zip(model.keywords, document_frequency)])
+
+        else:
+            changed_keywords = {row[0] for row in sql.execute(self.db, "SELECT DISTINCT keyword FROM identifier_changes WHERE id <= ?;", (last_change_id,))}
+
+            # the new articles (by rowid, so a rebuilt/reordered corpus store can't shift them) + every article that contains an added/deleted/changed keyword
+            new_articles = np.flatnonzero(self.corpus.rowids > last_rowid)
+            affected_parts = [new_articles]
+
+            if self.mode == "tfidf" and len(new_articles):
+                # the new articles add to the document frequency of the keywords they contain (the changed keywords are recounted below)
+                new_frequencies = np.bincount(model.keyword_matrix(self.corpus.subset(new_articles)).indices, minlength=len(model.keywords))
+                sql.execute_many(self.db, """INSERT INTO keyword_stats (keyword, document_frequency) VALUES (?, ?)
+                                             ON CONFLICT (keyword) DO UPDATE SET document_frequency = document_frequency + excluded.document_frequency;""",
+                                 [(model.keywords[keyword_id], int(count)) for keyword_id, count in enumerate(new_frequencies)
+                                  if count and model.keywords[keyword_id] not in changed_keywords])
+
+            for keyword in changed_keywords:
+                keyword_articles, _ = self.corpus.keyword_postings(keyword)
+                affected_parts.append(keyword_articles)
+
+                if self.mode == "tfidf":
+                    if keyword in model.keyword_ids:
+                        sql.execute(self.db, "INSERT OR REPLACE INTO keyword_stats (keyword, document_frequency) VALUES (?, ?);", (keyword, len(keyword_articles)))
+                    else:
+                        sql.execute(self.db, "DELETE FROM keyword_stats WHERE keyword = ?;", (keyword,))
+
+            affected_articles = np.unique(np.concatenate(affected_parts))
+            keyword_matrix = model.keyword_matrix(self.corpus.subset(affected_articles))
+
+        idf = None
+        if self.mode == "tfidf":
+            idf = np.log((1 + len(self.corpus)) / (1 + self._get_document_frequencies(model))) + 1
+
+        category_scores = (model.keyword_scores(keyword_matrix, self.mode, idf) @ model.category_matrix()).tocsr()
+        best_categories = model.best_categories(category_scores.toarray()) if len(affected_articles) else np.zeros(0, dtype=np.int32)
+
+        urls = self._get_urls(self.corpus.rowids[affected_articles])
+        category_scores = category_scores.tocoo()
+
+        # the scores/categories of the affected articles are replaced in a single transaction
+        with sql.SQLiteDBManager(self.db) as db:
+
+            if full_classification:
+                db.execute_query("DELETE FROM article_category_scores;")
+                db.execute_query("DELETE FROM article_classification;")
+            else:
+                db.execute_many("DELETE FROM article_category_scores WHERE url = ?;", [(url,) for url in urls])
+
+            db.execute_many("INSERT OR REPLACE INTO article_category_scores (url, category_id, score) VALUES (?, ?, ?);",
+                            [(urls[row], int(model.category_db_ids[col]), float(score))
+                             for row, col, score in zip(category_scores.row, category_scores.col, category_scores.data) if score])
+
+            db.execute_many("INSERT OR REPLACE INTO article_classification (url, category_id) VALUES (?, ?);",
+                            [(url, int(model.category_db_ids[category_id])) for url, category_id in zip(urls, best_categories)])
+
+            db.execute_query("DELETE FROM identifier_changes WHERE id <= ?;", (last_change_id,))
+            db.execute_many("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?);",
+                            [("classification_mode", self.mode), ("classification_last_rowid", int(self.corpus.rowids.max(initial=0))),
+                             ("classification_full_articles", len(self.corpus) if full_classification else full_articles),
+                             ("classification_default_category", default_category)])
+
+        return len(affected_articles)
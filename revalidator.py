@@ -0,0 +1,221 @@
+# Standard modules
+import re
+import sys
+import json
+import hashlib
+import argparse
+import logging
+
+# Third-party modules -> requirements.txt
+import requests
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+from scraper import WebScraper, ExtractionError
+from work_queue import WorkQueue
+
+
+# free-text reasons of older databases -> reason code
+legacy_reason_patterns = [
+    (r"^Requested <div> was not found", "div_not_found"),
+    (r"^The content of the requested <div> was empty", "div_empty"),
+    (r"too few paragraphs", "too_few_paragraphs"),
+    (r"^Rejected content type", "content_type"),
+    (r"^near-duplicate of:", "near_duplicate"),
+]
+
+
+def reason_code_of(reason: str) -> str:
+    """The reason code of a free-text exclusion reason."""
+
+    for pattern, code in legacy_reason_patterns:
+        if re.search(pattern, reason or ""):
+            return code
+
+    return "unknown"
+
+
+def extraction_config_hash(site: dict) -> str:
+    """Short hash of the extraction filters of a site config (compiled or not), to tell which exclusions happened with an older config."""
+
+    div_filter = getattr(site["div_filter"], "pattern", site["div_filter"])
+    return hashlib.blake2b(json.dumps([div_filter, list(site["p_attr_exclusion"])]).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class Revalidator():
+    """Gets excluded articles back after a site's extraction filters were fixed, without re-trying every excluded url.
+
+    Every exclusion stores a reason code (see ExtractionError.codes) and the hash of the site's div_filter/p_attr_exclusion at that time.
+    For every (domain, reason) group that was excluded with another config than the current one, a small random sample is
+    re-checked (from the HTML archive if the page is archived, otherwise fetched again). If most of the sample passes with the
+    current config, all urls of the group are re-queued at a low priority. Otherwise the group is marked as checked
+    with the current config, so it's only sampled again after the next config change."""
+
+    # reasons a changed div_filter/p_attr_exclusion can fix (a near-duplicate or a PDF stays one)
+    revalidated_codes = ("div_not_found", "div_empty", "too_few_paragraphs", "unknown")
+
+    def __init__(self, database: str, ws: WebScraper = None, archive=None, sample_size: int = 5, min_pass_share: float = 0.8, requeue_priority: int = -1):
+
+        self.db = database
+        self.ws = ws or WebScraper()
+        self.archive = archive # (optional) HTMLArchive, archived pages are re-checked without fetching them
+        self.headers = data_init.headers
+        self.sample_size = sample_size # urls re-checked per (domain, reason) group
+        self.min_pass_share = min_pass_share # share of the sample that has to pass for the whole group to be re-queued
+        self.requeue_priority = requeue_priority # below the default site priority (0), so the new articles are scraped first
+
+        self.sites = {WebScraper.get_domain(f"https://{site['domain']}"): site for site in data_init.news_sites}
+
+        self.migrate(self.db)
+
+
+    @staticmethod
+    def migrate(database: str):
+        """Adds the reason code, domain and config hash columns to the exclude_articles table of older databases,
+        and fills in the reason codes of the existing exclusions from their free-text reasons."""
+
+        columns = [column[1] for column in sql.execute(database, "PRAGMA table_info(exclude_articles);")]
+        if not columns:
+            return
+
+        new_columns = [column for column in ("reason_code", "domain", "config_hash") if column not in columns]
+        for column in new_columns:
+            sql.execute(database, f"ALTER TABLE exclude_articles ADD COLUMN {column} TEXT;")
+
+        if "reason_code" in new_columns:
+            rows = sql.execute(database, "SELECT url, reason FROM exclude_articles;")
+            sql.execute_many(database, "UPDATE exclude_articles SET reason_code = ?, domain = ? WHERE url = ?;",
+                             [(reason_code_of(reason), WebScraper.get_domain(url), url) for url, reason in rows])
+
+        sql.execute(database, "CREATE INDEX IF NOT EXISTS idx_exclude_articles_reason ON exclude_articles (domain, reason_code);")
+
+
+    def groups(self, domain: str = None, stale_only: bool = True) -> list:
+        """Excluded urls per (domain, reason code): [(domain, reason code, amount, excluded with an older config)]."""
+
+        rows = sql.execute(self.db, """SELECT domain, reason_code, config_hash, count(*) FROM exclude_articles
+                                       WHERE (? IS NULL OR domain = ?) GROUP BY domain, reason_code, config_hash;""", (domain, domain))
+
+        groups = {}
+        for group_domain, code, config_hash, amount in rows:
+            site = self.sites.get(group_domain)
+            stale = site is not None and config_hash != extraction_config_hash(site)
+            key = (group_domain, code)
+            previous_amount, previous_stale = groups.get(key, (0, False))
+            groups[key] = (previous_amount + amount, previous_stale or stale)
+
+        return [(group_domain, code, amount, stale) for (group_domain, code), (amount, stale) in sorted(groups.items())
+                if stale or not stale_only]
+
+
+    def _check_url(self, url: str, site: dict) -> bool:
+        """True if the url has a usable article text with the current config of its site, None if the page couldn't be fetched."""
+
+        html = self.archive.get(url) if self.archive else None
+
+        if html is None:
+            try:
+                html = self.ws._try_request(url, self.headers).text
+            except (requests.exceptions.RequestException, ExtractionError) as e:
+                logging.warning(f"Revalidation of {url} failed: {e}")
+                return None
+
+        try:
+            self.ws.extract_text(html, site["div_filter"], site["p_attr_exclusion"])
+            return True
+        except ExtractionError:
+            return False
+
+
+    def revalidate(self, domain: str = None, dry_run: bool = False) -> list:
+        """Samples every stale (domain, reason) group and re-queues the groups that pass.
+        Returns [(domain, reason code, excluded urls, sample passed, sample checked, re-queued urls)]."""
+
+        results = []
+
+        for group_domain, code, amount, _ in self.groups(domain):
+
+            if code not in self.revalidated_codes:
+                continue
+
+            site = self.sites[group_domain]
+            config_hash = extraction_config_hash(site)
+
+            # only the stale rows of the group (excluded with an older config), the others already failed with the current one
+            stale_rows = "domain = ? AND reason_code = ? AND config_hash IS NOT ?"
+            sample = [url for url, in sql.execute(self.db, f"SELECT url FROM exclude_articles WHERE {stale_rows} ORDER BY random() LIMIT ?;",
+                                                  (group_domain, code, config_hash, self.sample_size))]
+            checks = [check for check in (self._check_url(url, site) for url in sample) if check is not None]
+            passed = sum(checks)
+
+            requeued = 0
+            if checks and passed / len(checks) >= self.min_pass_share:
+                urls = [url for url, in sql.execute(self.db, f"SELECT url FROM exclude_articles WHERE {stale_rows};", (group_domain, code, config_hash))]
+                requeued = len(urls)
+
+                if not dry_run:
+                    WorkQueue(self.db).enqueue(urls, priority=self.requeue_priority)
+                    sql.execute(self.db, f"DELETE FROM exclude_articles WHERE {stale_rows};", (group_domain, code, config_hash))
+
+            elif checks and not dry_run:
+                # still broken with the current config -> only sampled again after the next config change
+                sql.execute(self.db, f"UPDATE exclude_articles SET config_hash = ? WHERE {stale_rows};", (config_hash, group_domain, code, config_hash))
+
+            results.append((group_domain, code, amount, passed, len(checks), requeued))
+
+        return results
+
+
+    def print_report(self, domain: str = None):
+        """Prints the excluded urls per domain and reason."""
+
+        groups = self.groups(domain, stale_only=False)
+        if not groups:
+            print(f"    No excluded articles.")
+            return
+
+        print(f"    {'Domain':<28}{'Reason':<22}{'Urls':>8}  Config")
+        for group_domain, code, amount, stale in groups:
+            config = ("changed since" if stale else "current") if code in self.revalidated_codes else "-"
+            print(f"    {group_domain:<28}{code:<22}{amount:>8,}  {config}")
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Re-check samples of the excluded articles with the current site configs and re-queue the groups that pass.")
+    parser.add_argument("--database", default="sql_data.db", help="database file (default: sql_data.db)")
+    parser.add_argument("--domain", help="only this site, e.g. bbc.com")
+    parser.add_argument("--sample-size", type=int, default=5, help="urls re-checked per site and reason (default: 5)")
+    parser.add_argument("--min-pass-share", type=float, default=0.8, help="share of the sample that has to pass (default: 0.8)")
+    parser.add_argument("--dry-run", action="store_true", help="only check the samples, don't re-queue anything")
+    parser.add_argument("--report", action="store_true", help="only show the excluded urls per site and reason")
+    args = parser.parse_args(argv)
+
+    for query in data_init.db_tables:
+        sql.execute(args.database, query)
+
+    from html_archive import HTMLArchive # archived pages are re-checked without fetching them
+    revalidator = Revalidator(args.database, archive=HTMLArchive(args.database), sample_size=args.sample_size, min_pass_share=args.min_pass_share)
+
+    if args.report:
+        revalidator.print_report(args.domain)
+        return 0
+
+    results = revalidator.revalidate(args.domain, dry_run=args.dry_run)
+    if not results:
+        print(f"    No excluded articles with an older site config.")
+        return 0
+
+    print(f"    {'Domain':<28}{'Reason':<22}{'Urls':>8}{'Sample':>10}{'Re-queued':>11}")
+    for group_domain, code, amount, passed, checked, requeued in results:
+        print(f"    {group_domain:<28}{code:<22}{amount:>8,}{f'{passed}/{checked}':>10}{requeued:>11,}")
+
+    if args.dry_run:
+        print(f"\n    Dry run, nothing was re-queued.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# Standard modules
+import math
+import threading
+from datetime import datetime, timedelta
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+class RunCoordinator():
+    """Coordinates several scraper worker processes on one machine with leases in the database (the SQLite database in WAL mode
+    can't be shared over a network filesystem, so all workers have to run on the machine that holds the database file).
+    The first worker of a run becomes the leader and does the url discovery, every worker then drains the job queue for its own share of the domains.
+    Workers that are started while a run is still active (overlapping scheduled runs) simply join that run."""
+
+    time_format = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, database: str, worker_id: str, lease_timeout: int = 120, heartbeat_interval: int = 30):
+
+        self.db = database
+        self.worker_id = worker_id
+        self.lease_timeout = lease_timeout # seconds without a heartbeat before a run/worker/domain lease counts as abandoned
+        self.heartbeat_interval = heartbeat_interval
+
+        self.run_id = None
+        self.is_leader = False
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = None
+
+
+    def _now(self, offset_seconds: int = 0) -> str:
+        return (datetime.now() + timedelta(seconds=offset_seconds)).strftime(self.time_format)
+
+
+    def join_run(self) -> tuple:
+        """Starts a new run as the leader, or joins the active run as a follower. Returns (run_id, is_leader)."""
+
+        now = self._now()
+        new_run_id = f"{now}|{self.worker_id}"
+
+        # a single upsert on the one-row lock table, so only one worker can take over an expired or finished run
+        sql.execute(self.db, """INSERT INTO scrape_run_lock (id, run_id, leader, phase, heartbeat)
+                                VALUES (1, ?, ?, 'discovering', ?)
+                                ON CONFLICT(id) DO UPDATE SET run_id = excluded.run_id, leader = excluded.leader,
+                                                              phase = excluded.phase, heartbeat = excluded.heartbeat
+                                WHERE scrape_run_lock.phase = 'finished' OR scrape_run_lock.heartbeat <= ?;""",
+                    (new_run_id, self.worker_id, now, self._now(-self.lease_timeout)))
+
+        self.run_id, leader = sql.execute(self.db, "SELECT run_id, leader FROM scrape_run_lock WHERE id = 1;")[0]
+        self.is_leader = leader == self.worker_id
+
+        sql.execute(self.db, "INSERT OR REPLACE INTO scrape_workers (worker_id, run_id, heartbeat) VALUES (?, ?, ?);", (self.worker_id, self.run_id, now))
+
+        self._start_heartbeat()
+
+        return self.run_id, self.is_leader
+
+
+    def _start_heartbeat(self):
+
+        def beat():
+            while not self._stop_heartbeat.wait(self.heartbeat_interval):
+                self.heartbeat()
+
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=beat, daemon=True)
+        self._heartbeat_thread.start()
+
+
+    def heartbeat(self):
+        """Renews the leases of this worker and the run lock. Every worker of the run renews the lock, so a run whose leader
+        is done but whose followers are still draining the queue is joined by the next scheduled worker instead of started over."""
+
+        now = self._now()
+        sql.execute(self.db, "UPDATE scrape_workers SET heartbeat = ? WHERE worker_id = ?;", (now, self.worker_id))
+        sql.execute(self.db, "UPDATE domain_leases SET lease_expires = ? WHERE worker_id = ?;", (self._now(self.lease_timeout), self.worker_id))
+        sql.execute(self.db, "UPDATE scrape_run_lock SET heartbeat = ? WHERE id = 1 AND run_id = ? AND phase != 'finished';", (now, self.run_id))
+
+
+    def discovery_done(self):
+        """Called by the leader when all new article urls have been queued."""
+        sql.execute(self.db, "UPDATE scrape_run_lock SET phase = 'draining' WHERE id = 1 AND run_id = ?;", (self.run_id,))
+
+
+    def discovery_running(self) -> bool:
+        """True while the leader of the run is still alive (its own worker heartbeat, the lock is renewed by all workers) and discovering new article urls."""
+        return bool(sql.execute(self.db, """SELECT 1 FROM scrape_run_lock run_lock
+                                            JOIN scrape_workers worker ON worker.worker_id = run_lock.leader AND worker.run_id = run_lock.run_id
+                                            WHERE run_lock.id = 1 AND run_lock.run_id = ? AND run_lock.phase = 'discovering' AND worker.heartbeat > ?;""",
+                                (self.run_id, self._now(-self.lease_timeout))))
+
+
+    def claim_domains(self, due_domains: list, working_domains: set = ()) -> list:
+        """Claims this worker's fair share of the domains that have due jobs and returns the domains it currently owns.
+        Domains without due jobs are released, and domains of workers that stopped sending heartbeats can be taken over.
+        Domains above the fair share (more workers joined the run) are released too, the ones without fetches of this worker
+        in progress ('working_domains') first."""
+
+        now = self._now()
+        active_workers = sql.execute(self.db, "SELECT count(*) FROM scrape_workers WHERE run_id = ? AND heartbeat > ?;",
+                                     (self.run_id, self._now(-self.lease_timeout)))[0][0]
+
+        my_domains = [row[0] for row in sql.execute(self.db, "SELECT domain FROM domain_leases WHERE worker_id = ?;", (self.worker_id,))]
+
+        # release the drained domains
+        for domain in my_domains:
+            if domain not in due_domains:
+                sql.execute(self.db, "DELETE FROM domain_leases WHERE domain = ? AND worker_id = ?;", (domain, self.worker_id))
+        my_domains = [domain for domain in my_domains if domain in due_domains]
+
+        fair_share = math.ceil(len(due_domains) / max(active_workers, 1))
+
+        # release the surplus domains, so a worker that joined the run later gets its share right away instead of after the lease timeout
+        if len(my_domains) > fair_share:
+            my_domains.sort(key=lambda domain: domain in working_domains, reverse=True)
+            for domain in my_domains[fair_share:]:
+                sql.execute(self.db, "DELETE FROM domain_leases WHERE domain = ? AND worker_id = ?;", (domain, self.worker_id))
+            my_domains = my_domains[:fair_share]
+
+        for domain in due_domains:
+            if len(my_domains) >= fair_share:
+                break
+            if domain in my_domains:
+                continue
+
+            # the upsert only takes over leases that are expired, so two workers can't own the same domain
+            sql.execute(self.db, """INSERT INTO domain_leases (domain, worker_id, lease_expires) VALUES (?, ?, ?)
+                                    ON CONFLICT(domain) DO UPDATE SET worker_id = excluded.worker_id, lease_expires = excluded.lease_expires
+                                    WHERE domain_leases.lease_expires <= ?;""", (domain, self.worker_id, self._now(self.lease_timeout), now))
+
+            owner = sql.execute(self.db, "SELECT worker_id FROM domain_leases WHERE domain = ?;", (domain,))
+            if owner and owner[0][0] == self.worker_id:
+                my_domains.append(domain)
+
+        return my_domains
+
+
+    def leave_run(self):
+        """Releases the leases of this worker. The last active worker marks the run as finished."""
+
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join()
+
+        sql.execute(self.db, "DELETE FROM domain_leases WHERE worker_id = ?;", (self.worker_id,))
+        sql.execute(self.db, "DELETE FROM scrape_workers WHERE worker_id = ?;", (self.worker_id,))
+
+        other_workers = sql.execute(self.db, "SELECT count(*) FROM scrape_workers WHERE run_id = ? AND heartbeat > ?;",
+                                    (self.run_id, self._now(-self.lease_timeout)))[0][0]
+
+        # (a leader leaving during the discovery means it failed, so the next run can start over right away)
+        if other_workers == 0 and (self.is_leader or not self.discovery_running()):
+            sql.execute(self.db, "UPDATE scrape_run_lock SET phase = 'finished' WHERE id = 1 AND run_id = ?;", (self.run_id,))
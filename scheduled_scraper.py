@@ -1,13 +1,111 @@
 # Standard modules
+import os
+import sys
+import socket
 import logging
+import argparse
+import subprocess
+from multiprocessing import Process
 
 # Custom made modules
 from main import NewsScraper
 
 
-if __name__ == "__main__":
+def setup_logging():
     logging_format = f"------------------\n%(asctime)s\n------------------\n%(message)s\n" # changing the logging format
     logging.basicConfig(filename="scraper_log.txt", level=logging.INFO, format=logging_format, datefmt="%Y-%m-%d %H:%M") # changing the logging format
 
+
+def run_worker(pagin_amount: int, metrics_file: str = None, archive_html: bool = False, slot: int = 0):
+    setup_logging()
+
     ns = NewsScraper()
-    ns.scrape_all_sites(pagin_amount=5, debug_mode=False, batch=True)
\ No newline at end of file
+    ns.metrics.prometheus_file = metrics_file_path(metrics_file, slot)
+    ns.metrics.worker_label = f"{socket.gethostname()}:{slot}"
+    ns.archive_html = archive_html
+    ns.scrape_worker(pagin_amount=pagin_amount, debug_mode=False, batch=True)
+
+
+def metrics_file_path(metrics_file: str, slot: int = 0) -> str:
+    """Every worker slot writes its own Prometheus file (the textfile collector reads all *.prom files of a directory).
+    The name only depends on the slot, so the next scheduled run overwrites the files of the previous one instead of leaving stale series behind."""
+
+    if not metrics_file:
+        return None
+
+    root, ext = os.path.splitext(metrics_file)
+    return f"{root}_{slot}{ext or '.prom'}"
+
+
+def profile_imports(modules: list, top_n: int = 10) -> float:
+    """Imports the modules in a fresh interpreter with "-X importtime" and prints the total + the slowest imports. Returns the total in seconds."""
+
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    # importtime lines look like: "import time: self [us] | cumulative [us] | <2 spaces per nesting level>package"
+    total = 0
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        seconds = int(cumulative) / 1_000_000
+        if not name[1:].startswith(" "): # top level import (the nested ones are part of its cumulative time)
+            total += seconds
+        if name.strip() not in modules:
+            timings.append((seconds, name.strip()))
+
+    print(f"\n    {', '.join(modules)}: {total:.3f} s")
+    for seconds, name in sorted(timings, reverse=True)[:top_n]:
+        print(f"    {seconds:8.3f} s  {name}")
+
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduled (batch) run of the news scraper.")
+    parser.add_argument("--workers", type=int, default=1, help="amount of worker processes that share the scrape run (default: 1)")
+    parser.add_argument("--pagin-amount", type=int, default=5, help="pagination level for the url discovery (default: 5)")
+    parser.add_argument("--daemon", action="store_true", help="keep running and scrape every --interval minutes instead of a single run")
+    parser.add_argument("--interval", type=int, default=60, help="minutes between the scrape cycles in daemon mode (default: 60)")
+    parser.add_argument("--metrics-file", help="write the scrape metrics in the Prometheus text format to this file (1 file per worker slot: <name>_<slot>.prom, e.g. for the node_exporter textfile collector)")
+    parser.add_argument("--metrics-port", type=int, help="serve the scrape metrics on http://127.0.0.1:PORT/metrics (daemon mode)")
+    parser.add_argument("--archive-html", action="store_true", help="keep the raw HTML of every article page, for re-extraction without refetching (html_archive.py)")
+    parser.add_argument("--metrics-report", type=int, metavar="HOURS", help="show the scrape time per site and stage of the last HOURS, then exit")
+    parser.add_argument("--profile-imports", action="store_true", help="show the import (startup) time of the scraper compared to the analytics modules, then exit")
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        scraper_time = profile_imports(["main"])
+        analytics_time = profile_imports(["main", "article_statistics", "graph_mgr", "country_names"])
+        print(f"\n    The scraper entry point skips {analytics_time - scraper_time:.3f} s of analytics/plotting imports.")
+        sys.exit()
+
+    if args.metrics_report:
+        from metrics import ScrapeMetrics
+        NewsScraper() # (creates the metrics table in older databases)
+        ScrapeMetrics("sql_data.db").print_summary(hours=args.metrics_report)
+        sys.exit()
+
+    # every worker joins the same run - the 1st one becomes the leader which discovers the new article urls.
+    # a scheduled run that starts while the previous one is still active joins it instead of duplicating the work
+    if args.daemon:
+        from scrape_daemon import ScrapeDaemon
+        setup_logging()
+        daemon = ScrapeDaemon(interval_minutes=args.interval, pagin_amount=args.pagin_amount)
+        daemon.ns.metrics.prometheus_file = metrics_file_path(args.metrics_file)
+        daemon.ns.metrics.worker_label = f"{socket.gethostname()}:0"
+        daemon.ns.archive_html = args.archive_html
+        if args.metrics_port:
+            daemon.ns.metrics.serve(port=args.metrics_port)
+        daemon.run()
+
+    elif args.workers > 1:
+        processes = [Process(target=run_worker, args=(args.pagin_amount, args.metrics_file, args.archive_html, slot)) for slot in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    else:
+        run_worker(args.pagin_amount, args.metrics_file, args.archive_html)
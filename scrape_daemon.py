@@ -0,0 +1,85 @@
+# Standard modules
+import time
+import signal
+import logging
+import importlib
+from datetime import datetime
+
+# Custom made modules
+import data_init
+from main import NewsScraper
+
+
+class ScrapeDaemon():
+    """Long-running scraper with an internal scheduler. The NewsScraper instance (HTTP session, compiled site profiles,
+    seen-url cache and near-duplicate index) stays warm between the scrape cycles instead of being rebuilt on every cron run.
+
+    Signals: SIGTERM/SIGINT = graceful shutdown (after the current article), SIGHUP = reload the site configs from data_init before the next cycle."""
+
+    def __init__(self, interval_minutes: int = 60, pagin_amount: int = 5):
+
+        self.interval = interval_minutes * 60 # seconds between the start of each scrape cycle
+        self.pagin_amount = pagin_amount
+        self.ns = NewsScraper()
+        self.reload_requested = False
+
+
+    def install_signal_handlers(self):
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        if hasattr(signal, "SIGHUP"): # not available on windows
+            signal.signal(signal.SIGHUP, self._handle_reload)
+
+
+    def _handle_stop(self, signum, frame):
+        logging.info(f"Scrape daemon received signal {signum}, shutting down after the current article.")
+        self.stop()
+
+
+    def _handle_reload(self, signum, frame):
+        self.reload_requested = True
+
+
+    def stop(self):
+        self.ns.stop_requested.set() # also wakes up the scheduler if it's waiting for the next cycle
+
+
+    def reload(self):
+        """Reloads the site configs and request headers from data_init, without restarting the process."""
+
+        importlib.reload(data_init)
+        self.ns.news_sites = data_init.news_sites
+        self.ns.headers = data_init.headers
+        self.ns.ws.upstream = data_init.upstream_override
+        self.ns.sites_by_domain = self.ns.compile_site_profiles(self.ns.news_sites)
+        self.reload_requested = False
+
+        logging.info(f"Scrape daemon reloaded the site configs ({len(self.ns.news_sites)} sites).")
+
+
+    def run(self):
+        """Runs a scrape cycle every interval until the daemon is stopped."""
+
+        self.install_signal_handlers()
+        logging.info(f"Scrape daemon started (interval: {self.interval // 60} min).")
+
+        while not self.ns.stop_requested.is_set():
+
+            if self.reload_requested:
+                self.reload()
+
+            cycle_start = time.monotonic()
+            print(f"    {datetime.now().strftime('%Y-%m-%d %H:%M')} - Starting scrape cycle..")
+
+            try:
+                self.ns.scrape_worker(pagin_amount=self.pagin_amount, debug_mode=False, batch=True)
+            except Exception as e:
+                logging.error(f"Scrape daemon cycle failed: {e}")
+
+            # sleep until the next cycle is due - wakes up right away if the daemon gets stopped
+            time_to_next_cycle = max(0, self.interval - (time.monotonic() - cycle_start))
+            self.ns.stop_requested.wait(time_to_next_cycle)
+
+        logging.info("Scrape daemon stopped.")
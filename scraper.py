@@ -3,11 +3,66 @@ import re
 import random as rd
 import time
 import logging
+from contextlib import nullcontext
+from urllib.parse import urlsplit
 from tqdm import tqdm
 
 # Third-party modules -> requirements.txt
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
+
+
+class ExtractionError(ValueError):
+    """An article page without a usable article text. 'code' is the structured reason (stored as exclude_articles.reason_code)."""
+
+    codes = {
+        "div_not_found": "the content container (div_filter) isn't on the page",
+        "div_empty": "the content container is empty",
+        "too_few_paragraphs": "the content container has less than 7 paragraphs",
+        "content_type": "the page isn't HTML",
+        "near_duplicate": "near-duplicate of a stored article",
+        "unknown": "other/unrecognized reason",
+    }
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class ContainerWatcher():
+    """Incremental parse of a streamed article page (lxml's pull parser), to stop the download once the content container is complete.
+
+    The container is the first <div> with a class matching 'div_filter', the same element that WebScraper.extract_text() picks first.
+    Pages that only have the <article>/id fallbacks of extract_text() are read to the end."""
+
+    def __init__(self, div_filter: str):
+        self.div_filter = re.compile(div_filter)
+        self.parser = etree.HTMLPullParser(events=("start", "end"))
+        self.container = None # the element of the container, once it's opened
+        self.closed = False
+
+    def _matches(self, element) -> bool:
+        classes = element.get("class") or ""
+        # like BeautifulSoup's class_=re.compile(): any single class or the whole class attribute
+        return any(self.div_filter.search(value) for value in classes.split() + [classes])
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parses the next chunk of the page. Returns True once the container has been closed."""
+
+        if self.closed:
+            return True
+
+        self.parser.feed(chunk)
+
+        for event, element in self.parser.read_events():
+            if event == "start" and self.container is None and element.tag == "div" and self._matches(element):
+                self.container = element
+            elif event == "end" and element is self.container:
+                self.closed = True
+                break
+
+        return self.closed
 
 
 class WebScraper():
@@ -18,23 +73,181 @@ class WebScraper():
     custom_retry_bar = "    Retrying URL: [{bar:30}] {percentage:3.0f}%  "
     custom_bar = "    [{bar:30}] {percentage:3.0f}%  "
 
+    def __init__(self, metrics=None, upstream: str = None):
+
+        # a Session keeps the connections to the sites alive (connection pooling), so following requests to the same site skip the TCP/TLS handshake
+        self.session = requests.Session()
+
+        # (optional) ScrapeMetrics instance that records the request/parse timings per domain
+        self.metrics = metrics
+        if self.metrics:
+            self.metrics.instrument_session(self.session)
+
+        # (optional) e.g. "http://127.0.0.1:8033" sends every request to a local mock server (mock_news_server.py) instead of the real sites.
+        # The path stays the same and the original host goes into the "Host" header, so the server knows which site is requested
+        self.upstream = upstream
+        self.sleep_range = (1, 3) # seconds of delay in between requests to the same site
+        self.retry_delay = 5 # seconds before the 1st retry of a failed request (doubled for every following attempt)
+        self.timeout = 10 # seconds before a request that hangs counts as failed
+
+        # the responses are streamed: non-HTML responses are rejected by their headers, the download stops after 'max_bytes' (decoded bytes,
+        # override per site with "max_bytes" in data_init.news_sites) and article pages stop once their content container is complete
+        self.max_bytes = 3_000_000
+        self.chunk_size = 16 * 1024
+        self.allowed_content_types = ("text/html", "application/xhtml+xml")
+
+        # (optional) HTMLArchive instance that keeps the raw HTML of every article page, for re-extraction without refetching
+        self.archive = None
+
+        # (optional) AdaptiveController instance that paces the requests per site (parallel requests, delay, timeout) from their observed latency/errors
+        self.controller = None
+
+    def _upstream_request(self, url: str, headers: dict) -> tuple:
+        """Rewrites a site url to the upstream override (if set). Returns (request url, request headers)."""
+
+        if not self.upstream:
+            return url, headers
+
+        parts = urlsplit(url)
+        request_url = f"{self.upstream.rstrip('/')}{parts.path or '/'}{'?' + parts.query if parts.query else ''}"
+
+        return request_url, {**headers, "Host": parts.netloc}
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        return re.sub(r"^https?://(www.)?|/.*", "", url)
+
+    def _timer(self, url: str, stage: str):
+        """Times a stage of the given url/domain if metrics are enabled."""
+        return self.metrics.timer(self.metrics.get_domain(url), stage) if self.metrics else nullcontext()
+
     def scrape_sleep(self):
-        
-        time.sleep(rd.randint(1,3)) # adding some delay on purpose in between requests so we minimize the chance of being banned by the site
+
+        if self.controller: # the adaptive controller paces the requests of every site on its own
+            return
+
+        time.sleep(rd.randint(*self.sleep_range)) # adding some delay on purpose in between requests so we minimize the chance of being banned by the site
+
+
+    def _send_request(self, url: str, headers: dict, timeout: float = None, max_bytes: int = None, div_filter: str = None,
+                      content_types: tuple = None) -> requests.Response:
+        """A single GET request (no retries). The response body is streamed (see _read_body), 'div_filter' stops the download
+        once the article container is complete. With the adaptive controller it waits for a free request slot of the site,
+        uses the timeout derived from the site's latency, and reports the outcome back to the controller.
+        Raises ExtractionError if a page isn't HTML."""
+
+        domain = self.get_domain(url)
+        if timeout is None:
+            timeout = self.controller.timeout(domain) if self.controller else self.timeout
+
+        with self.controller.slot(domain) if self.controller else nullcontext():
+
+            request_start = time.perf_counter()
+            if self.metrics:
+                self.metrics.start_request()
+
+            try:
+                # Adding a timeout to the request to prevent it from hanging indefinitely
+                request_url, request_headers = self._upstream_request(url, headers)
+                response = self.session.get(request_url, headers=request_headers, timeout=timeout, stream=True)
+
+                with response: # releases the connection (back to the pool if the body was read completely)
+                    if response.status_code == 200:
+                        self._check_content_type(response, content_types)
+                        self._read_body(response, max_bytes, div_filter)
+                    else:
+                        self._read_body(response, max_bytes)
+
+            except requests.exceptions.RequestException:
+                if self.metrics:
+                    self.metrics.record_request(url, time.perf_counter() - request_start)
+                if self.controller:
+                    self.controller.record(domain, success=False)
+                raise
+
+            except ExtractionError: # rejected content type (the site itself answered fine)
+                if self.metrics:
+                    self.metrics.record_request(url, time.perf_counter() - request_start, response)
+                if self.controller:
+                    self.controller.record(domain, time.perf_counter() - request_start)
+                raise
+
+        latency = time.perf_counter() - request_start
+        if self.metrics:
+            self.metrics.record_request(url, latency, response)
+        if self.controller: # rate limiting (429) and server errors (5xx) mean the site is overloaded
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            self.controller.record(domain, latency, success=not overloaded, retry_after=self._retry_after(response))
+
+        return response
+
+
+    def _check_content_type(self, response: requests.Response, content_types: tuple = None):
+        """Rejects a response by its headers, before its body is downloaded (PDFs, images, videos etc behind an article url)."""
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+        if content_type and content_type not in (content_types or self.allowed_content_types):
+            raise ExtractionError("content_type", f"Rejected content type: {content_type}.")
+
+
+    def _read_body(self, response: requests.Response, max_bytes: int = None, div_filter: str = None):
+        """Downloads the body of a streamed response in chunks, so 'response.content'/'response.text' work as usual afterwards.
+        Stops after 'max_bytes' (the page is cut off there), or once the container matching 'div_filter' is complete."""
+
+        max_bytes = max_bytes or self.max_bytes
+        watcher = ContainerWatcher(div_filter) if div_filter else None
+        chunks = []
+        nbytes = 0
+
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            chunks.append(chunk)
+            nbytes += len(chunk)
+
+            if nbytes >= max_bytes:
+                logging.warning(f"URL: {response.url} is larger than {max_bytes:,} bytes, the rest of the page was skipped")
+                break
+
+            # the rest of the page (comments, related stories, scripts..) isn't needed for the article text
+            if watcher and watcher.feed(chunk):
+                break
+
+        response._content = b"".join(chunks)[:max_bytes]
+
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """The "Retry-After" header in seconds (None if it's missing or a date)."""
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
+
+    def _retry_wait(self, url: str, attempt: int, delay: float, response: requests.Response = None) -> float:
+        """Seconds to wait before the next attempt: the backoff of the adaptive controller, or the fixed delay doubled with each retry."""
+
+        if self.controller:
+            return self.controller.backoff(self.get_domain(url), attempt - 1, self._retry_after(response) if response is not None else None)
+
+        return delay * (2 ** (attempt - 1))
 
 
     # Attempts to fetch a URL via HTTP GET, retrying on failure or non-200 status.
     # Logs warnings for each retry and an error if all retries fail.
-    def _try_request(self, url: str, headers: dict, max_retries: int = 3, delay: int = 5, timeout: int = 10) -> requests.Response:
+    def _try_request(self, url: str, headers: dict, max_retries: int = 3, delay: int = None, timeout: float = None, 
+                     max_bytes: int = None, div_filter: str = None) -> requests.Response:
 
         pbar = None  # Initialize to None
+        delay = self.retry_delay if delay is None else delay
         modified_url = False
 
         for attempt in range(1, max_retries + 1):
 
+            response = None
+
             try:
-                # Adding a timeout to the request to prevent it from hanging indefinitely
-                response = requests.get(url, headers=headers, timeout=timeout)
+                response = self._send_request(url, headers, timeout, max_bytes, div_filter)
 
                 if response.status_code == 200:
                     if pbar:  # Close the progress bar if it exists
@@ -56,7 +269,7 @@ class WebScraper():
                         continue
 
                     # Implementing exponential backoff: The delay time doubles with each retry
-                    time.sleep(delay * (2 ** (attempt - 1)))
+                    time.sleep(self._retry_wait(url, attempt, delay, response))
 
             except requests.exceptions.RequestException as e:
 
@@ -66,7 +279,7 @@ class WebScraper():
 
                 logging.warning(f"Attempt {attempt}/{max_retries} - Failed to fetch URL: {url}. Error: {e}")
                 # Implementing exponential backoff here too
-                time.sleep(delay * (2 ** (attempt - 1)))
+                time.sleep(self._retry_wait(url, attempt, delay))
 
         # Close the progress bar if it exists
         if pbar:
@@ -77,7 +290,8 @@ class WebScraper():
         raise requests.exceptions.RequestException(f"Failed to fetch URL after {max_retries} attempts: {url}")
 
 
-    def URLScraper(self, headers: str, url_domain: str, url_pages: list, url_filter: str, url_exclusion: list, pagin_filter: str, pagin_amount: int = 1, debug_mode: bool = False) -> list:
+    def URLScraper(self, headers: str, url_domain: str, url_pages: list, url_filter: str, url_exclusion: list, pagin_filter: str, pagin_amount: int = 1, 
+                   debug_mode: bool = False, max_bytes: int = None) -> list:
 
         final_url_article_links = []
 
@@ -99,8 +313,6 @@ class WebScraper():
                     else:
                         url_page = f"{url_domain}"
 
-                    url_article_links = []
-
                     print(f"    URL: {self.url_start}{url_page}") if debug_mode else None # DEBUG
                     
                     self.scrape_sleep() # sleep time delay to minimze getting banned by a site
@@ -108,7 +320,7 @@ class WebScraper():
                     full_url = self.url_start + url_page + url_pagin
 
                     try:
-                        response = self._try_request(full_url, headers)
+                        response = self._try_request(full_url, headers, max_bytes=max_bytes)
                         
                     except requests.exceptions.RequestException as e:
                         #logging.error(f"Failed to fetch and scrape URL: {url}. Error: {e}")
@@ -116,124 +328,137 @@ class WebScraper():
 
                     print(f"    Resp URL: {response.url}") if debug_mode else None # DEBUG
                     print(f"    Status code: {response.status_code}") if debug_mode else None # DEBUG
-                            
-                    soup = BeautifulSoup(response.text, "lxml")
-                    all_hrefs = soup.find_all(href=True) # don't use "a" specifically, since some sites put the href's inside other tags like <h3> for example
-                    url_article_links = [link["href"] for link in all_hrefs if re.search(url_filter, link["href"])] # getting the actual article urls
-                    url_article_links = list(set(url_article_links)) # getting rid of possible duplicates thanks to python's "set" data structure
 
+                    with self._timer(url_domain, "parse_listing"):
+                        url_article_links, url_pagin = self.parse_listing(response.text, url_domain, url_page, url_filter, url_exclusion, pagin_filter, debug_mode)
+                    final_url_article_links += url_article_links
 
-                    ## Pagination
+                    pbar.update(1)
 
-                    # 1st check - <a> tag that contains the keyword (wildcard thanks to re.compile)
-                    if pagin_filter:
+                    # prevent the pagination looping on this page if no pagination is found
+                    if url_pagin == "":
+                        break
 
-                        pagination = soup.find_all("a", re.compile(pagin_filter))
-                        
-                        if pagination:
-                            print(f"    1st pagination level - <a> re.compile name") if debug_mode else None # DEBUG
+        final_url_article_links = list(set(final_url_article_links)) # getting rid of possible duplicates thanks to python's "set" data structure
 
-                            # we want the more/next pagination button so we're going to check for "next" or "more" in the tag attributes
-                            for tag in pagination:
+        return final_url_article_links
+    
 
-                                tag_attrs = list(tag.attrs.values())
+    def parse_listing(self, html: str, url_domain: str, url_page: str, url_filter: str, url_exclusion: list, pagin_filter: str, debug_mode: bool = False) -> tuple:
+        """Parses a listing page (front page/section page) without any network access. Returns (article urls, pagination link or "")."""
 
-                                sublists_flattened = [element for sublist in tag_attrs for element in sublist if type(sublist) is list] # extracting the words in the inner lists
-                                list_flattened = [element for element in tag_attrs if type(element) is str] # extracting the words in the list
-                                final_tag_attrs_list = sublists_flattened + list_flattened # putting these 2 lists together for easier keyword comparison
+        url_pagin = ""
 
-                                check_next = any("next" in word for word in final_tag_attrs_list)
-                                check_more = any("more" in word for word in final_tag_attrs_list)
+        soup = BeautifulSoup(html, "lxml")
+        all_hrefs = soup.find_all(href=True) # don't use "a" specifically, since some sites put the href's inside other tags like <h3> for example
+        url_article_links = [link["href"] for link in all_hrefs if re.search(url_filter, link["href"])] # getting the actual article urls
+        url_article_links = list(set(url_article_links)) # getting rid of possible duplicates thanks to python's "set" data structure
 
-                                if check_next or check_more:
-                                    url_pagin = tag["href"]   
 
-                        # 2nd check: "aria-label" inside an "a" tag
-                        if not pagination:
-                            pagination = soup.find_all("a", attrs={"aria-label": pagin_filter}) # get the tag pagination info
-                            if pagination:
-                                print(f"    2nd pagination level - <a> aria-label") if debug_mode else None # DEBUG
-                                url_pagin = pagination[0]["href"]
-                        
-                        # 3rd check - class name and "?" inside it's href
-                        if not pagination:
-                            pagination = soup.find(class_=pagin_filter) # get the tag pagination info
-                            if pagination:
-                                pagination = list(pagination.attrs.values()) # get the url for the next page
-                                pagination = [element for element in pagination if type(element) is str if "?" in element] # if there is a "?" in the url
-                                if pagination:
-                                    print(f"    3rd pagination level - class name") if debug_mode else None # DEBUG
-                                    url_pagin = pagination[0] # [0] extracting the pagination link
-
-                        print(f"    Before pagin url modification: {url_pagin}") if debug_mode else None # DEBUG
-                    
-                    ## Modify the pagination link to be able to connect the relative ending to our root domain
-                    # we use regular expressions for these tasks. 
-                    # for example: '^.*\?' matches any sequence of characters (.*) that occurs at the beginning of the string (^) and ends with a question mark (\?).
-                    if url_pagin:
-                        url_pagin = re.sub(r"^.*\?", "?", url_pagin) # remove all characters before "?"
+        ## Pagination
 
-                        url_pagin = re.sub(r"^.*" + url_page, "", url_pagin) # get the relative pagination link if a full url was scraped
-                        
-                        relative_root = re.sub(r"^.*/", "/", url_page) # get the correct "relative root" extension if the original url has more than just the domain with prefix in the end
-                        print(f"    Relative root: {relative_root}") if debug_mode else None # DEBUG
+        # 1st check - <a> tag that contains the keyword (wildcard thanks to re.compile)
+        if pagin_filter:
 
-                        url_pagin = re.sub(relative_root, "", url_pagin) # subtract the original extension from the scraped url to get one we can use with the initial url
+            pagination = soup.find_all("a", re.compile(pagin_filter))
+            
+            if pagination:
+                print(f"    1st pagination level - <a> re.compile name") if debug_mode else None # DEBUG
 
-                    print("    Pgn URL for 'Next page': " + url_pagin) if debug_mode else None # DEBUG
-                    print() if debug_mode else None # DEBUG
+                # we want the more/next pagination button so we're going to check for "next" or "more" in the tag attributes
+                for tag in pagination:
 
+                    tag_attrs = list(tag.attrs.values())
 
-                    # some sites have the relative url to the individual sub urls. This makes sure so that the whole correct url gets saved.
-                    # some urls have "www." in them. That gets stripped away
-                    # these if-statements's also work as a filter not to include random urls to external sites, social pages, emails or unwanted urls on the same site
+                    sublists_flattened = [element for sublist in tag_attrs for element in sublist if type(sublist) is list] # extracting the words in the inner lists
+                    list_flattened = [element for element in tag_attrs if type(element) is str] # extracting the words in the list
+                    final_tag_attrs_list = sublists_flattened + list_flattened # putting these 2 lists together for easier keyword comparison
 
-                    for link in url_article_links:
+                    check_next = any("next" in word for word in final_tag_attrs_list)
+                    check_more = any("more" in word for word in final_tag_attrs_list)
 
-                        if any(re.search(regex, link) for regex in url_exclusion): # unwanted sub urls
-                            continue
+                    if check_next or check_more:
+                        url_pagin = tag["href"]   
 
-                        if re.match(r"^.*://" + re.escape(url_page) + r"/?$", link): # if it somehow scraped the url to the main page
-                            continue
-                        
-                        # if it scraped articles from to other domains (domain: .com, scraped: .co.uk)
-                        domain_from_link = re.sub(r"^https://(www\.)?", "", link).split("/")[0]
-                        if domain_from_link and domain_from_link != url_domain:
-                            continue
+            # 2nd check: "aria-label" inside an "a" tag
+            if not pagination:
+                pagination = soup.find_all("a", attrs={"aria-label": pagin_filter}) # get the tag pagination info
+                if pagination:
+                    print(f"    2nd pagination level - <a> aria-label") if debug_mode else None # DEBUG
+                    url_pagin = pagination[0]["href"]
+            
+            # 3rd check - class name and "?" inside it's href
+            if not pagination:
+                pagination = soup.find(class_=pagin_filter) # get the tag pagination info
+                if pagination:
+                    pagination = list(pagination.attrs.values()) # get the url for the next page
+                    pagination = [element for element in pagination if type(element) is str if "?" in element] # if there is a "?" in the url
+                    if pagination:
+                        print(f"    3rd pagination level - class name") if debug_mode else None # DEBUG
+                        url_pagin = pagination[0] # [0] extracting the pagination link
+
+            print(f"    Before pagin url modification: {url_pagin}") if debug_mode else None # DEBUG
+        
+        ## Modify the pagination link to be able to connect the relative ending to our root domain
+        # we use regular expressions for these tasks. 
+        # for example: '^.*\?' matches any sequence of characters (.*) that occurs at the beginning of the string (^) and ends with a question mark (\?).
+        if url_pagin:
+            url_pagin = re.sub(r"^.*\?", "?", url_pagin) # remove all characters before "?"
 
-                        # remove ? and everything after, example "?utm_source=homepage&utm_medium=TopNews"
-                        link = re.sub(r"\?.*", "", link)
+            url_pagin = re.sub(r"^.*" + url_page, "", url_pagin) # get the relative pagination link if a full url was scraped
+            
+            relative_root = re.sub(r"^.*/", "/", url_page) # get the correct "relative root" extension if the original url has more than just the domain with prefix in the end
+            print(f"    Relative root: {relative_root}") if debug_mode else None # DEBUG
 
-                        # clean the link depending on different situations
-                        if link.startswith("/"): # relative url (relative to the domain)
-                            final_url_article_links.append("https://" + url_domain + link)
+            url_pagin = re.sub(relative_root, "", url_pagin) # subtract the original extension from the scraped url to get one we can use with the initial url
 
-                        elif link.startswith(self.url_start): # removing "www." from the url if it's present, so all saved urls will have the same format
-                            final_url_article_links.append(re.sub("www.", "", link))
+        print("    Pgn URL for 'Next page': " + url_pagin) if debug_mode else None # DEBUG
+        print() if debug_mode else None # DEBUG
 
-                        elif link.startswith("https://" + url_domain): # standard url
-                            final_url_article_links.append(link)
 
-                    pbar.update(1)
+        # some sites have the relative url to the individual sub urls. This makes sure so that the whole correct url gets saved.
+        # some urls have "www." in them. That gets stripped away
+        # these if-statements's also work as a filter not to include random urls to external sites, social pages, emails or unwanted urls on the same site
 
-                    # prevent the pagination looping on this page if no pagination is found
-                    if url_pagin == "":
-                        break
+        article_links = []
+        for link in url_article_links:
 
-        final_url_article_links = list(set(final_url_article_links)) # getting rid of possible duplicates thanks to python's "set" data structure
+            if any(re.search(regex, link) for regex in url_exclusion): # unwanted sub urls
+                continue
 
-        return final_url_article_links
-    
+            if re.match(r"^.*://" + re.escape(url_page) + r"/?$", link): # if it somehow scraped the url to the main page
+                continue
+            
+            # if it scraped articles from to other domains (domain: .com, scraped: .co.uk)
+            domain_from_link = re.sub(r"^https://(www\.)?", "", link).split("/")[0]
+            if domain_from_link and domain_from_link != url_domain:
+                continue
 
-    def TextScraper(self, headers: str, url: str, div_filter: str, p_attr_exclusion: list, debug_mode: bool, sleep: bool) -> str:
+            # remove ? and everything after, example "?utm_source=homepage&utm_medium=TopNews"
+            link = re.sub(r"\?.*", "", link)
 
-        scraped_text = ""
+            # clean the link depending on different situations
+            if link.startswith("/"): # relative url (relative to the domain)
+                article_links.append("https://" + url_domain + link)
+
+            elif link.startswith(self.url_start): # removing "www." from the url if it's present, so all saved urls will have the same format
+                article_links.append(re.sub("www.", "", link))
+
+            elif link.startswith("https://" + url_domain): # standard url
+                article_links.append(link)
+
+        return article_links, url_pagin
+
+
+    def TextScraper(self, headers: str, url: str, div_filter: str, p_attr_exclusion: list, debug_mode: bool, sleep: bool, max_bytes: int = None) -> str:
 
         if sleep:
             self.scrape_sleep() # sleep time delay to minimze getting banned by a site
 
         try:
-            response = self._try_request(url, headers)
+            # the download stops once the article container is complete (unless the whole page gets archived)
+            stop_filter = None if self.archive and self.archive.full_pages else div_filter
+            response = self._try_request(url, headers, max_bytes=max_bytes, div_filter=stop_filter)
 
         except requests.exceptions.RequestException as e:
             #logging.error(f"Failed to fetch and scrape URL: {url}. Error: {e}")
@@ -241,8 +466,20 @@ class WebScraper():
 
         print(f"    Scraping URL: {url}") if debug_mode else None # DEBUG
         print(f"    Status code: {response.status_code}") if debug_mode else None # DEBUG
+
+        if self.archive: # also the pages without a usable article text, those are the ones worth re-extracting later
+            self.archive.add(url, response.content, response.encoding)
             
-        soup = BeautifulSoup(response.text, "lxml")
+        with self._timer(url, "parse_article"):
+            return self.extract_text(response.text, div_filter, p_attr_exclusion, debug_mode)
+
+
+    def extract_text(self, html: str, div_filter: str, p_attr_exclusion: list, debug_mode: bool = False) -> str:
+        """Extracts the article text from an article page without any network access. Raises ExtractionError if there's no (usable) article text."""
+
+        scraped_text = ""
+
+        soup = BeautifulSoup(html, "lxml")
 
         div = soup.find("div", class_=re.compile(div_filter))
 
@@ -253,15 +490,15 @@ class WebScraper():
         if not div:
             div = soup.find("div", id=re.compile(div_filter))
       
-        # raise ValueError if we didn't get any div
+        # raise ExtractionError if we didn't get any div
         if not div:
             #logging.info(f"{response.url}\n\nInfo: Requested <div> was not found on this page.")
-            raise ValueError("Requested <div> was not found on this page.")
+            raise ExtractionError("div_not_found", "Requested <div> was not found on this page.")
 
-        # raise ValueError if we didn't get any text at all
+        # raise ExtractionError if we didn't get any text at all
         if not div.text:
             #logging.info(f"{response.url}\n\nInfo: The content of the requested <div> was empty.")
-            raise ValueError("The content of the requested <div> was empty.")
+            raise ExtractionError("div_empty", "The content of the requested <div> was empty.")
       
         paragraphs = div.find_all("p")
 
@@ -277,7 +514,7 @@ class WebScraper():
         # if no divs are found with our backup tactic we raise an error
         if not div:
             #logging.info(f"{response.url}\n\nInfo: Requested <div> was not found on this page.")
-            raise ValueError("Requested <div> was not found on this page.")
+            raise ExtractionError("div_not_found", "Requested <div> was not found on this page.")
         
         # get the correct <p> amount for error logging
         if p_amount < len(paragraphs):
@@ -286,7 +523,7 @@ class WebScraper():
         # if it's still not enough "content" we raise a Value Error
         if len(paragraphs) < 7:
             #logging.info(f"{response.url}\n\nInfo: The content of the requested <div> was not worth saving (too few paragraphs: {p_amount}).")
-            raise ValueError(f"The content of the requested <div> was not worth saving (too few paragraphs: {p_amount}).")
+            raise ExtractionError("too_few_paragraphs", f"The content of the requested <div> was not worth saving (too few paragraphs: {p_amount}).")
    
         paragraphs_clean = []
 
@@ -324,4 +561,4 @@ class WebScraper():
 
         scraped_text = ' '.join([paragraph.get_text().strip() for paragraph in paragraphs_clean]) # converting the list of words into a single string
 
-        return scraped_text
\ No newline at end of file
+        return scraped_text
@@ -0,0 +1,116 @@
+# Standard modules
+import os
+import re
+import shutil
+
+# Third-party modules -> requirements.txt (optional, only needed for the snapshot export)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+
+class SnapshotExporter():
+    """Exports the articles (url, date, domain, category, token count) and the analytics aggregates as columnar Parquet/Arrow files,
+    which downstream jobs can scan/memory-map with pyarrow or DuckDB instead of re-querying SQLite and re-classifying the articles.
+
+    The articles are partitioned by scrape date (articles/scrape_date=YYYY-MM-DD/), and every export only (re)writes the dates
+    that haven't been exported yet, plus the latest exported date (it could have gotten more articles since)."""
+
+    def __init__(self, statistics, export_dir: str = "exports/snapshot/", file_format: str = "parquet"):
+
+        if pa is None:
+            raise ImportError("The snapshot export needs the 'pyarrow' package (pip install pyarrow).")
+
+        if file_format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown snapshot format: '{file_format}'. Valid formats are 'parquet' and 'arrow'.")
+
+        self.st = statistics # an ArticleStatistics instance (loaded articles + classifier)
+        self.export_dir = export_dir
+        self.file_format = file_format # "parquet" (compressed) or "arrow" (uncompressed Arrow IPC/Feather, can be memory-mapped)
+        self.file_ext = ".parquet" if file_format == "parquet" else ".arrow"
+        self.articles_dir = os.path.join(self.export_dir, "articles")
+        self.aggregates_dir = os.path.join(self.export_dir, "aggregates")
+
+
+    def _write_table(self, df, file_path: str):
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        # write to a temporary file first, so readers never see a half written file
+        tmp_path = f"{file_path}.tmp"
+        if self.file_format == "parquet":
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, file_path)
+
+
+    def exported_dates(self) -> list:
+        """The scrape dates that already have an articles partition."""
+
+        if not os.path.exists(self.articles_dir):
+            return []
+
+        return sorted(re.sub(r"^scrape_date=", "", name) for name in os.listdir(self.articles_dir) if name.startswith("scrape_date="))
+
+
+    def export_articles(self, full: bool = False) -> list:
+        """Writes the article partitions (incrementally unless 'full' is set, e.g. after the keywords/categories were edited). Returns the written files."""
+
+        df_articles = self.st.df_articles
+
+        if full and os.path.exists(self.articles_dir):
+            shutil.rmtree(self.articles_dir)
+
+        exported_dates = self.exported_dates()
+        latest_exported_date = exported_dates[-1] if exported_dates else ""
+
+        dates_to_export = sorted(date for date in df_articles["date"].unique() if date not in exported_dates or date == latest_exported_date)
+        if not dates_to_export:
+            return []
+
+        df_new = df_articles[df_articles["date"].isin(dates_to_export)].copy()
+
+        # the classification (and token counts) of all articles come from the corpus store, only the new dates get written
+        df_details = self.st.get_article_details().loc[df_new.index]
+        df_new["category"] = df_details["category"]
+        df_new["domain"] = df_new["url"].str.replace(r"^https://(www.)?|/.*", "", regex=True)
+        df_new["token_count"] = df_details["token_count"]
+
+        written_files = []
+        for date, df_date in df_new.groupby("date"):
+
+            partition_dir = os.path.join(self.articles_dir, f"scrape_date={date}")
+            os.makedirs(partition_dir, exist_ok=True)
+
+            file_path = os.path.join(partition_dir, f"part-0{self.file_ext}")
+            self._write_table(df_date[["url", "date", "domain", "category", "token_count"]], file_path)
+            written_files.append(file_path)
+
+        return written_files
+
+
+    def export_aggregates(self, include_countries: bool = True) -> list:
+        """Writes all the analytics aggregates (full snapshot, they're small). Returns the written files."""
+
+        os.makedirs(self.aggregates_dir, exist_ok=True)
+
+        aggregates = {
+            "top_keywords": self.st.get_top_kw(),
+            "top_categories": self.st.get_top_cats(),
+            "categories_by_date": self.st.get_cats_by_date().reset_index(),
+            "categories_by_domain": self.st.get_cats_by_domain().reset_index(),
+        }
+        if include_countries:
+            aggregates["country_mentions"] = self.st.get_country_mentions()
+
+        written_files = []
+        for name, df in aggregates.items():
+            file_path = os.path.join(self.aggregates_dir, f"{name}{self.file_ext}")
+            self._write_table(df, file_path)
+            written_files.append(file_path)
+
+        return written_files
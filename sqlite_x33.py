@@ -23,11 +23,33 @@ class SQLiteDBManager:
             self.cursor.close()
             self.connection.close()
      
-    def execute_query(self, query:str):
-        self.cursor.execute(query)
+    def execute_query(self, query:str, params:tuple = ()):
+        self.cursor.execute(query, params)
         # Returns the result of a SELECT query, or None if the query was an INSERT/UPDATE/DELETE command
         return self.cursor.fetchall()
 
-def execute(filename:str, query:str):
+    def execute_many(self, query:str, seq_of_params:list):
+        # Runs the same query for every row of params within a single transaction (one commit on exit)
+        self.cursor.executemany(query, seq_of_params)
+        return self.cursor.rowcount
+
+    def iterate_query(self, query:str, params:tuple = (), chunk_size:int = 1000):
+        # Yields the result rows of a SELECT query in chunks, instead of fetching the whole result at once
+        self.cursor.execute(query, params)
+        while True:
+            rows = self.cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def execute(filename:str, query:str, params:tuple = ()):
+    with SQLiteDBManager(filename) as sql:
+        return(sql.execute_query(query, params))
+
+def execute_many(filename:str, query:str, seq_of_params:list):
+    with SQLiteDBManager(filename) as sql:
+        return(sql.execute_many(query, seq_of_params))
+
+def iterate(filename:str, query:str, params:tuple = (), chunk_size:int = 1000):
     with SQLiteDBManager(filename) as sql:
-        return(sql.execute_query(query))
\ No newline at end of file
+        yield from sql.iterate_query(query, params, chunk_size)
@@ -0,0 +1,48 @@
+# Standard modules
+import os
+import sys
+import pytest
+
+# the modules are in the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+
+
+@pytest.fixture
+def database(tmp_path) -> str:
+    """An empty database with all the tables of data_init."""
+
+    database = str(tmp_path / "test.db")
+    for query in data_init.db_tables:
+        sql.execute(database, query)
+
+    return database
+
+
+# small taxonomy and (already cleaned) article texts for the analytics tests
+identifiers = {"business": {"market": 1.0, "stock": 1.0, "central bank": 2.0}, "sports": {"football": 1.0, "world cup": 1.0}, "technology": {"ai": 1.0}}
+
+articles = [
+    ("https://www.a.com/1", "2024-05-01", "market stock rally central bank rates market"),
+    ("https://www.a.com/2", "2024-05-01", "football world cup final football fans"),
+    ("https://b.com/1", "2024-05-02", "ai startup stock market"),
+    ("https://b.com/2", "2024-05-03", "world cup ai referee football"),
+]
+
+
+def add_articles(database: str, rows: list):
+    sql.execute_many(database, "INSERT INTO articles (url, scrape_date, content) VALUES (?, ?, ?);", rows)
+
+
+@pytest.fixture
+def corpus_database(database) -> str:
+    """A database with the taxonomy and articles above."""
+
+    from identifier_store import IdentifierStore
+    IdentifierStore(database).upsert(IdentifierStore.rows_from_dict(identifiers))
+    add_articles(database, articles)
+
+    return database
@@ -0,0 +1,84 @@
+# Standard modules
+import time
+
+# Custom made modules
+from adaptive_controller import AdaptiveController
+
+
+def state(controller: AdaptiveController, domain: str = "a.com"):
+    return controller._state(domain)
+
+
+def test_fast_responses_speed_up_within_the_limits():
+    controller = AdaptiveController(max_concurrency=3, min_delay=0.5)
+
+    for _ in range(200):
+        controller.record("a.com", 0.1)
+
+    assert state(controller).concurrency == 3
+    assert state(controller).delay == 0.5
+
+
+def test_slower_responses_keep_the_pace():
+    controller = AdaptiveController(slow_margin=0.05)
+    for _ in range(10):
+        controller.record("a.com", 0.1)
+    concurrency, delay = state(controller).concurrency, state(controller).delay
+
+    # slower than fast_factor x baseline, but the average stays below the congestion threshold
+    controller.record("a.com", 0.2)
+
+    assert (state(controller).concurrency, state(controller).delay) == (concurrency, delay)
+
+
+def test_errors_back_off_once_per_round_trip():
+    controller = AdaptiveController(max_concurrency=8, min_delay=0.1)
+    for _ in range(100):
+        controller.record("a.com", 0.5)
+    concurrency, delay = state(controller).concurrency, state(controller).delay
+
+    # a burst of errors from the same overload halves/doubles only once
+    for _ in range(5):
+        controller.record("a.com", success=False)
+
+    assert state(controller).concurrency == max(1.0, concurrency / 2)
+    assert state(controller).delay == min(60.0, delay * 2)
+
+
+def test_latency_rise_counts_as_congestion():
+    controller = AdaptiveController(initial_delay=1.0, min_delay=1.0)
+    for _ in range(10):
+        controller.record("a.com", 0.1)
+
+    for _ in range(10):
+        controller.record("a.com", 2.0)
+
+    assert state(controller).delay > 1.0
+
+
+def test_retry_after_pauses_the_site():
+    controller = AdaptiveController()
+    controller.record("a.com", 0.1, success=False, retry_after=30)
+
+    assert state(controller).next_request_at >= time.monotonic() + 29
+    assert controller.snapshot()["a.com"]["errors"] == 1
+
+
+def test_sites_are_paced_independently():
+    controller = AdaptiveController()
+    controller.record("a.com", success=False)
+
+    assert state(controller, "b.com").delay == controller.initial_delay
+
+
+def test_baseline_follows_a_slower_site():
+    controller = AdaptiveController(initial_delay=2.0, max_concurrency=2)
+
+    # a single early fast response (e.g. a cached page) must not turn the normal latency of the site into congestion
+    controller.record("a.com", 0.1)
+    for _ in range(50):
+        controller.record("a.com", 0.6)
+
+    assert state(controller).baseline_latency == 0.6
+    assert state(controller).delay < 2.0
+    assert state(controller).concurrency == 2
@@ -0,0 +1,61 @@
+# Standard modules
+import pytest
+
+# Custom made modules
+from scraper import ContainerWatcher, WebScraper, ExtractionError
+
+
+def article_page(container_class: str = "article-body") -> bytes:
+    paragraphs = "".join(f"<p>Paragraph {i} of the story, with <b>nested</b> markup.</p>" for i in range(10))
+    return (f"""<html><head><title>Story</title><script>var x = "<div class='{container_class}'>";</script></head><body>
+                <div class="nav"><p>Menu</p></div>
+                <div class="promo {container_class}-teaser"><div class="inner"><p>Teaser</p></div></div>
+                <div class="{container_class}"><div><figure><figcaption><p>Caption</p></figcaption></figure></div>{paragraphs}</div>
+                <div class="comments">{'<p>Comment</p>' * 50}</div>
+                </body></html>""").encode("utf-8")
+
+
+def stream(watcher: ContainerWatcher, page: bytes, chunk_size: int) -> bytes:
+    """The part of the page that is downloaded until the watcher stops it (like WebScraper._read_body)."""
+
+    chunks = []
+    for start in range(0, len(page), chunk_size):
+        chunks.append(page[start:start + chunk_size])
+        if watcher.feed(chunks[-1]):
+            break
+
+    return b"".join(chunks)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 100_000])
+def test_stopped_download_extracts_the_same_text(chunk_size):
+    page = article_page()
+    div_filter = "^article-body$"
+    watcher = ContainerWatcher(div_filter)
+
+    downloaded = stream(watcher, page, chunk_size)
+
+    assert watcher.closed
+    assert len(downloaded) < len(page) or chunk_size >= len(page)
+    ws = WebScraper()
+    assert ws.extract_text(downloaded.decode("utf-8"), div_filter, []) == ws.extract_text(page.decode("utf-8"), div_filter, [])
+
+
+def test_watcher_picks_the_first_matching_div_like_extract_text():
+    # the teaser div matches the filter first (by its 2nd class), so both stop there/pick it
+    watcher = ContainerWatcher("teaser")
+    stream(watcher, article_page(), 16)
+
+    assert watcher.closed
+    assert "article-body-teaser" in watcher.container.get("class")
+    with pytest.raises(ExtractionError) as error:
+        WebScraper().extract_text(article_page().decode("utf-8"), "teaser", [])
+    assert error.value.code == "too_few_paragraphs"
+
+
+def test_pages_without_a_matching_div_are_read_to_the_end():
+    page = article_page().replace(b'<div class="article-body">', b'<article class="article-body">', 1)
+    watcher = ContainerWatcher("^article-body$")
+
+    assert stream(watcher, page, 32) == page
+    assert not watcher.closed
@@ -0,0 +1,129 @@
+# Standard modules
+import random
+import numpy as np
+import pytest
+
+# Custom made modules
+import sqlite_x33 as sql
+from conftest import add_articles
+from corpus_store import CorpusStore
+
+
+def brute_force_counts(texts: list, phrase: str) -> list:
+    """Whole-word occurences of a phrase in every text (overlapping ones included)."""
+
+    words = phrase.split()
+    counts = []
+    for text in texts:
+        tokens = text.split()
+        counts.append(sum(tokens[i:i + len(words)] == words for i in range(len(tokens) - len(words) + 1)))
+    return counts
+
+
+def random_articles(amount: int, seed: int = 0, start: int = 0) -> list:
+    rng = random.Random(seed)
+    vocab = ["new", "york", "market", "stock", "world", "cup", "ai", "bank", "central", "news"]
+    return [(f"https://www.site{i % 3}.com/{start + i}", f"2024-05-0{1 + i % 5}", " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 40))))
+            for i in range(amount)]
+
+
+def stored_texts(database: str) -> list:
+    return [content for content, in sql.execute(database, "SELECT content FROM articles ORDER BY rowid;")]
+
+
+def test_update_appends_only_the_new_articles(database):
+    add_articles(database, random_articles(30))
+    corpus = CorpusStore(database)
+    assert corpus.update(chunk_size=7) == 30
+
+    add_articles(database, random_articles(10, seed=1, start=30))
+    assert corpus.update(chunk_size=7) == 10
+    assert corpus.update() == 0
+    corpus.open()
+
+    texts = stored_texts(database)
+    assert len(corpus) == 40
+    assert [" ".join(corpus.vocab[token_id] for token_id in corpus.article_tokens(i)) for i in range(40)] == texts
+    assert list(corpus.article_lengths()) == [len(text.split()) for text in texts]
+    assert list(corpus.rowids) == list(range(1, 41))
+    assert corpus.meta["domains"] == ["site0.com", "site1.com", "site2.com"]
+
+
+def test_data_of_a_crashed_update_is_cut_off(database):
+    add_articles(database, random_articles(20))
+    corpus = CorpusStore(database)
+    corpus.update()
+
+    # bytes appended after the last meta write (an update that crashed before finishing)
+    for name in ("tokens", "offsets", "rowids"):
+        with open(corpus._path(name), "ab") as file:
+            file.write(b"\x07" * 24)
+
+    add_articles(database, random_articles(5, seed=1, start=20))
+    corpus.update()
+    corpus.open()
+
+    assert [" ".join(corpus.vocab[token_id] for token_id in corpus.article_tokens(i)) for i in range(len(corpus))] == stored_texts(database)
+
+
+def test_deleted_articles_rebuild_the_store(database):
+    add_articles(database, random_articles(10))
+    corpus = CorpusStore(database)
+    corpus.update()
+    sql.execute(database, "DELETE FROM articles WHERE rowid = 3;")
+
+    corpus.update()
+    corpus.open()
+
+    assert len(corpus) == 9 and 3 not in corpus.rowids
+
+
+@pytest.mark.parametrize("phrase", ["york", "new york", "new york new", "world cup", "bank central", "unknown word"])
+def test_counts_per_article_match_whole_words(database, phrase):
+    articles = random_articles(50) + [("https://a.com/x", "2024-05-01", "new york new york"), ("https://a.com/y", "2024-05-01", "new"),
+                                      ("https://a.com/z", "2024-05-01", "york city")]
+    add_articles(database, articles)
+    corpus = CorpusStore(database)
+    corpus.update()
+    corpus.open()
+
+    # (no match across the boundary of "...new" | "york city")
+    assert list(corpus.counts_per_article(phrase)) == brute_force_counts(stored_texts(database), phrase)
+
+
+def test_word_counts_without_the_masked_articles(database):
+    add_articles(database, random_articles(20))
+    corpus = CorpusStore(database)
+    corpus.update()
+    corpus.open()
+    mask = np.arange(20) % 4 != 0
+
+    counts = corpus.word_counts(mask)
+
+    expected = {}
+    for text, included in zip(stored_texts(database), mask):
+        for word in text.split() if included else ():
+            expected[word] = expected.get(word, 0) + 1
+    assert {corpus.vocab[token_id]: count for token_id, count in enumerate(counts) if count} == expected
+
+
+@pytest.mark.parametrize("scan_chunk_size", [50, 16_000_000])
+def test_postings_match_a_full_scan(database, scan_chunk_size):
+    add_articles(database, random_articles(60))
+    corpus = CorpusStore(database)
+    corpus.scan_chunk_size = scan_chunk_size # small segments -> several segments, merged with the next update
+    corpus.update()
+    corpus.open()
+    corpus.update_postings()
+
+    add_articles(database, random_articles(15, seed=1, start=60))
+    corpus.update()
+    corpus.open()
+    corpus.update_postings()
+    assert (len(corpus.meta["posting_segments"]) > 1) == (scan_chunk_size == 50)
+
+    for phrase in ("market", "new york", "world cup", "central bank", "unknown"):
+        expected = np.array(brute_force_counts(stored_texts(database), phrase))
+        articles, counts = corpus.keyword_postings(phrase)
+        assert list(articles) == list(np.flatnonzero(expected))
+        assert list(counts) == list(expected[expected > 0])
@@ -0,0 +1,108 @@
+# Standard modules
+import random
+import pytest
+
+# Custom made modules
+import sqlite_x33 as sql
+from duplicate_detector import DuplicateDetector
+
+
+words = [f"word{i}" for i in range(400)]
+
+
+def story(seed: int, length: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(words) for _ in range(length))
+
+
+def edited(text: str, changes: int) -> str:
+    tokens = text.split()
+    for i in range(changes):
+        tokens[i * 37 % len(tokens)] = "edited"
+    return " ".join(tokens)
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def test_fingerprint_of_near_duplicates_is_close(database):
+    dd = DuplicateDetector(database)
+    text = story(1)
+
+    assert dd.fingerprint(text) == dd.fingerprint(text)
+    assert distance(dd.fingerprint(text), dd.fingerprint(edited(text, 2))) <= dd.max_distance
+    assert distance(dd.fingerprint(text), dd.fingerprint(story(2))) > dd.max_distance
+
+
+def test_close_fingerprints_share_a_band(database):
+    dd = DuplicateDetector(database)
+    rng = random.Random(0)
+
+    # pigeonhole: at most 7 differing bits can't touch all 8 bands
+    for _ in range(200):
+        simhash = rng.getrandbits(64)
+        flipped = simhash
+        for bit in rng.sample(range(64), 7):
+            flipped ^= 1 << bit
+        assert set(dd._bands(simhash)) & set(dd._bands(flipped))
+
+
+def test_flag_mode_tags_the_story_cluster(database):
+    dd = DuplicateDetector(database, mode="flag")
+    text = story(1)
+
+    assert dd.check_article("https://a.com/1", text) is None
+    assert dd.check_article("https://b.com/1", edited(text, 2)) == "https://a.com/1"
+    assert dd.check_article("https://c.com/1", edited(text, 3)) == "https://a.com/1"
+    assert dd.check_article("https://d.com/1", story(2)) is None
+
+    assert dd.get_cluster_report() == [{"cluster_url": "https://a.com/1", "size": 3, "domains": ["a.com", "b.com", "c.com"]}]
+
+
+def test_drop_mode_doesnt_store_the_duplicate(database):
+    dd = DuplicateDetector(database, mode="drop")
+    text = story(1)
+    dd.check_article("https://a.com/1", text)
+
+    assert dd.check_article("https://b.com/1", text) == "https://a.com/1"
+    assert [url for url, in sql.execute(database, "SELECT url FROM article_fingerprints;")] == ["https://a.com/1"]
+
+
+def test_index_is_backfilled_from_the_stored_articles(database):
+    text = story(1)
+    sql.execute_many(database, "INSERT INTO articles (url, content) VALUES (?, ?);",
+                     [("https://a.com/1", text), ("https://b.com/1", edited(text, 1)), ("https://c.com/1", story(2))])
+
+    # the report alone doesn't build the index
+    assert DuplicateDetector(database, mode="off").get_cluster_report() == []
+    assert sql.execute(database, "SELECT count(*) FROM article_fingerprints;") == [(0,)]
+
+    dd = DuplicateDetector(database)
+
+    assert len(dd.fingerprints) == 3
+    assert dd.fingerprints["https://b.com/1"][1] == "https://a.com/1"
+    assert DuplicateDetector(database, mode="off").get_cluster_report()[0]["size"] == 2
+
+
+def test_unknown_mode(database):
+    with pytest.raises(ValueError):
+        DuplicateDetector(database, mode="strict")
+
+
+def test_index_picks_up_the_articles_of_other_workers(database):
+    text = story(1)
+    dd = DuplicateDetector(database)
+    other_worker = DuplicateDetector(database)
+    other_worker.check_article("https://a.com/1", text)
+    sql.execute(database, "INSERT INTO articles (url, content) VALUES (?, ?);", ("https://b.com/1", story(2))) # stored with dedup "off"
+
+    assert dd.find_duplicate(text)[1] is None
+    dd.load_index()
+
+    assert dd.find_duplicate(edited(text, 1))[1] == "https://a.com/1"
+    assert dd.find_duplicate(edited(story(2), 1))[1] == "https://b.com/1"
+    assert sum(len(urls) for urls in dd.band_index.values()) == 2 * 8 # nothing is indexed twice
+
+    dd.load_index()
+    assert sum(len(urls) for urls in dd.band_index.values()) == 2 * 8
@@ -0,0 +1,66 @@
+# Standard modules
+import gzip
+import pytest
+from datetime import datetime, timezone
+
+# Custom made modules
+from scraper import WebScraper
+from feed_discovery import FeedDiscovery
+
+
+site = {"domain": "example.com", "pages": ["/", "/world"], "url_filter": r"/\d+/\d+/\d+/", "url_exclusion": [r"/video/"]}
+
+
+@pytest.fixture
+def discovery(database) -> FeedDiscovery:
+    return FeedDiscovery(database, WebScraper(), {})
+
+
+def test_parse_news_sitemap(discovery):
+    content = b"""<?xml version="1.0" encoding="UTF-8"?>
+        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">
+          <url><loc>https://example.com/2024/05/01/story</loc><lastmod>2024-05-02T00:00:00Z</lastmod>
+            <news:news><news:publication_date>2024-05-01T10:30:00+02:00</news:publication_date></news:news></url>
+          <url><loc>https://example.com/2024/05/01/other</loc></url>
+        </urlset>"""
+
+    entries, children = discovery.parse(content)
+
+    assert entries == [("https://example.com/2024/05/01/story", datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)),
+                       ("https://example.com/2024/05/01/other", None)]
+    assert children == []
+
+
+def test_parse_gzipped_sitemap_index(discovery):
+    content = gzip.compress(b"""<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+        <sitemap><loc>https://example.com/sitemap-1.xml</loc><lastmod>2024-05-01</lastmod></sitemap></sitemapindex>""")
+
+    assert discovery.parse(content) == ([], [("https://example.com/sitemap-1.xml", datetime(2024, 5, 1, tzinfo=timezone.utc))])
+
+
+def test_parse_rss_and_atom(discovery):
+    rss = b"""<rss version="2.0"><channel><title>News</title><link>https://example.com/</link>
+        <item><title>Story</title><link>https://example.com/2024/05/01/story</link><pubDate>Wed, 01 May 2024 10:00:00 GMT</pubDate></item>
+        </channel></rss>"""
+    atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><title>News</title>
+        <entry><title>Story</title><link href="https://example.com/2024/05/01/story"/><updated>2024-05-01T10:00:00Z</updated></entry></feed>"""
+
+    expected = [("https://example.com/2024/05/01/story", datetime(2024, 5, 1, 10, tzinfo=timezone.utc))]
+    assert discovery.parse(rss)[0] == expected
+    assert discovery.parse(atom)[0] == expected
+
+
+@pytest.mark.parametrize("link, expected", [
+    ("https://www.example.com/2024/05/01/story?utm_source=rss", "https://example.com/2024/05/01/story"),
+    ("https://example.com/2024/05/01/story", "https://example.com/2024/05/01/story"),
+    ("https://example.com/about", None), # url_filter
+    ("https://example.com/video/2024/05/01/clip", None), # url_exclusion
+    ("https://live.example.com/2024/05/01/story", None), # subdomain
+    ("https://other.com/2024/05/01/story", None), # other site
+])
+def test_normalize(discovery, link, expected):
+    assert discovery.normalize(link, site) == expected
+
+
+def test_normalize_skips_the_section_pages(discovery):
+    assert discovery.normalize("https://example.com/world/", {**site, "url_filter": r"/"}) is None
@@ -0,0 +1,90 @@
+# Standard modules
+import pytest
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Custom made modules
+from graph_mgr import GraphManager
+
+
+@pytest.fixture
+def gm(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # the charts are written to exports/ in the working directory
+    gm = GraphManager(max_workers=1)
+    yield gm
+    gm.close()
+
+
+def dashboard(gm: GraphManager) -> str:
+    with open(f"{gm.export_dir}{gm.dashboard_file}", encoding="utf-8") as file:
+        return file.read()
+
+
+def test_standalone_is_the_default_mode(gm):
+    assert gm.export_mode == "standalone"
+
+
+def test_dashboard_only_has_the_barmode_select_with_a_bar_chart(gm):
+    gm.export_mode = "dashboard"
+    line = px.line(x=[1, 2, 3], y=[1, 3, 2])
+    gm._export(line, [("line.html", {"template": template}) for template in gm.plot_templates], chart_id="line")
+
+    assert '<select id="barmode-select">' not in dashboard(gm)
+
+    bar = px.bar(x=["a", "b"], y=[1, 2], color=["x", "y"])
+    gm._export(bar, [("bar.html", {"barmode": "stack", "template": "seaborn"})], chart_id="bar")
+
+    assert '<select id="barmode-select">' in dashboard(gm)
+
+
+def test_dashboard_escapes_the_embedded_json(gm):
+    gm.export_mode = "dashboard"
+    fig = px.line(x=[1, 2], y=[1, 2], title="</script><script>alert(1)</script>")
+    gm._export(fig, [("line.html", {"template": "seaborn"})], chart_id="</script><b>")
+
+    html = dashboard(gm)
+    # only the 2 script blocks of the page itself are closed
+    assert html.count("</script>") == 2
+    assert '<div id="&lt;/script&gt;&lt;b&gt;" class="chart">' in html
+
+
+def series(days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-01-01", periods=days, freq="D").strftime("%Y-%m-%d")
+    return pd.DataFrame({"kw_1": rng.poisson(5, days), "kw_2": rng.poisson(5, days)}, index=dates)
+
+
+def test_downsample_keeps_short_series(gm):
+    df = series(100)
+    assert gm.downsample(df, "kw_1", max_points=100) is df
+
+
+def test_downsample_keeps_the_ends_and_peaks(gm):
+    df = series(5000)
+    df.iloc[1234, 0] = 1000 # a spike of kw_1
+    df.iloc[3456, 1] = 1000 # a spike of kw_2
+
+    single = gm.downsample(df, "kw_1", max_points=200)
+    assert len(single) == 200
+    assert single.index[0] == df.index[0] and single.index[-1] == df.index[-1]
+    assert single["kw_1"].max() == 1000
+    assert single.index.is_monotonic_increasing
+
+    # a comparison keeps the points picked for either series (their peaks included)
+    both = gm.downsample(df, ["kw_1", "kw_2"], max_points=200)
+    assert 200 <= len(both) <= 400
+    assert both["kw_1"].max() == both["kw_2"].max() == 1000
+
+
+def test_aggregate_by_date_picks_the_bucket_from_the_span(gm):
+    assert gm.aggregate_by_date(series(100), ["kw_1"])[1] == "day"
+
+    df = series(400)
+    weekly, bucket = gm.aggregate_by_date(df, ["kw_1", "kw_2"])
+    assert bucket == "week"
+    assert weekly["kw_1"].sum() == df["kw_1"].sum()
+    assert weekly.index[0] == "2019-12-30" # the monday of the 1st week
+
+    monthly, bucket = gm.aggregate_by_date(series(1000), ["kw_1"])
+    assert bucket == "month" and len(monthly) == 33
@@ -0,0 +1,91 @@
+# Standard modules
+import os
+import pytest
+
+# Custom made modules
+import data_init
+import sqlite_x33 as sql
+import html_archive
+from html_archive import HTMLArchive, compress, decompress
+
+
+site = {"domain": "example.com", "div_filter": "^story$", "p_attr_exclusion": []}
+
+
+def page(text: str) -> str:
+    return "<html><body><div class='story'>" + f"<p>{text}</p>" * 8 + "</div></body></html>"
+
+
+@pytest.fixture
+def archive(database, tmp_path) -> HTMLArchive:
+    return HTMLArchive(database, archive_dir=str(tmp_path / "html"), flush_size=2)
+
+
+def test_compression_round_trip():
+    data = page("Some article text.").encode()
+    codec, compressed = compress(data)
+
+    assert codec in ("zstd", "zlib")
+    assert decompress(codec, compressed) == data
+
+
+def test_zlib_without_zstandard(monkeypatch):
+    data = page("Some article text.").encode()
+    zstd_page = compress(data)
+    monkeypatch.setattr(html_archive, "zstandard", None)
+
+    assert decompress(*compress(data)) == data and compress(data)[0] == "zlib"
+    if zstd_page[0] == "zstd":
+        with pytest.raises(ImportError):
+            decompress(*zstd_page)
+
+
+def test_get_returns_the_decoded_page(archive):
+    archive.add("https://example.com/1", page("Größere Änderungen").encode("latin-1"), encoding="latin-1")
+    archive.add("https://example.com/2", page("Plain text").encode())
+
+    assert archive.get("https://example.com/1") == page("Größere Änderungen")
+    assert archive.get("https://example.com/2") == page("Plain text")
+    assert archive.get("https://example.com/3") is None
+
+
+def test_identical_pages_are_stored_once(archive, database):
+    for i in range(3):
+        archive.add(f"https://example.com/{i}", page("Same page").encode())
+    archive.flush()
+
+    assert sql.execute(database, "SELECT count(*) FROM html_archive;")[0][0] == 3
+    assert sql.execute(database, "SELECT count(*) FROM html_blobs;")[0][0] == 1
+    assert archive.stats() == [("example.com", 3, 3 * len(page("Same page").encode()),
+                                3 * sql.execute(database, "SELECT length FROM html_blobs;")[0][0])]
+
+
+def test_full_segments_roll_over(database, tmp_path):
+    archive = HTMLArchive(database, archive_dir=str(tmp_path / "html"), segment_size=1)
+    pages = {f"https://example.com/{i}": page(f"Article number {i}") for i in range(3)}
+    for url, html in pages.items():
+        archive.add(url, html.encode())
+
+    # every page gets its own segment file here, and another archive (= scrape process) never appends to them
+    assert sorted(os.listdir(tmp_path / "html")) == [f"segment_{i:06d}.pack" for i in (1, 2, 3)]
+    HTMLArchive(database, archive_dir=str(tmp_path / "html")).add("https://example.com/new", page("New").encode())
+    assert len(os.listdir(tmp_path / "html")) == 4
+
+    assert all(archive.get(url) == html for url, html in pages.items())
+
+
+def test_reextract_recovers_the_excluded_articles(archive, database, monkeypatch):
+    monkeypatch.setattr(data_init, "news_sites", [site])
+    archive.add("https://example.com/fixed", page("The site config was fixed for this article.").encode())
+    archive.add("https://example.com/broken", b"<html><body><div class='teaser'><p>No story.</p></div></body></html>")
+    archive.add("https://unknown.com/1", page("Not a configured site.").encode())
+    sql.execute_many(database, "INSERT INTO exclude_articles (url, reason, reason_code, domain) VALUES (?, 'old', 'div_not_found', ?);",
+                     [("https://example.com/fixed", "example.com"), ("https://example.com/broken", "example.com"), ("https://unknown.com/1", "unknown.com")])
+
+    assert archive.reextract(workers=1, dry_run=True) == {"recovered": 1, "still_excluded": 1}
+    assert sql.execute(database, "SELECT count(*) FROM articles;")[0][0] == 0
+
+    assert archive.reextract(workers=1) == {"recovered": 1, "still_excluded": 1}
+    assert [row[0] for row in sql.execute(database, "SELECT url FROM articles;")] == ["https://example.com/fixed"]
+    assert sql.execute(database, "SELECT url, reason_code FROM exclude_articles ORDER BY url;") == [("https://example.com/broken", "div_not_found"),
+                                                                                                     ("https://unknown.com/1", "div_not_found")]
@@ -0,0 +1,107 @@
+# Standard modules
+import numpy as np
+import pytest
+from scipy import sparse
+
+# Custom made modules
+from conftest import add_articles
+from corpus_store import CorpusStore
+from identifier_model import IdentifierModel
+from identifier_store import IdentifierStore
+
+
+def open_corpus(database: str) -> CorpusStore:
+    corpus = CorpusStore(database)
+    corpus.update()
+    return corpus.open()
+
+
+def categories(model: IdentifierModel, category_ids) -> list:
+    return [model.categories[category_id] for category_id in category_ids]
+
+
+def test_identifiers_are_interned(corpus_database):
+    model = IdentifierModel.load(corpus_database)
+
+    assert model.categories == ["business", "sports", "technology"]
+    assert model.keywords == ["market", "stock", "central bank", "football", "world cup", "ai"]
+    assert categories(model, model.keyword_category_ids) == ["business", "business", "business", "sports", "sports", "technology"]
+    assert list(model.keyword_weights) == [1, 1, 2, 1, 1, 1]
+    assert [model.keywords[i] for i in model.phrase_kw_ids] == ["central bank", "world cup"]
+    assert model.to_dict()["sports"]["keywords"] == ["football", "world cup"]
+
+
+def test_model_is_cached_until_the_identifiers_are_edited(corpus_database):
+    model = IdentifierModel.load(corpus_database)
+    assert IdentifierModel.load(corpus_database) is model
+
+    IdentifierStore(corpus_database).upsert([("technology", "chips", None)])
+
+    assert IdentifierModel.load(corpus_database).keywords[-1] == "chips"
+
+
+def test_keyword_counts_match_whole_words(corpus_database):
+    add_articles(corpus_database, [("https://c.com/1", "2024-05-04", "central banks world cup world cup marketing")])
+    model = IdentifierModel.load(corpus_database)
+    corpus = open_corpus(corpus_database)
+
+    counts = dict(zip(model.keywords, model.keyword_counts(corpus)))
+    assert counts == {"market": 3, "stock": 2, "central bank": 1, "football": 3, "world cup": 4, "ai": 2}
+
+    # without the 2nd article
+    mask = np.arange(len(corpus)) != 1
+    assert dict(zip(model.keywords, model.keyword_counts(corpus, mask)))["football"] == 1
+
+
+def test_classify_by_weighted_hits(corpus_database):
+    add_articles(corpus_database, [("https://c.com/1", "2024-05-04", "central bank ai ai ai"),
+                                   ("https://c.com/2", "2024-05-04", "ai football"),
+                                   ("https://c.com/3", "2024-05-04", "no keywords at all")])
+    model = IdentifierModel.load(corpus_database)
+
+    # "central bank" weighs 2 (< 3 x ai), a tie goes to the category of the first phrase/keyword, no hits at all too
+    assert categories(model, model.classify(open_corpus(corpus_database))) == \
+        ["business", "sports", "business", "sports", "technology", "sports", "business"]
+
+
+def test_classify_without_keywords(database):
+    add_articles(database, [("https://c.com/1", "2024-05-04", "ai")])
+
+    with pytest.raises(ValueError):
+        IdentifierModel.load(database).classify(open_corpus(database))
+
+
+def test_tfidf_scores():
+    model = IdentifierModel([(1, "a"), (2, "b")], [("common", "a", 1.0), ("rare", "b", 2.0)])
+    # 4 articles: "common" in all of them (5x in the 1st), "rare" once in the 1st
+    keyword_matrix = sparse.csr_matrix(np.array([[5, 1], [1, 0], [1, 0], [1, 0]], dtype=np.float64))
+
+    idf = model.idf(keyword_matrix)
+    assert idf == pytest.approx([np.log(5 / 5) + 1, np.log(5 / 2) + 1])
+
+    hits = model.keyword_scores(keyword_matrix, "hits").toarray()
+    tfidf = model.keyword_scores(keyword_matrix, "tfidf").toarray()
+    assert hits[0] == pytest.approx([5, 2])
+    assert tfidf[0] == pytest.approx([(1 + np.log(5)) * idf[0], 2 * idf[1]])
+
+    # the repeated common keyword wins by hits, the rare (weighted) one by TF-IDF
+    assert list(model.best_categories(hits @ model.category_matrix().toarray())) == [0, 0, 0, 0]
+    assert list(model.best_categories(tfidf @ model.category_matrix().toarray())) == [1, 0, 0, 0]
+
+    # a given idf (e.g. the document frequencies of the whole archive) is used instead of the one of the matrix
+    assert model.keyword_scores(keyword_matrix, "tfidf", idf=np.ones(2)).toarray()[0] == pytest.approx([1 + np.log(5), 2])
+
+
+def test_tfidf_classification_of_a_corpus(corpus_database):
+    # "market" is in 6 of the 8 articles, "quarterback" only in the last one
+    IdentifierStore(corpus_database).upsert(IdentifierStore.rows_from_dict({"sports": {"quarterback": 1.0}}))
+    add_articles(corpus_database, [(f"https://c.com/{i}", "2024-05-04", "market news") for i in range(3)])
+    add_articles(corpus_database, [("https://c.com/3", "2024-05-05", "market market quarterback")])
+    model = IdentifierModel.load(corpus_database)
+    corpus = open_corpus(corpus_database)
+
+    assert categories(model, model.classify(corpus, "hits"))[-1] == "business"
+    assert categories(model, model.classify(corpus, "tfidf"))[-1] == "sports"
+
+    with pytest.raises(ValueError):
+        model.classify(corpus, "bm25")
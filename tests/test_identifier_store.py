@@ -0,0 +1,77 @@
+# Standard modules
+import pytest
+
+# Custom made modules
+import sqlite_x33 as sql
+from identifier_store import IdentifierStore, main
+
+
+def stored(database) -> dict:
+    return {keyword: (category, weight) for category, keyword, weight in IdentifierStore(database).export_rows() if keyword}
+
+
+def test_upsert_adds_updates_and_skips_unchanged(database):
+    store = IdentifierStore(database)
+
+    assert store.upsert([("Tech", " AI ", 2), ("tech", "cloud", None), ("science", None, None)]) == \
+        {"categories": 2, "added": 2, "updated": 0, "unchanged": 0}
+    assert store.upsert([("tech", "ai", 2), ("science", "cloud", None)]) == {"categories": 0, "added": 0, "updated": 1, "unchanged": 1}
+    assert stored(database) == {"ai": ("tech", 2.0), "cloud": ("science", 1.0)}
+
+
+def test_upsert_keeps_the_stored_weight_without_a_weight(database):
+    store = IdentifierStore(database)
+    store.upsert([("tech", "ai", 2.5)])
+
+    # a plain keyword list (JSON list form, CSV without weight column) doesn't reset the tuned weights
+    assert store.upsert(IdentifierStore.rows_from_dict({"tech": ["ai"]}))["unchanged"] == 1
+    store.upsert([("science", "ai", "")])
+
+    assert stored(database) == {"ai": ("science", 2.5)}
+
+
+def test_unchanged_keywords_dont_bump_the_identifiers_version(database):
+    store = IdentifierStore(database)
+    store.upsert([("tech", "ai", 1)])
+    version = sql.execute(database, "SELECT value FROM app_meta WHERE key = 'identifiers_version';")
+
+    store.upsert([("tech", "ai", None), ("tech", "ai", 1)])
+
+    assert sql.execute(database, "SELECT value FROM app_meta WHERE key = 'identifiers_version';") == version
+
+
+@pytest.mark.parametrize("row", [(None, "ai", 1), ("tech", "ai", "heavy"), ("tech", "ai", -1)])
+def test_invalid_row_stores_nothing(database, row):
+    with pytest.raises(ValueError):
+        IdentifierStore(database).upsert([("tech", "cloud", 1), row])
+
+    assert stored(database) == {}
+
+
+def test_csv_round_trip(database, tmp_path):
+    store = IdentifierStore(database)
+    store.upsert([("tech", "ai", 2.5), ("tech", "big data", None), ("empty", None, None)])
+    path = str(tmp_path / "identifiers.csv")
+    store.export_file(path)
+
+    assert IdentifierStore(database).import_file(path) == {"categories": 0, "added": 0, "updated": 0, "unchanged": 2}
+
+
+def test_cli_on_a_database_without_keyword_weights(tmp_path):
+    # the schema of the first versions (no 'weight' column)
+    database = str(tmp_path / "old.db")
+    sql.execute(database, "CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT);")
+    sql.execute(database, "CREATE TABLE keywords (keyword TEXT PRIMARY KEY, category_id INT);")
+    sql.execute(database, "INSERT INTO categories (category) VALUES ('tech');")
+    sql.execute(database, "INSERT INTO keywords (keyword, category_id) VALUES ('ai', 1);")
+
+    export_path = str(tmp_path / "identifiers.csv")
+    assert main(["--database", database, "--export", export_path]) == 0
+    with open(export_path, encoding="utf-8") as file:
+        assert file.read().splitlines() == ["category,keyword,weight", "tech,ai,1.0"]
+
+    import_path = str(tmp_path / "new.json")
+    with open(import_path, "w", encoding="utf-8") as file:
+        file.write('{"tech": {"cloud": 2}}')
+    assert main(["--database", database, "--import", import_path, "--no-reclassify"]) == 0
+    assert stored(database) == {"ai": ("tech", 1.0), "cloud": ("tech", 2.0)}
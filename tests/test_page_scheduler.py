@@ -0,0 +1,56 @@
+# Standard modules
+from datetime import datetime, timedelta
+
+# Custom made modules
+from page_scheduler import PageScheduler
+
+
+start = datetime(2024, 5, 1, 12, 0)
+
+
+def test_new_pages_are_due_with_the_full_depth(database):
+    scheduler = PageScheduler(database)
+
+    assert scheduler.due_pages("a.com", ["/", "/world"], 5, now=start) == [("/", 5), ("/world", 5)]
+
+
+def test_first_crawl_uses_the_initial_interval(database):
+    scheduler = PageScheduler(database, initial_interval_minutes=60)
+    scheduler.record("a.com", "/world", 3, 40, now=start)
+
+    interval, depth, rate, next_due, _ = scheduler._schedule("a.com")["/world"]
+    assert (interval, rate, next_due) == (60, None, start + timedelta(minutes=60))
+    assert depth == 4 # 40 new urls on 3 levels -> 1 level deeper
+    assert scheduler.due_pages("a.com", ["/world"], 10, now=start + timedelta(minutes=59)) == []
+    assert scheduler.due_pages("a.com", ["/world"], 2, now=start + timedelta(minutes=60)) == [("/world", 2)]
+
+
+def test_busy_page_is_polled_more_often(database):
+    scheduler = PageScheduler(database, initial_interval_minutes=60, target_yield=5)
+    scheduler.record("a.com", "/", 1, 10, now=start)
+    scheduler.record("a.com", "/", 1, 20, now=start + timedelta(hours=1))
+
+    interval, _, rate, _, _ = scheduler._schedule("a.com")["/"]
+    assert rate == 20 # new urls per hour
+    assert interval == 30 # 5 urls take 15 minutes, but the interval is at most halved per crawl
+
+
+def test_quiet_page_backs_off_and_gets_shallower(database):
+    scheduler = PageScheduler(database, initial_interval_minutes=60, max_interval_minutes=100)
+    scheduler.record("a.com", "/", 3, 10, now=start)
+    now = start
+    for hours in range(1, 4):
+        now += timedelta(hours=hours)
+        (page, depth), = scheduler.due_pages("a.com", ["/"], 10, now=now)
+        scheduler.record("a.com", page, depth, 0, now=now)
+
+    interval, depth, _, _, _ = scheduler._schedule("a.com")["/"]
+    assert interval == 100
+    assert depth == 1
+
+
+def test_unpaginated_page_stays_at_depth_1(database):
+    scheduler = PageScheduler(database)
+    scheduler.record("a.com", "/", 1, 100, paginated=False, now=start)
+
+    assert scheduler._schedule("a.com")["/"][1] == 1
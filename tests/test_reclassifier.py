@@ -0,0 +1,74 @@
+# Standard modules
+import pytest
+
+# Custom made modules
+import sqlite_x33 as sql
+from conftest import add_articles
+from identifier_store import IdentifierStore
+from reclassifier import Reclassifier
+
+
+def stored_classification(database: str) -> tuple:
+    scores = sql.execute(database, "SELECT url, category_id, round(score, 9) FROM article_category_scores ORDER BY url, category_id;")
+    categories = sql.execute(database, "SELECT url, category_id FROM article_classification ORDER BY url;")
+    return scores, categories
+
+
+def full_classification(database: str, mode: str) -> tuple:
+    """Reclassifies everything from scratch (without the stored state) and returns the result."""
+    sql.execute(database, "DELETE FROM app_meta WHERE key LIKE 'classification_%';")
+    Reclassifier(database, mode).sync()
+    return stored_classification(database)
+
+
+def edit_keywords(database: str):
+    store = IdentifierStore(database)
+    store.upsert([("technology", "startup", 1.0), # added
+                  ("sports", "ai", None), # moved to another category
+                  ("business", "stock", 3.0)]) # new weight
+    sql.execute(database, "DELETE FROM keywords WHERE keyword = 'market';") # deleted
+
+
+@pytest.mark.parametrize("mode", ["hits", "tfidf"])
+def test_incremental_sync_equals_full(corpus_database, mode):
+    assert Reclassifier(corpus_database, mode).sync() == 4
+
+    edit_keywords(corpus_database)
+    # only the articles with an edited keyword are rescored
+    assert Reclassifier(corpus_database, mode).sync() == 3
+    incremental = stored_classification(corpus_database)
+
+    assert incremental == full_classification(corpus_database, mode)
+
+
+def test_incremental_sync_of_new_articles_equals_full(corpus_database):
+    assert Reclassifier(corpus_database, "hits").sync() == 4
+
+    edit_keywords(corpus_database)
+    add_articles(corpus_database, [("https://c.com/1", "2024-05-04", "startup stock market"),
+                                   ("https://c.com/2", "2024-05-04", "nothing to see here")])
+    assert Reclassifier(corpus_database, "hits").sync() == 5
+    incremental = stored_classification(corpus_database)
+
+    assert incremental == full_classification(corpus_database, "hits")
+
+
+def test_incremental_document_frequencies_equal_full(corpus_database):
+    reclassifier = Reclassifier(corpus_database, "tfidf")
+    reclassifier.sync()
+
+    edit_keywords(corpus_database)
+    add_articles(corpus_database, [("https://c.com/1", "2024-05-04", "startup stock market ai")])
+    reclassifier = Reclassifier(corpus_database, "tfidf")
+    reclassifier.tfidf_refresh_share = 1.0 # (no full refresh for the 5th article)
+    reclassifier.sync()
+    incremental = dict(sql.execute(corpus_database, "SELECT keyword, document_frequency FROM keyword_stats;"))
+
+    full_classification(corpus_database, "tfidf")
+    assert incremental == dict(sql.execute(corpus_database, "SELECT keyword, document_frequency FROM keyword_stats;"))
+    assert incremental["startup"] == 2 and "market" not in incremental
+
+
+def test_sync_without_keywords(database):
+    with pytest.raises(ValueError):
+        Reclassifier(database).sync()
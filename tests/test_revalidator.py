@@ -0,0 +1,68 @@
+# Standard modules
+import pytest
+
+# Custom made modules
+import sqlite_x33 as sql
+from revalidator import Revalidator, extraction_config_hash, reason_code_of
+
+
+site = {"domain": "example.com", "div_filter": "^story$", "p_attr_exclusion": []}
+old_site = {**site, "div_filter": "^article-body$"}
+article = "<html><body><div class='story'>" + "<p>A paragraph of the story.</p>" * 8 + "</div></body></html>"
+
+
+class PageArchive():
+    """The same article page for every url (instead of fetching them)."""
+
+    def get(self, url: str) -> str:
+        return article
+
+
+@pytest.fixture
+def revalidator(database) -> Revalidator:
+    revalidator = Revalidator(database, archive=PageArchive())
+    revalidator.sites = {"example.com": site, "other.com": site}
+    return revalidator
+
+
+def exclude(database, urls: list, code: str, config: dict):
+    sql.execute_many(database, "INSERT INTO exclude_articles (url, reason, reason_code, domain, config_hash) VALUES (?, ?, ?, ?, ?);",
+                     [(url, code, code, url.split("/")[2], extraction_config_hash(config)) for url in urls])
+
+
+def test_groups_per_domain_and_reason(database, revalidator):
+    exclude(database, [f"https://example.com/old/{i}" for i in range(3)], "div_not_found", old_site)
+    exclude(database, [f"https://example.com/new/{i}" for i in range(2)], "div_not_found", site)
+    exclude(database, ["https://example.com/pdf"], "content_type", old_site)
+    exclude(database, ["https://other.com/1"], "div_not_found", site)
+
+    # the configs of a group are merged, it's stale if any of its rows was excluded with an older config
+    assert revalidator.groups(stale_only=False) == [("example.com", "content_type", 1, True), ("example.com", "div_not_found", 5, True),
+                                                    ("other.com", "div_not_found", 1, False)]
+    assert revalidator.groups() == [("example.com", "content_type", 1, True), ("example.com", "div_not_found", 5, True)]
+    assert revalidator.groups("other.com", stale_only=False) == [("other.com", "div_not_found", 1, False)]
+
+
+def test_revalidate_requeues_only_the_stale_rows(database, revalidator):
+    exclude(database, [f"https://example.com/old/{i}" for i in range(3)], "div_not_found", old_site)
+    exclude(database, ["https://example.com/new/1"], "div_not_found", site)
+    exclude(database, ["https://example.com/pdf"], "content_type", old_site)
+
+    assert revalidator.revalidate() == [("example.com", "div_not_found", 4, 3, 3, 3)]
+
+    assert sorted(url for url, in sql.execute(database, "SELECT url FROM scrape_jobs;")) == [f"https://example.com/old/{i}" for i in range(3)]
+    assert sorted(url for url, in sql.execute(database, "SELECT url FROM exclude_articles;")) == ["https://example.com/new/1", "https://example.com/pdf"]
+
+
+def test_failing_group_is_marked_as_checked(database, revalidator):
+    exclude(database, ["https://example.com/old/1"], "too_few_paragraphs", old_site)
+    revalidator.sites["example.com"] = {**site, "div_filter": "^missing$"}
+
+    assert revalidator.revalidate() == [("example.com", "too_few_paragraphs", 1, 0, 1, 0)]
+    assert revalidator.groups() == []
+
+
+def test_reason_code_of_legacy_reasons():
+    assert reason_code_of("Requested <div> was not found on this page.") == "div_not_found"
+    assert reason_code_of("The content of the requested <div> was not worth saving (too few paragraphs: 3).") == "too_few_paragraphs"
+    assert reason_code_of(None) == "unknown"
@@ -0,0 +1,125 @@
+# Standard modules
+from datetime import datetime, timedelta
+
+# Custom made modules
+from run_coordinator import RunCoordinator
+
+
+class FakeClock():
+    """Replaces RunCoordinator._now, so the lease timeouts can pass without sleeping."""
+
+    def __init__(self):
+        self.time = datetime(2024, 5, 1, 12, 0)
+
+    def now(self, offset_seconds: int = 0) -> str:
+        return (self.time + timedelta(seconds=offset_seconds)).strftime(RunCoordinator.time_format)
+
+    def advance(self, seconds: float):
+        self.time += timedelta(seconds=seconds)
+
+
+def worker(database: str, clock: FakeClock, name: str) -> RunCoordinator:
+    # the heartbeats are sent by hand, the thread of join_run() never fires during a test
+    coordinator = RunCoordinator(database, name, lease_timeout=120, heartbeat_interval=3600)
+    coordinator._now = clock.now
+    return coordinator
+
+
+def test_first_worker_leads_and_the_next_ones_join(database):
+    clock = FakeClock()
+    leader, follower = worker(database, clock, "w1"), worker(database, clock, "w2")
+
+    run_id, is_leader = leader.join_run()
+    assert is_leader and leader.discovery_running()
+    assert follower.join_run() == (run_id, False)
+
+    leader.discovery_done()
+    assert not follower.discovery_running()
+
+    for coordinator in (leader, follower):
+        coordinator.leave_run()
+
+
+def test_run_is_joined_while_followers_drain_after_the_leader_left(database):
+    clock = FakeClock()
+    leader, follower = worker(database, clock, "w1"), worker(database, clock, "w2")
+    run_id, _ = leader.join_run()
+    follower.join_run()
+    leader.discovery_done()
+    leader.leave_run()
+
+    # the follower keeps the run alive past the lease timeout, so the next scheduled worker joins it instead of discovering again
+    for _ in range(5):
+        clock.advance(60)
+        follower.heartbeat()
+    late = worker(database, clock, "w3")
+
+    assert late.join_run() == (run_id, False)
+
+    for coordinator in (follower, late):
+        coordinator.leave_run()
+
+
+def test_abandoned_run_is_taken_over(database):
+    clock = FakeClock()
+    crashed = worker(database, clock, "w1")
+    run_id, _ = crashed.join_run()
+    crashed._stop_heartbeat.set()
+
+    clock.advance(121)
+    successor = worker(database, clock, "w2")
+
+    new_run_id, is_leader = successor.join_run()
+    assert is_leader and new_run_id != run_id
+    successor.leave_run()
+
+
+def test_leader_that_crashes_during_discovery_doesnt_block_the_followers(database):
+    clock = FakeClock()
+    leader, follower = worker(database, clock, "w1"), worker(database, clock, "w2")
+    leader.join_run()
+    follower.join_run()
+    leader._stop_heartbeat.set()
+
+    clock.advance(121)
+    follower.heartbeat()
+
+    assert not follower.discovery_running()
+    follower.leave_run()
+
+
+def test_domains_are_split_fairly_and_rebalanced(database):
+    clock = FakeClock()
+    first, second = worker(database, clock, "w1"), worker(database, clock, "w2")
+    domains = [f"site{i}.com" for i in range(6)]
+    first.join_run()
+
+    assert first.claim_domains(domains) == domains
+
+    second.join_run()
+    # the 2nd worker gets nothing until the 1st releases its surplus, the domains with running fetches are kept
+    assert second.claim_domains(domains) == []
+    kept = first.claim_domains(domains, working_domains={"site5.com"})
+    assert len(kept) == 3 and "site5.com" in kept
+    assert sorted(second.claim_domains(domains) + kept) == domains
+
+    # drained domains are released
+    assert first.claim_domains([domain for domain in domains if domain not in kept[:1]]) == kept[1:]
+
+    for coordinator in (first, second):
+        coordinator.leave_run()
+
+
+def test_domains_of_a_dead_worker_are_taken_over(database):
+    clock = FakeClock()
+    dead, alive = worker(database, clock, "w1"), worker(database, clock, "w2")
+    dead.join_run()
+    alive.join_run()
+    dead.claim_domains(["a.com", "b.com"])
+    dead._stop_heartbeat.set()
+
+    clock.advance(121)
+    alive.heartbeat()
+
+    assert alive.claim_domains(["a.com", "b.com"]) == ["a.com", "b.com"]
+    alive.leave_run()
@@ -0,0 +1,51 @@
+# Standard modules
+import os
+import pyarrow.parquet as pq
+
+# Custom made modules
+import sqlite_x33 as sql
+from conftest import add_articles
+from article_statistics import ArticleStatistics
+from snapshot_export import SnapshotExporter
+
+
+def read_articles(export_dir: str) -> dict:
+    table = pq.read_table(os.path.join(export_dir, "articles")).to_pandas()
+    return {row.url: (row.category, row.token_count, row.domain) for row in table.itertuples()}
+
+
+def test_article_details_are_aligned_with_the_articles(corpus_database):
+    st = ArticleStatistics(corpus_database)
+    details = st.get_article_details()
+
+    assert list(details.index) == list(st.df_articles.index)
+    assert list(details["category"]) == ["business", "sports", "business", "sports"]
+    assert list(details["token_count"]) == [7, 6, 4, 5]
+
+
+def test_articles_are_exported_incrementally(corpus_database, tmp_path):
+    export_dir = str(tmp_path / "snapshot")
+    written = SnapshotExporter(ArticleStatistics(corpus_database), export_dir).export_articles()
+
+    assert len(written) == 3 # 1 partition per scrape date
+    assert read_articles(export_dir) == {"https://www.a.com/1": ("business", 7, "a.com"), "https://www.a.com/2": ("sports", 6, "a.com"),
+                                         "https://b.com/1": ("business", 4, "b.com"), "https://b.com/2": ("sports", 5, "b.com")}
+
+    add_articles(corpus_database, [("https://b.com/3", "2024-05-04", "ai chips ai")])
+    written = SnapshotExporter(ArticleStatistics(corpus_database), export_dir).export_articles()
+
+    # the new date and the latest exported date (it could have gotten more articles)
+    assert [os.path.basename(os.path.dirname(path)) for path in written] == ["scrape_date=2024-05-03", "scrape_date=2024-05-04"]
+    assert read_articles(export_dir)["https://b.com/3"] == ("technology", 3, "b.com")
+
+
+def test_deduplicated_articles_keep_their_own_details(corpus_database, tmp_path):
+    # a.com/2 is a near-duplicate of b.com/2, only the first copy of the cluster is analyzed
+    sql.execute(corpus_database, "INSERT INTO article_fingerprints (url, simhash, cluster_url) VALUES (?, ?, ?);", ("https://b.com/2", "0", "https://www.a.com/2"))
+    export_dir = str(tmp_path / "snapshot")
+
+    SnapshotExporter(ArticleStatistics(corpus_database, dedup_clusters=True), export_dir).export_articles()
+
+    articles = read_articles(export_dir)
+    assert "https://b.com/2" not in articles
+    assert articles["https://b.com/1"] == ("business", 4, "b.com")
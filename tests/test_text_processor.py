@@ -0,0 +1,16 @@
+# Custom made modules
+from text_processor import TextProcessor, load_stop_words
+
+
+def test_stop_words_are_loaded_from_the_data_file():
+    stop_words = load_stop_words()
+
+    assert {"the", "and", "its", "n't", "’s"} <= stop_words
+    assert len(stop_words) > 300
+    assert not any(word.startswith("#") for word in stop_words)
+
+
+def test_text_cleaner():
+    text = "The stand-up comedian's show, at https://example.com on 5 May — it's “great” for AI fans!"
+
+    assert TextProcessor().text_cleaner(text) == "stand-up comedian great ai fans" # ("show" is a stop word too)
@@ -0,0 +1,113 @@
+# Standard modules
+from datetime import datetime, timedelta
+
+# Custom made modules
+import sqlite_x33 as sql
+from work_queue import WorkQueue
+
+
+class FakeClock():
+    """Replaces WorkQueue._now, so the tests can move the time forward instead of sleeping."""
+
+    def __init__(self):
+        self.time = datetime(2024, 5, 1, 12, 0)
+
+    def now(self, offset_seconds: int = 0) -> str:
+        return (self.time + timedelta(seconds=offset_seconds)).strftime(WorkQueue.time_format)
+
+    def advance(self, seconds: float):
+        self.time += timedelta(seconds=seconds)
+
+
+def make_queue(database: str, clock: FakeClock, **kwargs) -> WorkQueue:
+    queue = WorkQueue(database, **kwargs)
+    queue._now = clock.now
+    return queue
+
+
+def test_lease_takes_turns_between_the_domains(database):
+    clock = FakeClock()
+    queue = make_queue(database, clock)
+    queue.enqueue([f"https://a.com/{i}" for i in range(3)])
+    queue.enqueue([f"https://b.com/{i}" for i in range(3)])
+    clock.advance(1)
+    queue.enqueue([f"https://c.com/{i}" for i in range(3)])
+
+    domains = [queue.lease()[1] for _ in range(6)]
+
+    # the freshest domain first, then every domain before any of them gets a 2nd job
+    assert domains[0] == "c.com"
+    assert sorted(domains[:3]) == sorted(domains[3:]) == ["a.com", "b.com", "c.com"]
+
+
+def test_lease_order_is_shared_by_the_workers(database):
+    WorkQueue(database).enqueue(["https://a.com/1", "https://a.com/2", "https://b.com/1"])
+
+    first = WorkQueue(database, worker_id="worker-1").lease()
+    second = WorkQueue(database, worker_id="worker-2").lease()
+
+    assert first[1] != second[1]
+
+
+def test_lease_is_limited_to_the_given_domains(database):
+    queue = WorkQueue(database)
+    queue.enqueue(["https://a.com/1", "https://b.com/1"])
+
+    assert queue.lease(domains=["b.com"])[0] == "https://b.com/1"
+    assert queue.lease(domains=["b.com"]) is None
+    assert queue.lease()[0] == "https://a.com/1"
+    assert queue.lease() is None
+
+
+def test_expired_lease_becomes_visible_again(database):
+    clock = FakeClock()
+    queue = make_queue(database, clock, visibility_timeout=60)
+    queue.enqueue(["https://a.com/1"])
+
+    assert queue.lease() == ("https://a.com/1", "a.com", 1)
+    clock.advance(59)
+    assert queue.lease() is None
+    clock.advance(1)
+    assert queue.lease() == ("https://a.com/1", "a.com", 2)
+
+
+def test_renewed_lease_isnt_leased_again(database):
+    clock = FakeClock()
+    queue = make_queue(database, clock, visibility_timeout=60)
+    queue.enqueue(["https://a.com/1"])
+    url, _, _ = queue.lease()
+
+    clock.advance(50)
+    queue.renew(url)
+    clock.advance(50)
+
+    assert queue.lease() is None
+    assert make_queue(database, clock, worker_id="other", visibility_timeout=60).lease() is None
+
+
+def test_fail_reschedules_with_backoff(database):
+    clock = FakeClock()
+    queue = make_queue(database, clock, retry_delay=60)
+    queue.enqueue(["https://a.com/1"])
+
+    for backoff in (60, 120):
+        url, _, _ = queue.lease()
+        queue.fail(url, "timeout")
+
+        status, last_error, lease_owner = sql.execute(database, "SELECT status, last_error, lease_owner FROM scrape_jobs;")[0]
+        assert (status, last_error, lease_owner) == ("queued", "timeout", None)
+        clock.advance(backoff - 1)
+        assert queue.lease() is None # not due before the backoff has passed
+        clock.advance(1)
+
+
+def test_fail_moves_a_job_out_of_retries_to_dead_letter(database):
+    queue = WorkQueue(database, max_retries=2, retry_delay=0)
+    queue.enqueue(["https://a.com/1"])
+
+    for _ in range(2):
+        url, _, _ = queue.lease()
+        queue.fail(url, "HTTP 500")
+
+    assert queue.get_stats() == {"dead": 1}
+    assert queue.lease() is None
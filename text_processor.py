@@ -1,14 +1,20 @@
 # Standard modules
+import os
 import re
 from string import punctuation as punc
 
-# Third-party modules -> requirements.txt
-from spacy.lang.en.stop_words import STOP_WORDS
+
+def load_stop_words(file_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stop_words_en.txt")) -> set:
+    """Loads the english stop words from the data file next to this module (spaCy's list, shipped with the repo,
+    so the scraper doesn't have to import the whole spacy package just for a set of words)."""
+
+    with open(file_path, "r", encoding="utf-8") as file:
+        return {line.strip() for line in file if line.strip() and not line.startswith("#")}
 
 
 class TextProcessor():
 
-    stop_words = STOP_WORDS
+    stop_words = load_stop_words()
     punc = re.sub(r"'|-|@", "", punc) # removing some symbols to later correctly filter out apostrophes/endings, emails and keep compound words
     punc += "—“”" # adding more special characters to the punctuations
 
@@ -0,0 +1,146 @@
+# Standard modules
+import os
+import re
+import socket
+from datetime import datetime, timedelta
+
+# Custom made modules
+import sqlite_x33 as sql
+
+
+class WorkQueue():
+    """A durable job queue on top of the SQLite database, used for the article urls that are waiting to be scraped.
+    Jobs are leased by a worker for a limited time (visibility timeout), so several worker processes can drain the queue safely
+    and jobs from a crashed run become visible again once their lease has expired."""
+
+    time_format = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, database: str, worker_id: str = None, max_retries: int = 5, visibility_timeout: int = 600, retry_delay: int = 900):
+
+        self.db = database
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}" # unique name of this worker (host + process id)
+        self.max_retries = max_retries # jobs that failed this many times are moved to the dead-letter state
+        self.visibility_timeout = visibility_timeout # seconds before a leased job becomes visible to other workers again
+        self.retry_delay = retry_delay # seconds before the 1st retry, doubled for every following attempt
+
+        # WAL lets the workers read the queue while another process is writing to it
+        sql.execute(self.db, "PRAGMA journal_mode=WAL;")
+
+        self._migrate_legacy_que()
+
+
+    def _now(self, offset_seconds: int = 0) -> str:
+        return (datetime.now() + timedelta(seconds=offset_seconds)).strftime(self.time_format)
+
+
+    def _migrate_legacy_que(self):
+        """Moves urls from the old 'scrape_que' table (older databases) into the job queue."""
+
+        legacy_table = sql.execute(self.db, "SELECT name FROM sqlite_master WHERE type='table' AND name='scrape_que';")
+        if not legacy_table:
+            return
+
+        legacy_urls = sql.execute(self.db, "SELECT url, scrape_time, scrape_retries FROM scrape_que;")
+        sql.execute_many(self.db, """INSERT OR IGNORE INTO scrape_jobs
+                                     (url, domain, priority, status, attempts, enqueued_at, next_attempt_at)
+                                     VALUES (?, ?, 0, 'queued', ?, ?, ?);""",
+                         [(url, self.get_domain(url), retries or 0, scrape_time, scrape_time) for url, scrape_time, retries in legacy_urls])
+        sql.execute(self.db, "DROP TABLE scrape_que;")
+
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        return re.sub(r"^https://(www.)?|/.*", "", url)
+
+
+    def enqueue(self, urls: list, priority: int = 0) -> int:
+        """Adds new urls to the queue (urls that are already queued are ignored). Higher priority jobs are leased first."""
+
+        now = self._now()
+        return sql.execute_many(self.db, """INSERT OR IGNORE INTO scrape_jobs
+                                            (url, domain, priority, status, attempts, enqueued_at, next_attempt_at)
+                                            VALUES (?, ?, ?, 'queued', 0, ?, ?);""",
+                                [(url, self.get_domain(url), priority, now, now) for url in urls])
+
+
+    def lease(self, domains: list = None) -> tuple:
+        """Atomically leases the next due job for this worker. Returns (url, domain, attempts) or None if nothing is due.
+        Jobs are picked by priority, then from the domain that was leased least recently (by any worker, so the sites take turns
+        and none is starved), then the freshest urls first. 'domains' optionally limits the lease to jobs of the given domains."""
+
+        now = self._now()
+
+        # expired leases of jobs that are out of retries go straight to the dead-letter state
+        sql.execute(self.db, """UPDATE scrape_jobs SET status = 'dead', last_error = 'lease expired', lease_owner = NULL
+                                WHERE status = 'leased' AND lease_expires <= ? AND attempts >= ?;""", (now, self.max_retries))
+
+        domain_filter = ""
+        params = [self.worker_id, self._now(self.visibility_timeout), now, now]
+        if domains is not None:
+            domain_filter = f"AND domain IN ({', '.join('?' for _ in domains)})"
+            params += list(domains)
+
+        # a single UPDATE statement, so two workers can never lease the same job
+        job = sql.execute(self.db, f"""UPDATE scrape_jobs
+                                       SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                                       WHERE url = (SELECT url FROM scrape_jobs
+                                                    LEFT JOIN scrape_domain_leases USING (domain)
+                                                    WHERE ((status = 'queued' AND next_attempt_at <= ?) OR (status = 'leased' AND lease_expires <= ?))
+                                                    {domain_filter}
+                                                    ORDER BY priority DESC, coalesce(lease_seq, 0) ASC, enqueued_at DESC
+                                                    LIMIT 1)
+                                       RETURNING url, domain, attempts;""", tuple(params))
+
+        return job[0] if job else None
+
+
+    def renew(self, url: str):
+        """Extends the lease of a job this worker is still working on (a slow fetch with retries can outlast the visibility timeout)."""
+        sql.execute(self.db, "UPDATE scrape_jobs SET lease_expires = ? WHERE url = ? AND lease_owner = ?;",
+                    (self._now(self.visibility_timeout), url, self.worker_id))
+
+
+    def complete(self, url: str):
+        """Removes a finished job (stored or excluded article) from the queue."""
+        sql.execute(self.db, "DELETE FROM scrape_jobs WHERE url = ?;", (url,))
+
+
+    def fail(self, url: str, error: str):
+        """Reschedules a failed job with exponential backoff, or moves it to the dead-letter state when it's out of retries."""
+
+        attempts = sql.execute(self.db, "SELECT attempts FROM scrape_jobs WHERE url = ?;", (url,))
+        attempts = attempts[0][0] if attempts else self.max_retries
+
+        if attempts >= self.max_retries:
+            sql.execute(self.db, "UPDATE scrape_jobs SET status = 'dead', last_error = ?, lease_owner = NULL WHERE url = ?;", (error, url))
+        else:
+            next_attempt_at = self._now(self.retry_delay * (2 ** (attempts - 1)))
+            sql.execute(self.db, """UPDATE scrape_jobs SET status = 'queued', next_attempt_at = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL
+                                    WHERE url = ?;""", (next_attempt_at, error, url))
+
+
+    def purge_known(self):
+        """Removes queued urls that are already stored in either articles or exclude_articles (e.g. stored right before a run crashed)."""
+        sql.execute(self.db, """DELETE FROM scrape_jobs
+                                WHERE url IN (SELECT url FROM articles)
+                                   OR url IN (SELECT url FROM exclude_articles);""")
+
+
+    def due_count(self) -> int:
+        """Amount of jobs that can be leased right now."""
+        now = self._now()
+        return sql.execute(self.db, """SELECT count(*) FROM scrape_jobs
+                                       WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'leased' AND lease_expires <= ?);""", (now, now))[0][0]
+
+
+    def due_domains(self) -> list:
+        """Domains that have jobs which can be leased right now."""
+        now = self._now()
+        return [row[0] for row in sql.execute(self.db, """SELECT DISTINCT domain FROM scrape_jobs
+                                                          WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'leased' AND lease_expires <= ?)
+                                                          ORDER BY domain;""", (now, now))]
+
+
+    def get_stats(self) -> dict:
+        """Amount of jobs per status ('queued', 'leased', 'dead')."""
+        return dict(sql.execute(self.db, "SELECT status, count(*) FROM scrape_jobs GROUP BY status;"))